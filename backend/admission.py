@@ -0,0 +1,241 @@
+"""
+Admission control for the detection endpoints
+Per-endpoint concurrency and queue limits with priorities, fast 429/503 rejections and queue-wait reporting
+"""
+
+import os
+import math
+import time
+import logging
+import threading
+from functools import wraps
+from typing import Dict, List, Optional
+
+from flask import jsonify, make_response
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+QUEUE_WAIT_HEADER = "X-Queue-Wait-Ms"
+
+
+class Lane:
+    """Limits for one class of requests; lower priority values are admitted first"""
+
+    def __init__(self, name: str, priority: int, max_active: int, max_queued: int, max_wait: float):
+        self.name = name
+        self.priority = priority
+        self.max_active = max(1, max_active)
+        self.max_queued = max(0, max_queued)
+        self.max_wait = max_wait
+        self.active = 0
+        self.queued = 0
+
+    @classmethod
+    def from_env(cls, name: str, priority: int, max_active: int, max_queued: int, max_wait: float) -> "Lane":
+        prefix = f"ADMISSION_{name.upper()}"
+        return cls(
+            name,
+            priority,
+            int(os.getenv(f"{prefix}_MAX_ACTIVE", str(max_active))),
+            int(os.getenv(f"{prefix}_MAX_QUEUED", str(max_queued))),
+            float(os.getenv(f"{prefix}_MAX_WAIT", str(max_wait))),
+        )
+
+
+class Rejected(Exception):
+    """Request was not admitted"""
+
+    def __init__(self, lane: Lane, status: int, reason: str, message: str):
+        super().__init__(message)
+        self.lane = lane
+        self.status = status
+        self.reason = reason
+
+    @property
+    def retry_after(self) -> int:
+        return max(1, math.ceil(self.lane.max_wait))
+
+
+class AdmissionController:
+    """
+    Priority admission across lanes within one worker process
+
+    A request runs when its lane is below max_active, fewer than max_active
+    requests run in total, and no higher-priority request that could run is
+    waiting, so freed slots go to cheap requests first. A full lane queue is
+    rejected at once with 429; a request still queued after max_wait gets 503.
+
+    Every queued request holds a gunicorn thread, so lanes other than the
+    highest priority share heavy_inflight (active + queued) slots, leaving
+    threads free for cheap requests however much heavy work arrives.
+    """
+
+    # Default gthread threads per worker, mirrored from gunicorn.conf.py
+    THREADS = int(os.getenv("GUNICORN_THREADS", "4"))
+
+    def __init__(self, lanes: List[Lane], max_active: Optional[int] = None, heavy_inflight: Optional[int] = None):
+        self.lanes: Dict[str, Lane] = {lane.name: lane for lane in lanes}
+        self.top_priority = min(lane.priority for lane in lanes)
+        self.max_active = max_active or int(os.getenv("ADMISSION_MAX_ACTIVE", "0")) or self.THREADS
+        if heavy_inflight is None:
+            heavy_inflight = int(os.getenv("ADMISSION_HEAVY_INFLIGHT", "0")) or max(1, self.THREADS - 1)
+        self.heavy_inflight = heavy_inflight
+        self._active = 0
+        self._heavy = 0
+        self._cond = threading.Condition()
+        self._waiters: List[tuple] = []  # (priority, seq, lane)
+        self._seq = 0
+
+    def acquire(self, name: str) -> float:
+        """
+        Wait for a slot in a lane
+
+        Returns:
+            Seconds spent queued
+
+        Raises:
+            Rejected: Lane queue full (429), heavy capacity full or queue wait exceeded (503)
+        """
+        lane = self.lanes[name]
+        heavy = lane.priority != self.top_priority
+        started = time.perf_counter()
+
+        with self._cond:
+            if heavy and self._heavy >= self.heavy_inflight:
+                raise self._reject(lane, 503, "capacity", "Server is busy with other heavy requests")
+
+            if self._can_run(lane) and not self._eligible_waiter_ahead(lane.priority, None):
+                self._admit(lane, heavy)
+                metrics.QUEUE_WAIT_SECONDS.observe(0.0, lane=lane.name)
+                return 0.0
+
+            if lane.queued >= lane.max_queued:
+                raise self._reject(lane, 429, "queue_full", f"Too many pending {lane.name} requests")
+
+            self._seq += 1
+            waiter = (lane.priority, self._seq, lane)
+            self._waiters.append(waiter)
+            lane.queued += 1
+            if heavy:
+                self._heavy += 1
+            deadline = started + lane.max_wait
+            try:
+                while not (self._can_run(lane) and not self._eligible_waiter_ahead(lane.priority, waiter)):
+                    remaining = deadline - time.perf_counter()
+                    if remaining <= 0:
+                        raise self._reject(lane, 503, "timeout", f"Timed out waiting for a {lane.name} slot")
+                    self._cond.wait(remaining)
+            finally:
+                self._waiters.remove(waiter)
+                lane.queued -= 1
+                if heavy:
+                    self._heavy -= 1
+                # Someone behind us may be eligible now
+                self._cond.notify_all()
+
+            self._admit(lane, heavy)
+
+        waited = time.perf_counter() - started
+        metrics.QUEUE_WAIT_SECONDS.observe(waited, lane=lane.name)
+        return waited
+
+    def release(self, name: str):
+        lane = self.lanes[name]
+        with self._cond:
+            lane.active -= 1
+            self._active -= 1
+            if lane.priority != self.top_priority:
+                self._heavy -= 1
+            self._cond.notify_all()
+
+    def _can_run(self, lane: Lane) -> bool:
+        # Caller holds the lock
+        return lane.active < lane.max_active and self._active < self.max_active
+
+    def _admit(self, lane: Lane, heavy: bool):
+        # Caller holds the lock
+        lane.active += 1
+        self._active += 1
+        if heavy:
+            self._heavy += 1
+
+    def _eligible_waiter_ahead(self, priority: int, me: Optional[tuple]) -> bool:
+        """True if a waiter that could run now should go before `me` (caller holds the lock)"""
+        for waiter in self._waiters:
+            if waiter is me:
+                continue
+            if me is not None and waiter[:2] > me[:2]:
+                continue
+            if me is None and waiter[0] > priority:
+                continue
+            if self._can_run(waiter[2]):
+                return True
+        return False
+
+    def _reject(self, lane: Lane, status: int, reason: str, message: str) -> Rejected:
+        metrics.ADMISSION_REJECTIONS.inc(lane=lane.name, reason=reason)
+        return Rejected(lane, status, reason, message)
+
+    def limit(self, name: str):
+        """
+        Decorator for Flask views
+
+        Rejections become JSON errors with Retry-After; admitted responses
+        carry X-Queue-Wait-Ms. Streamed responses keep their slot until the
+        body has been sent.
+        """
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                try:
+                    waited = self.acquire(name)
+                except Rejected as e:
+                    response = jsonify({"error": str(e)})
+                    response.status_code = e.status
+                    response.headers["Retry-After"] = str(e.retry_after)
+                    return response
+
+                try:
+                    response = make_response(view(*args, **kwargs))
+                except BaseException:
+                    self.release(name)
+                    raise
+
+                response.headers[QUEUE_WAIT_HEADER] = f"{waited * 1000:.1f}"
+                if response.is_streamed:
+                    response.call_on_close(lambda: self.release(name))
+                else:
+                    self.release(name)
+                return response
+            return wrapper
+        return decorator
+
+    def stats(self) -> Dict:
+        with self._cond:
+            return {
+                "active": self._active,
+                "max_active": self.max_active,
+                "heavy_inflight": self._heavy,
+                "heavy_inflight_limit": self.heavy_inflight,
+                "lanes": {
+                    name: {
+                        "active": lane.active, "queued": lane.queued,
+                        "max_active": lane.max_active, "max_queued": lane.max_queued,
+                        "priority": lane.priority,
+                    }
+                    for name, lane in self.lanes.items()
+                },
+            }
+
+
+def default_controller() -> AdmissionController:
+    """Lanes for the detection endpoints: text first, then images, then batch/video/document work"""
+    return AdmissionController([
+        Lane.from_env("text", priority=0, max_active=4, max_queued=64, max_wait=2),
+        Lane.from_env("image", priority=1, max_active=2, max_queued=8, max_wait=10),
+        Lane.from_env("batch", priority=2, max_active=1, max_queued=2, max_wait=10),
+        Lane.from_env("document", priority=2, max_active=1, max_queued=2, max_wait=20),
+        Lane.from_env("video", priority=2, max_active=1, max_queued=1, max_wait=30),
+    ])
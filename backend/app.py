@@ -1,40 +1,379 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify, stream_with_context
 from flask_cors import CORS
-import pickle
 from transformers import AutoModelForImageClassification, AutoImageProcessor
 import cv2
-import numpy as np
 from PIL import Image
 import torch.nn.functional as F
 import torch
 import tempfile
 import os
+import io
+import json
+import logging
+import hashlib
+import itertools
+import time
+import unicodedata
+import metrics
+from admission import Rejected, default_controller
 from document_processor import DocumentProcessor
+from frame_sampler import RunningEstimate, SceneChangeSampler
+from image_backends import create_backend, processor_image_size
+from image_batcher import ImageBatcher
+from image_preprocess import FastImagePreprocessor
+from job_queue import FINISHED_STATES, JobQueue, QueueFull, recover_orphans
+from model_artifacts import load_text_model
+from phash_index import PerceptualHashIndex
+from result_cache import ResultCache
+from text_chunking import DEFAULT_REDUCER, REDUCERS, needs_chunking, score_windows
+from text_dedup import TextDedupIndex
+from text_fastpath import compile_text_model
+from upload_stream import UploadRequest, detach_upload, upload_path, upload_sha256
+from video_decode import VIDEO_DECODER, iter_timed_frames
+
+logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for frontend access
 
+# Stream video uploads to unique temp files while parsing; reject oversized
+# bodies as they arrive instead of after buffering them
+app.request_class = UploadRequest
+app.config["MAX_CONTENT_LENGTH"] = int(os.getenv("MAX_UPLOAD_MB", "500")) * 1024 * 1024
+
+@app.errorhandler(413)
+def upload_too_large(e):
+    return jsonify({"error": f"Upload too large. Maximum size: {app.config['MAX_CONTENT_LENGTH'] // (1024 * 1024)}MB"}), 413
+
+###############################
+# METRICS
+###############################
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_latency(response):
+    started = g.get("request_started")
+    if started is not None and request.endpoint != "metrics_endpoint":
+        metrics.REQUEST_SECONDS.observe(
+            time.perf_counter() - started, endpoint=request.endpoint or "unknown", status=response.status_code
+        )
+    return response
+
+@app.get("/metrics")
+def metrics_endpoint():
+    """Prometheus text format; per gunicorn worker"""
+    if not metrics.ENABLED:
+        return jsonify({"error": "Metrics are disabled (METRICS_ENABLED=0)"}), 404
+    return Response(metrics.render(), mimetype=metrics.CONTENT_TYPE)
+
+###############################
+# ADMISSION CONTROL
+###############################
+# Per-endpoint concurrency/queue limits; text is admitted ahead of heavy work
+# and overload is shed with 429/503 + Retry-After (see admission.py)
+admission = default_controller()
+
+def admission_metrics():
+    stats = admission.stats()
+    for state in ("active", "queued"):
+        yield f"detector_admission_{state}", "gauge", f"Requests {state} per admission lane", [
+            ({"lane": name}, lane[state]) for name, lane in stats["lanes"].items()
+        ]
+
+metrics.REGISTRY.add_collector(admission_metrics)
+
 # Initialize document processor
 document_processor = DocumentProcessor()
 
 # Get the directory where this script is located
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
+###############################
+# RESULT CACHE
+###############################
+CACHE_BYPASS_HEADER = "X-Cache-Bypass"
+
+result_cache = ResultCache()
+
+def cache_bypassed():
+    """Clients can skip cached results with X-Cache-Bypass or Cache-Control: no-cache"""
+    if request.headers.get(CACHE_BYPASS_HEADER, "").lower() in ("1", "true", "yes"):
+        return True
+    return "no-cache" in request.headers.get("Cache-Control", "").lower()
+
+def cached_response(key, compute, flag_hits=False):
+    """
+    Serve a result from the cache or compute and store it
+
+    Args:
+        key: Result cache key
+        compute: Callable returning a result dict or (result dict, status)
+        flag_hits: Set "cached": true in bodies served from the cache
+    """
+    bypass = cache_bypassed()
+    if not bypass:
+        hit = result_cache.get(key)
+        if hit is not None:
+            if flag_hits:
+                hit = dict(hit, cached=True)
+            response = jsonify(hit)
+            response.headers["X-Cache"] = "HIT"
+            return response
+
+    result = compute()
+    body, status = result if isinstance(result, tuple) else (result, 200)
+    # Only successful results are worth remembering
+    if status == 200:
+        result_cache.set(key, body)
+
+    response = jsonify(body)
+    response.status_code = status
+    response.headers["X-Cache"] = "BYPASS" if bypass else "MISS"
+    return response
+
+def normalize_text(text):
+    """Canonical form of a text payload for cache keys"""
+    return unicodedata.normalize("NFC", text).replace("\r\n", "\n").strip()
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+@app.get("/cache/stats")
+def cache_stats():
+    stats = result_cache.stats()
+    if phash_index is not None:
+        stats["phash"] = phash_index.stats()
+    if text_dedup is not None:
+        stats["text_dedup"] = text_dedup.stats()
+    return stats
+
+def cache_metrics():
+    stats = result_cache.stats()
+    events = ("hits", "disk_hits", "misses", "sets", "evictions", "expired")
+    yield "detector_cache_events_total", "counter", "Result cache events", [
+        ({"event": event}, stats[event]) for event in events
+    ]
+    yield "detector_cache_entries", "gauge", "Entries in the in-memory result cache", [({}, stats["entries"])]
+    yield "detector_cache_bytes", "gauge", "Bytes in the in-memory result cache", [({}, stats["bytes"])]
+    yield "detector_cache_hit_rate", "gauge", "Result cache hit rate since start", [({}, stats["hit_rate"])]
+    if text_dedup is not None:
+        yield "detector_text_dedup_entries", "gauge", "Texts and windows in the near-duplicate index", [
+            ({}, text_dedup.stats()["entries"])
+        ]
+    if phash_index is not None:
+        yield "detector_phash_entries", "gauge", "Images in the perceptual hash index", [
+            ({}, phash_index.stats()["entries"])
+        ]
+
+metrics.REGISTRY.add_collector(cache_metrics)
+
 ###############################
 # TEXT MODEL
 ###############################
 MODEL_PATH = os.path.join(BASE_DIR, "text_model.pkl")
-with open(MODEL_PATH, "rb") as f:
-    text_model = pickle.load(f)
+# Memory-mapped artifacts (see model_artifacts.py) load in milliseconds and are
+# shared between workers; the pickle is only a fallback
+TEXT_MODEL_DIR = os.getenv("TEXT_MODEL_DIR", os.path.join(BASE_DIR, "text_model"))
+# TEXT_MODEL_ID is the pickle checksum, identifying the text model in cache keys
+text_model, TEXT_MODEL_ID, TEXT_MODEL_VERSION = load_text_model(TEXT_MODEL_DIR, MODEL_PATH)
+# Pure-NumPy predict_proba, verified against the sklearn pipeline at startup;
+# falls back to sklearn if the pipeline is not supported (TEXT_FASTPATH=0 disables)
+text_classifier = compile_text_model(text_model) or text_model
+
+TEXT_BATCH_CHUNK_SIZE = int(os.getenv("TEXT_BATCH_CHUNK_SIZE", "256"))
+TEXT_BATCH_MAX_CHUNK_SIZE = 4096
 
-def detect_text_model(text):
-    prob = text_model.predict_proba([text])[0]
-    return {"ai": float(prob[1]), "human": float(prob[0])}
+def predict_text_batch(texts):
+    """Score a list of strings with one vectorized predict_proba call"""
+    texts = list(texts)
+    metrics.MODEL_BATCH_SIZE.observe(len(texts), model="text")
+    probs = text_classifier.predict_proba(texts)
+    return [{"ai": float(prob[1]), "human": float(prob[0])} for prob in probs]
+
+def detect_text_model(text, reducer=None, predict_batch=predict_text_batch):
+    """
+    Score one text; long texts are scored as overlapping windows
+    
+    Returns:
+        {"ai", "human"}, plus "reducer" and per-window "spans" for long texts
+    """
+    if needs_chunking(text):
+        return score_windows(text, predict_batch, reducer=reducer)
+    return predict_batch([text])[0]
+
+# Scores of near-identical texts (after normalization) and of overlapping
+# windows are reused (TEXT_DEDUP=0 disables; see text_dedup.py)
+text_dedup = TextDedupIndex() if os.getenv("TEXT_DEDUP", "1") != "0" else None
+
+def detect_text_dedup(text, reducer=None, bypass=False):
+    """
+    detect_text_model through the near-duplicate index
+
+    Args:
+        bypass: Rescore instead of reusing stored scores (the fresh ones are stored)
+
+    Returns:
+        The detect_text_model result plus "cached" (score reused), and
+        "reused_windows" for long texts
+    """
+    if text_dedup is None:
+        return dict(detect_text_model(text, reducer=reducer), cached=False)
+
+    if needs_chunking(text):
+        # Spans must point into this text, so only window scores are reused
+        reused = 0
+        def predict_windows(windows):
+            nonlocal reused
+            results, hits = text_dedup.predict_batch(predict_text_batch, windows, refresh=bypass)
+            reused += hits
+            return results
+        result = detect_text_model(text, reducer=reducer, predict_batch=predict_windows)
+        return dict(result, cached=reused == len(result["spans"]), reused_windows=reused)
+
+    if bypass:
+        hit, fingerprint = None, text_dedup.fingerprint(text, "score")
+    else:
+        hit, fingerprint = text_dedup.lookup(text)
+    if hit is not None:
+        return dict(hit, cached=True)
+    result = predict_text_batch([text])[0]
+    text_dedup.add(fingerprint, result)
+    return dict(result, cached=False)
+
+def score_text_chunk(chunk):
+    """
+    Score a chunk of (index, text) pairs
+
+    Short texts share one vectorized call; long texts are window-scored on
+    their own. Falls back to one call per item if the vectorized call fails,
+    so a single bad input only fails its own entry.
+    """
+    short = [(index, text) for index, text in chunk if not needs_chunking(text)]
+    out = {}
+    try:
+        results = predict_text_batch([text for _, text in short]) if short else []
+        for (index, _), result in zip(short, results):
+            out[index] = dict(index=index, **result)
+    except Exception:
+        pass
+
+    for index, text in chunk:
+        if index in out:
+            continue
+        try:
+            out[index] = dict(index=index, **detect_text_model(text))
+        except Exception as e:
+            out[index] = {"index": index, "error": str(e)}
+    return [out[index] for index, _ in chunk]
+
+def iter_batch_items():
+    """Yield (index, text_or_error) for a JSON list body or an NDJSON stream"""
+    content_type = (request.mimetype or "").lower()
+
+    if content_type in ("application/x-ndjson", "application/jsonl", "application/ndjson"):
+        # Read line by line so huge uploads are never parsed in one piece
+        index = 0
+        for line in request.stream:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                item = json.loads(line)
+            except ValueError as e:
+                yield index, ValueError(f"Invalid JSON line: {e}")
+            else:
+                yield index, item
+            index += 1
+        return
+
+    body = request.get_json(silent=True)
+    items = body.get("texts") if isinstance(body, dict) else body
+    if not isinstance(items, list):
+        raise ValueError('Expected a JSON list, {"texts": [...]} or an NDJSON body')
+    for index, item in enumerate(items):
+        yield index, item
+
+def iter_text_batch_results(items, chunk_size):
+    """Validate items, score them chunk by chunk and yield results in input order"""
+    chunk = []
+    for index, item in items:
+        if isinstance(item, dict):
+            item = item.get("text")
+
+        if isinstance(item, Exception):
+            error = str(item)
+        elif not isinstance(item, str) or not item.strip():
+            error = "Item must be a non-empty string or an object with a 'text' field"
+        else:
+            error = None
+
+        if error:
+            # Flush pending work first to keep output ordered
+            if chunk:
+                yield from score_text_chunk(chunk)
+                chunk = []
+            yield {"index": index, "error": error}
+            continue
+
+        chunk.append((index, item))
+        if len(chunk) >= chunk_size:
+            yield from score_text_chunk(chunk)
+            chunk = []
+
+    if chunk:
+        yield from score_text_chunk(chunk)
 
 @app.post("/detect/text")
+@admission.limit("text")
 def detect_text():
     text = request.json["text"]
-    return detect_text_model(text)
+    reducer = request.json.get("reducer") or DEFAULT_REDUCER
+    if reducer not in REDUCERS:
+        return jsonify({"error": f"Unknown reducer. Choose from: {', '.join(REDUCERS)}"}), 400
+    # Long texts come back with spans (offsets into the text as sent), so only
+    # texts scored whole share an entry across whitespace and encoding variants
+    cache_text = text if needs_chunking(text) else normalize_text(text)
+    key = result_cache.make_key("text", TEXT_MODEL_ID, reducer, cache_text)
+    bypass = cache_bypassed()
+    return cached_response(key, lambda: detect_text_dedup(text, reducer=reducer, bypass=bypass), flag_hits=True)
+
+@app.post("/detect/text/batch")
+@admission.limit("batch")
+def detect_text_batch():
+    """
+    Score many texts at once
+    Accepts a JSON list, {"texts": [...], "chunk_size": n} or NDJSON lines;
+    streams back one NDJSON result per input, in order
+    """
+    chunk_size = request.args.get("chunk_size", type=int)
+    if chunk_size is None and request.is_json:
+        body = request.get_json(silent=True)
+        if isinstance(body, dict):
+            chunk_size = body.get("chunk_size")
+    if not isinstance(chunk_size, int) or chunk_size <= 0:
+        chunk_size = TEXT_BATCH_CHUNK_SIZE
+    chunk_size = min(chunk_size, TEXT_BATCH_MAX_CHUNK_SIZE)
+
+    items = iter_batch_items()
+    try:
+        first = next(items, None)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    def generate():
+        if first is None:
+            return
+        all_items = itertools.chain([first], items)
+        for result in iter_text_batch_results(all_items, chunk_size):
+            yield json.dumps(result) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
 
 ###############################
 # IMAGE MODEL (HF ViT)
@@ -45,81 +384,349 @@ processor = AutoImageProcessor.from_pretrained(MODEL_NAME)
 image_model = AutoModelForImageClassification.from_pretrained(MODEL_NAME)
 image_model.eval()
 
-def predict_image_model(img):
-    inputs = processor(images=img, return_tensors="pt")
+# Inference backend: eager, quantized, torchscript[-int8] or onnx[-int8]
+IMAGE_BACKEND = os.getenv("IMAGE_BACKEND", "eager")
+try:
+    image_backend = create_backend(
+        IMAGE_BACKEND, image_model, processor_image_size(processor), MODEL_NAME
+    )
+except Exception as e:
+    logger.warning(f"Image backend '{IMAGE_BACKEND}' unavailable ({e}), using eager")
+    image_backend = create_backend("eager", image_model, processor_image_size(processor), MODEL_NAME)
+
+# Vectorized resize/normalize using the processor's own parameters; set
+# IMAGE_PREPROCESS=hf to go through AutoImageProcessor instead
+IMAGE_PREPROCESS = os.getenv("IMAGE_PREPROCESS", "fast")
+fast_preprocessor = FastImagePreprocessor(processor) if IMAGE_PREPROCESS == "fast" else None
+if fast_preprocessor is not None:
+    # The fast path only mirrors the processor's settings; don't trust it if the output differs
+    preprocess_drift = fast_preprocessor.drift(processor)
+    if preprocess_drift > FastImagePreprocessor.MAX_DRIFT:
+        logger.warning(
+            f"Fast image preprocessing differs from the HF processor (mean abs {preprocess_drift:.4f}), using hf"
+        )
+        IMAGE_PREPROCESS = "hf"
+        fast_preprocessor = None
+
+# Quantized/exported backends and the fast preprocessor can shift scores
+# slightly, so each combination gets its own cache entries
+IMAGE_MODEL_ID = f"{MODEL_NAME}:{image_backend.name}:{IMAGE_PREPROCESS}"
+
+def preprocess_images(images, bgr=False):
+    """PIL images or uint8 arrays (RGB, or BGR with bgr=True) -> pixel_values"""
+    if fast_preprocessor is not None:
+        return fast_preprocessor(images, bgr=bgr)
+    if bgr:
+        images = [Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)) for frame in images]
+    return processor(images=list(images), return_tensors="pt")["pixel_values"]
+
+def predict_image_batch(images, bgr=False, endpoint="image"):
+    """Score a batch of images in one forward pass, one softmax row per image"""
+    metrics.MODEL_BATCH_SIZE.observe(len(images), model="image")
+    with metrics.stage(endpoint, "preprocess"):
+        pixel_values = preprocess_images(images, bgr=bgr)
     with torch.no_grad():
-        logits = image_model(**inputs).logits
-        probs = F.softmax(logits, dim=1)[0].cpu().numpy()
+        with metrics.stage(endpoint, "forward"):
+            logits = image_backend(pixel_values)
+        with metrics.stage(endpoint, "postprocess"):
+            probs = F.softmax(logits, dim=1).cpu().numpy()
+    return probs
+
+# Coalesce concurrent /detect/image requests into shared forward passes
+image_batcher = ImageBatcher(predict_image_batch)
+
+def predict_image_model(img):
+    probs = image_batcher.submit(img)
     return {"ai": float(probs[0]), "human": float(probs[1])}
 
+# Re-encoded/resized copies of scored images reuse the stored result instead of
+# a forward pass (PHASH_INDEX=0 disables; see phash_index.py for thresholds)
+if os.getenv("PHASH_INDEX", "1") != "0":
+    phash_index = PerceptualHashIndex(
+        IMAGE_MODEL_ID,
+        path=os.getenv("PHASH_INDEX_PATH", os.path.join(tempfile.gettempdir(), "ai_detector_phash.json"))
+    )
+else:
+    phash_index = None
+
 @app.post("/detect/image")
+@admission.limit("image")
 def detect_image():
-    img = Image.open(request.files["image"].stream).convert("RGB")
-    return predict_image_model(img)
+    data = request.files["image"].read()
+    key = result_cache.make_key("image", IMAGE_MODEL_ID, data)
+    bypass = cache_bypassed()
+
+    def compute():
+        with metrics.stage("image", "decode"):
+            img = Image.open(io.BytesIO(data)).convert("RGB")
+        if phash_index is None:
+            return predict_image_model(img)
+
+        with metrics.stage("image", "phash"):
+            # A bypass rescores and replaces whatever a near-duplicate left in the index
+            match, p, d = phash_index.lookup(img, refresh=bypass)
+        if match is not None:
+            return match
+        result = predict_image_model(img)
+        phash_index.add(p, d, result)
+        return result
+
+    return cached_response(key, compute)
 
 ###############################
 # VIDEO PROCESSING
 ###############################
+VIDEO_BATCH_SIZE = int(os.getenv("VIDEO_BATCH_SIZE", "8"))
+
+# 'adaptive' scores frames on scene changes within a budget and stops once the
+# estimate converges (see frame_sampler.py); 'fixed' scores one frame per second
+VIDEO_SAMPLING = os.getenv("VIDEO_SAMPLING", "adaptive")
+if VIDEO_SAMPLING == "adaptive":
+    VIDEO_SAMPLING_ID = (
+        f"adaptive:scan={SceneChangeSampler.SCAN_FPS},t={SceneChangeSampler.THRESHOLD},"
+        f"gap={SceneChangeSampler.MIN_GAP}-{SceneChangeSampler.MAX_GAP},budget={SceneChangeSampler.BUDGET},"
+        f"tol={RunningEstimate.TOLERANCE},min={RunningEstimate.MIN_FRAMES}"
+    )
+else:
+    VIDEO_SAMPLING_ID = "fps=1"
+
+def iter_frames(path, fps=1):
+    """Yield sampled frames as BGR arrays (decoder from VIDEO_DECODER, see video_decode.py)"""
+    for _, frame in iter_timed_frames(path, fps=fps):
+        yield frame
+
 def extract_frames(path, fps=1):
+    return [
+        Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+        for frame in iter_frames(path, fps=fps)
+    ]
+
+def iter_batches(items, batch_size):
+    """Group an iterable into lists of at most batch_size items"""
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def video_info(path):
+    """(fps, frame count, duration seconds) from the container; 0 when unknown"""
     cap = cv2.VideoCapture(path)
-    frames = []
-    video_fps = cap.get(cv2.CAP_PROP_FPS)
+    try:
+        video_fps = cap.get(cv2.CAP_PROP_FPS)
+        frame_count = cap.get(cv2.CAP_PROP_FRAME_COUNT)
+    finally:
+        cap.release()
+    duration = frame_count / video_fps if video_fps and frame_count > 0 else 0
+    return video_fps, frame_count, duration
+
+def estimate_sampled_frames(path, fps=1):
+    """Rough number of frames iter_frames will yield (for progress reporting)"""
+    video_fps, frame_count, _ = video_info(path)
     interval = max(int(video_fps // fps), 1)
+    return max(int(frame_count // interval), 1)
+
+def score_frames(frames, batch_size=VIDEO_BATCH_SIZE, progress=None, estimate=None):
+    """
+    Score a stream of BGR frames in fixed-size batches
+
+    Args:
+        progress: Optional callback receiving the number of frames scored so far
+        estimate: Optional RunningEstimate; scoring stops once it has converged
+
+    Returns:
+        (mean probability row, frame count) - only one batch is held in memory
+    """
+    total = None
+    count = 0
+    # Frames are decoded lazily, so decode time is what it takes to fill a batch
+    decode_seconds = 0.0
+    started = time.perf_counter()
+    for batch in iter_batches(frames, batch_size):
+        decode_seconds += time.perf_counter() - started
+        probs = predict_image_batch(batch, bgr=True, endpoint="video")
+        batch_sum = probs.sum(axis=0)
+        total = batch_sum if total is None else total + batch_sum
+        count += len(batch)
+        if progress:
+            progress(count)
+        if estimate is not None:
+            estimate.update(probs[:, 0])
+            if estimate.converged:
+                break
+        started = time.perf_counter()
+    else:
+        decode_seconds += time.perf_counter() - started
+    if hasattr(frames, "close"):
+        # Release the decoder now rather than when the generator is collected
+        frames.close()
+    metrics.STAGE_SECONDS.observe(decode_seconds, endpoint="video", stage="decode")
+
+    if not count:
+        return None, 0
+    return total / count, count
+
+def video_cache_key(path, digest=None):
+    # Sampling settings and the decoder (keyframe mode picks different frames)
+    # are part of what produced the result
+    return result_cache.make_key(
+        "video", IMAGE_MODEL_ID, VIDEO_SAMPLING_ID, VIDEO_DECODER, digest or file_sha256(path)
+    )
+
+def analyze_video(path, progress=None):
+    """
+    Score a video file on disk
+
+    Args:
+        progress: Optional job progress callback progress(fraction, message)
+
+    Returns:
+        (result, status)
+    """
+    sampler = estimate = None
+    if VIDEO_SAMPLING == "adaptive":
+        _, _, duration = video_info(path)
+        sampler = SceneChangeSampler(duration=duration)
+        estimate = RunningEstimate()
+        frames = sampler.select(iter_timed_frames(path, fps=sampler.SCAN_FPS))
+        expected = sampler.budget
+    else:
+        frames = iter_frames(path, fps=1)
+        expected = estimate_sampled_frames(path, fps=1) if progress else None
 
-    idx = 0
-    ok, frame = cap.read()
-    while ok:
-        if idx % interval == 0:
-            frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            frames.append(Image.fromarray(frame_rgb))
-        idx += 1
-        ok, frame = cap.read()
+    frame_progress = None
+    if progress:
+        frame_progress = lambda done: progress(min(done / expected, 0.99), f"Scored {done} frames")
 
-    cap.release()
-    return frames
+    # Stream sampled frames through the image model in batches
+    avg, frame_count = score_frames(frames, progress=frame_progress, estimate=estimate)
+    
+    metrics.VIDEO_FRAMES.observe(frame_count)
+    if not frame_count:
+        return {"error": "No frames could be extracted from video"}, 400
+    
+    result = {
+        "ai": float(avg[0]),
+        "human": float(avg[1]),
+        "frame_count": frame_count
+    }
+    if sampler is not None:
+        result["sampling"] = {
+            "mode": "adaptive",
+            "frames_scanned": sampler.scanned,
+            "early_stopped": estimate.converged
+        }
+    return result, 200
 
 @app.post("/detect/video")
+@admission.limit("video")
 def detect_video():
     file = request.files["video"]
     
-    # Create temporary file with proper extension
-    temp_dir = tempfile.gettempdir()
-    path = os.path.join(temp_dir, "video_upload.mp4")
+    # The upload was spooled to a unique file while the body streamed in
+    with upload_path(file) as path:
+        key = video_cache_key(path, upload_sha256(file))
+        return cached_response(key, lambda: analyze_video(path))
+
+###############################
+# DOCUMENT PROCESSING
+###############################
+def document_cache_key(filename, file_data):
+    # Filename is echoed in the response, so it is part of the key
+    return result_cache.make_key("document", TEXT_MODEL_ID, filename, file_data)
+
+def analyze_document(file_data, filename, progress=None):
+    """
+    Extract text from a document and run AI detection on it
     
+    Args:
+        progress: Optional job progress callback progress(fraction, message)
+    
+    Returns:
+        (result, status)
+    """
+    # Process document (extract text and metadata)
     try:
-        file.save(path)
-        
-        # Extract frames from video
-        frames = extract_frames(path, fps=1)
-        
-        if not frames:
-            return {"error": "No frames could be extracted from video"}, 400
-        
-        results = []
-        
-        # Process each frame through the image model
-        for frame in frames:
-            out = predict_image_model(frame)
-            results.append([out["ai"], out["human"]])
-        
-        # Calculate average across all frames
-        avg = np.mean(results, axis=0)
-        
+        with metrics.stage("document", "extract"):
+            doc_info = document_processor.process_document(file_data, filename)
+    except ValueError as e:
+        return {"error": str(e)}, 400
+    except RuntimeError as e:
+        return {"error": str(e)}, 500
+    
+    if progress:
+        progress(0.4, "Text extracted")
+    
+    # Get extracted text
+    full_text = doc_info.get('full_text', '')
+    
+    if not full_text or len(full_text.strip()) < 10:
         return {
-            "ai": float(avg[0]),
-            "human": float(avg[1]),
-            "frame_count": len(frames)
-        }
+            "error": "Could not extract sufficient text from document",
+            "details": doc_info
+        }, 400
     
-    finally:
-        # Clean up temporary file
-        if os.path.exists(path):
-            os.remove(path)
+    # Run AI detection on the extracted text
+    with metrics.stage("document", "score"):
+        detection_result = detect_text_model(full_text)
+    
+    if progress:
+        progress(0.7, "Document scored")
+    
+    # Page-by-page analysis for PDFs
+    page_results = []
+    if doc_info.get('file_type') == 'pdf' and 'pages' in doc_info:
+        scored_pages = []
+        for page_data in doc_info['pages']:
+            page_text = page_data.get('text', '').strip()
+            if page_text and len(page_text) > 10:
+                scored_pages.append((page_data, page_text))
+        
+        # One vectorized call for all pages
+        with metrics.stage("document", "page_score"):
+            page_detections = predict_text_batch([text for _, text in scored_pages]) if scored_pages else []
+        for (page_data, _), page_detection in zip(scored_pages, page_detections):
+            page_results.append({
+                "page": page_data['page'],
+                "ai_score": round(page_detection['ai'] * 100, 2),
+                "human_score": round(page_detection['human'] * 100, 2),
+                "char_count": page_data['char_count']
+            })
+    
+    # Compile full response
+    return {
+        "success": True,
+        "document_info": {
+            "filename": doc_info['filename'],
+            "file_type": doc_info['file_type'],
+            "page_count": doc_info.get('page_count', 1),
+            "total_characters": doc_info['total_characters'],
+            "total_words": doc_info['total_words'],
+            "metadata": doc_info.get('metadata', {})
+        },
+        "detection_results": {
+            "ai_score": round(detection_result['ai'] * 100, 2),
+            "human_score": round(detection_result['human'] * 100, 2),
+            "confidence": "high" if abs(detection_result['ai'] - detection_result['human']) > 0.3 else "medium",
+            "span_analysis": [
+                {
+                    "start": span["start"],
+                    "end": span["end"],
+                    "ai_score": round(span["ai"] * 100, 2),
+                    "human_score": round(span["human"] * 100, 2)
+                }
+                for span in detection_result.get("spans", [])
+            ] or None
+        },
+        "page_analysis": page_results if page_results else None,
+        "text_preview": full_text[:500] + "..." if len(full_text) > 500 else full_text
+    }, 200
 
-###############################
-# DOCUMENT PROCESSING
-###############################
 @app.post("/detect/document")
+@admission.limit("document")
 def detect_document():
     """
     Process and analyze documents (PDF, DOCX, TXT)
@@ -139,66 +746,163 @@ def detect_document():
         file_data = file.read()
         filename = file.filename
         
-        # Process document (extract text and metadata)
-        try:
-            doc_info = document_processor.process_document(file_data, filename)
-        except ValueError as e:
-            return jsonify({"error": str(e)}), 400
-        except RuntimeError as e:
-            return jsonify({"error": str(e)}), 500
-        
-        # Get extracted text
-        full_text = doc_info.get('full_text', '')
-        
-        if not full_text or len(full_text.strip()) < 10:
-            return jsonify({
-                "error": "Could not extract sufficient text from document",
-                "details": doc_info
-            }), 400
-        
-        # Run AI detection on the extracted text
-        detection_result = detect_text_model(full_text)
-        
-        # Page-by-page analysis for PDFs
-        page_results = []
-        if doc_info.get('file_type') == 'pdf' and 'pages' in doc_info:
-            for page_data in doc_info['pages']:
-                page_text = page_data.get('text', '').strip()
-                if page_text and len(page_text) > 10:
-                    page_detection = detect_text_model(page_text)
-                    page_results.append({
-                        "page": page_data['page'],
-                        "ai_score": round(page_detection['ai'] * 100, 2),
-                        "human_score": round(page_detection['human'] * 100, 2),
-                        "char_count": page_data['char_count']
-                    })
-        
-        # Compile full response
-        response = {
-            "success": True,
-            "document_info": {
-                "filename": doc_info['filename'],
-                "file_type": doc_info['file_type'],
-                "page_count": doc_info.get('page_count', 1),
-                "total_characters": doc_info['total_characters'],
-                "total_words": doc_info['total_words'],
-                "metadata": doc_info.get('metadata', {})
-            },
-            "detection_results": {
-                "ai_score": round(detection_result['ai'] * 100, 2),
-                "human_score": round(detection_result['human'] * 100, 2),
-                "confidence": "high" if abs(detection_result['ai'] - detection_result['human']) > 0.3 else "medium"
-            },
-            "page_analysis": page_results if page_results else None,
-            "text_preview": full_text[:500] + "..." if len(full_text) > 500 else full_text
-        }
-        
-        return jsonify(response), 200
+        key = document_cache_key(filename, file_data)
+        return cached_response(key, lambda: analyze_document(file_data, filename))
         
     except Exception as e:
         import traceback
         traceback.print_exc()
         return jsonify({"error": f"Server error: {str(e)}"}), 500
 
+###############################
+# BACKGROUND JOBS
+###############################
+job_queue = JobQueue()
+
+def run_cached_job(key, compute):
+    """Run a job body through the result cache"""
+    hit = result_cache.get(key)
+    if hit is not None:
+        return hit, 200
+    result, status = compute()
+    if status == 200:
+        result_cache.set(key, result)
+    return result, status
+
+def admitted(lane, handler):
+    """
+    Run a job handler inside an admission slot of `lane`
+
+    Jobs share the worker's capacity with synchronous requests of the same
+    kind; while the lane is full the job waits (cancellably) instead of failing.
+    """
+    def run(payload, progress):
+        while True:
+            try:
+                admission.acquire(lane)
+                break
+            except Rejected as e:
+                progress(0.0, "Waiting for capacity")
+                time.sleep(min(e.retry_after, 5))
+        try:
+            return handler(payload, progress)
+        finally:
+            admission.release(lane)
+    return run
+
+def video_job(payload, progress):
+    return run_cached_job(
+        video_cache_key(payload["path"], payload.get("sha256")),
+        lambda: analyze_video(payload["path"], progress=progress)
+    )
+
+def document_job(payload, progress):
+    file_data, filename = payload["file_data"], payload["filename"]
+    return run_cached_job(
+        document_cache_key(filename, file_data),
+        lambda: analyze_document(file_data, filename, progress=progress)
+    )
+
+job_queue.register("video", admitted("video", video_job))
+job_queue.register("document", admitted("document", document_job))
+
+def job_response(record):
+    """Public view of a job record"""
+    job_id = record["job_id"]
+    return {
+        **{k: v for k, v in record.items() if k not in ("owner_pid", "files")},
+        "links": {"self": f"/jobs/{job_id}", "events": f"/jobs/{job_id}/events"}
+    }
+
+@app.post("/jobs")
+def submit_job():
+    """
+    Queue a video or document analysis
+    Multipart form with a 'video' or 'document' file and an optional 'priority'
+    """
+    priority = request.form.get("priority", 0, type=int)
+
+    if "video" in request.files:
+        file = request.files["video"]
+        # The job outlives the request, so take ownership of the spooled file
+        path = detach_upload(file)
+        payload = {"path": path, "sha256": upload_sha256(file)}
+        submit = lambda: job_queue.submit("video", payload, priority=priority, files=[path])
+    elif "document" in request.files:
+        file = request.files["document"]
+        if file.filename == '':
+            return jsonify({"error": "No file selected"}), 400
+        payload = {"file_data": file.read(), "filename": file.filename}
+        path = None
+        submit = lambda: job_queue.submit("document", payload, priority=priority)
+    else:
+        return jsonify({"error": "Provide a 'video' or 'document' file"}), 400
+
+    try:
+        record = submit()
+    except QueueFull as e:
+        if path:
+            os.remove(path)
+        response = jsonify({"error": str(e)})
+        response.status_code = 503
+        response.headers["Retry-After"] = "30"
+        return response
+
+    return jsonify(job_response(record)), 202
+
+@app.get("/jobs/<job_id>")
+def get_job(job_id):
+    record = job_queue.get(job_id)
+    if record is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job_response(record))
+
+@app.delete("/jobs/<job_id>")
+def cancel_job(job_id):
+    record = job_queue.cancel(job_id)
+    if record is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job_response(record))
+
+# Each event stream holds a gunicorn thread, so streams end after a while and
+# clients reconnect (EventSource does so on its own) or poll /jobs/<id>
+JOB_EVENTS_MAX_SECONDS = float(os.getenv("JOB_EVENTS_MAX_SECONDS", "30"))
+JOB_EVENTS_RETRY_MS = int(os.getenv("JOB_EVENTS_RETRY_MS", "2000"))
+
+@app.get("/jobs/<job_id>/events")
+def job_events(job_id):
+    """
+    Server-sent events with job progress for up to JOB_EVENTS_MAX_SECONDS
+
+    A stream ends with the final record once the job finishes, or with a
+    'reconnect' event while it is still running.
+    """
+    if job_queue.get(job_id) is None:
+        return jsonify({"error": "Job not found"}), 404
+
+    def generate():
+        yield f"retry: {JOB_EVENTS_RETRY_MS}\n\n"
+        deadline = time.monotonic() + JOB_EVENTS_MAX_SECONDS
+        last = None
+        while True:
+            record = job_queue.get(job_id)
+            if record is None:
+                yield "event: error\ndata: {\"error\": \"Job expired\"}\n\n"
+                return
+            state = (record["status"], record["progress"], record["message"], record["cancel_requested"])
+            if state != last:
+                last = state
+                yield f"data: {json.dumps(job_response(record))}\n\n"
+            if record["status"] in FINISHED_STATES:
+                return
+            if time.monotonic() >= deadline:
+                yield f"event: reconnect\ndata: {json.dumps({'retry_ms': JOB_EVENTS_RETRY_MS})}\n\n"
+                return
+            time.sleep(0.5)
+
+    return Response(generate(), mimetype="text/event-stream", headers={"Cache-Control": "no-cache"})
+
 if __name__ == "__main__":
+    # Jobs from a previous run died with it (gunicorn does this in on_starting)
+    recover_orphans(job_queue.store)
     app.run(host="0.0.0.0", port=8000)
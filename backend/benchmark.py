@@ -0,0 +1,447 @@
+"""
+Benchmark suite for the detection endpoints
+Builds synthetic inputs locally and reports latency percentiles, throughput and per-case peak RSS as JSON
+
+Usage:
+    python benchmark.py                               # run everything, print JSON
+    python benchmark.py --only text,image --iterations 50
+    python benchmark.py --save-baseline bench_baseline.json
+    python benchmark.py --baseline bench_baseline.json --threshold 0.15
+"""
+
+import os
+import io
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import tempfile
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+import cv2
+import numpy as np
+from PIL import Image
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+WORDS = (
+    "the model data system analysis result people time world research study language "
+    "important however therefore example design process information quickly because "
+    "between learning network detection image video document simple complex human "
+    "machine generated written across different several often never always general"
+).split()
+
+
+###############################
+# SYNTHETIC INPUTS
+###############################
+def make_text(rng: random.Random, words: int) -> str:
+    sentences = []
+    remaining = words
+    while remaining > 0:
+        length = min(rng.randint(8, 20), remaining)
+        sentence = " ".join(rng.choice(WORDS) for _ in range(length))
+        sentences.append(sentence.capitalize() + ".")
+        remaining -= length
+    return " ".join(sentences)
+
+
+def make_image(rng: np.random.Generator, size: int = 512, fmt: str = "JPEG") -> bytes:
+    """Gradient plus noise, so the encoder cannot shortcut the work"""
+    y, x = np.mgrid[0:size, 0:size]
+    base = np.stack([x * 255 // size, y * 255 // size, (x + y) * 255 // (2 * size)], axis=-1)
+    noise = rng.integers(0, 64, size=(size, size, 3))
+    pixels = np.clip(base + noise, 0, 255).astype(np.uint8)
+    buf = io.BytesIO()
+    Image.fromarray(pixels).save(buf, format=fmt, quality=90)
+    return buf.getvalue()
+
+
+def make_video(path: str, rng: np.random.Generator, seconds: int = 10, fps: int = 24, size=(320, 240)) -> str:
+    """Moving rectangles over noise, written with cv2.VideoWriter"""
+    width, height = size
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), fps, size)
+    if not writer.isOpened():
+        raise RuntimeError("cv2.VideoWriter could not open an mp4v stream")
+    try:
+        background = rng.integers(0, 255, size=(height, width, 3), dtype=np.uint8)
+        for i in range(seconds * fps):
+            frame = background.copy()
+            offset = (i * 4) % width
+            cv2.rectangle(frame, (offset, 40), (offset + 60, 120), (0, 0, 255), -1)
+            cv2.circle(frame, (width - offset, height // 2), 30, (0, 255, 0), -1)
+            writer.write(frame)
+    finally:
+        writer.release()
+    return path
+
+
+def make_pdf(rng: random.Random, pages: int = 20, words_per_page: int = 300) -> bytes:
+    import fitz
+    doc = fitz.open()
+    try:
+        for _ in range(pages):
+            page = doc.new_page()
+            rect = fitz.Rect(50, 50, page.rect.width - 50, page.rect.height - 50)
+            page.insert_textbox(rect, make_text(rng, words_per_page), fontsize=9)
+        return doc.tobytes()
+    finally:
+        doc.close()
+
+
+def make_docx(rng: random.Random, paragraphs: int = 40, words_per_paragraph: int = 80) -> bytes:
+    from docx import Document
+    doc = Document()
+    for _ in range(paragraphs):
+        doc.add_paragraph(make_text(rng, words_per_paragraph))
+    buf = io.BytesIO()
+    doc.save(buf)
+    return buf.getvalue()
+
+
+class Inputs:
+    """All synthetic inputs, generated once from a seed"""
+
+    def __init__(
+        self,
+        workdir: str,
+        seed: int = 0,
+        video_seconds: int = 10,
+        pdf_pages: int = 20,
+        video_size=(320, 240)
+    ):
+        rng = random.Random(seed)
+        np_rng = np.random.default_rng(seed)
+
+        self.short_text = make_text(rng, 60)
+        self.long_text = make_text(rng, 3000)
+        self.text_batch = [make_text(rng, rng.randint(30, 120)) for _ in range(64)]
+        self.image_bytes = make_image(np_rng)
+        self.image = Image.open(io.BytesIO(self.image_bytes)).convert("RGB")
+        self.video_seconds = video_seconds
+        self.video_path = make_video(
+            os.path.join(workdir, "bench.mp4"), np_rng, seconds=video_seconds, size=video_size
+        )
+        with open(self.video_path, "rb") as f:
+            self.video_bytes = f.read()
+        self.pdf_bytes = make_pdf(rng, pages=pdf_pages)
+        self.docx_bytes = make_docx(rng)
+
+
+###############################
+# MEASUREMENT
+###############################
+def _proc_status_mb(field: str) -> Optional[float]:
+    """A memory field of /proc/self/status in MiB (Linux only)"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+
+def rss_mb() -> Optional[float]:
+    """Current resident set size of this process"""
+    return _proc_status_mb("VmRSS")
+
+
+def reset_peak_rss() -> bool:
+    """Restart peak RSS tracking, so the next peak_rss_mb() covers only what follows (Linux only)"""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Peak resident set size since the last reset_peak_rss() (or process start)"""
+    peak = _proc_status_mb("VmHWM")
+    if peak is not None or resource is None:
+        return peak
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return round(peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024, 1)
+
+
+def run_case(fn: Callable[[], None], items: int, iterations: int, warmup: int, concurrency: int) -> Dict:
+    """
+    Time fn() repeatedly
+
+    Args:
+        fn: One call of the operation under test
+        items: Inputs processed per call (for items/s)
+        iterations: Timed calls
+        warmup: Untimed calls first (model warmup, caches, lazy pools)
+        concurrency: Calls in flight at once
+
+    Memory is reported as the peak during this case's calls minus the RSS
+    before them; where the peak cannot be reset (non-Linux) it is the
+    process-wide peak, which earlier cases inflate, so no delta is given.
+    """
+    rss_before = rss_mb()
+    peak_is_per_case = reset_peak_rss()
+    for _ in range(warmup):
+        fn()
+
+    def timed(_):
+        started = time.perf_counter()
+        fn()
+        return time.perf_counter() - started
+
+    wall_started = time.perf_counter()
+    if concurrency > 1:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            latencies = list(pool.map(timed, range(iterations)))
+    else:
+        latencies = [timed(i) for i in range(iterations)]
+    wall = time.perf_counter() - wall_started
+    peak = peak_rss_mb()
+
+    ms = np.array(latencies) * 1000
+    return {
+        "iterations": iterations,
+        "concurrency": concurrency,
+        "p50_ms": round(float(np.percentile(ms, 50)), 3),
+        "p95_ms": round(float(np.percentile(ms, 95)), 3),
+        "p99_ms": round(float(np.percentile(ms, 99)), 3),
+        "mean_ms": round(float(ms.mean()), 3),
+        "calls_per_s": round(iterations / wall, 3),
+        "items_per_s": round(iterations * items / wall, 3),
+        "rss_before_mb": rss_before,
+        "peak_rss_mb": peak,
+        "peak_rss_delta_mb": round(peak - rss_before, 1) if peak_is_per_case and None not in (peak, rss_before) else None,
+    }
+
+
+###############################
+# CASES
+###############################
+def decode_cases(inputs: Inputs) -> Dict[str, tuple]:
+    """One case per video decoder, sampling at 1 fps (items are seconds of video)"""
+    from video_decode import DECODERS, PYAV_AVAILABLE, iter_timed_frames
+
+    cases = {}
+    for decoder in DECODERS:
+        if decoder != "cv2" and not PYAV_AVAILABLE:
+            continue
+        cases[f"direct.video.decode.{decoder}"] = (
+            "video", lambda decoder=decoder: sum(1 for _ in iter_timed_frames(inputs.video_path, 1, decoder=decoder)),
+            inputs.video_seconds
+        )
+    return cases
+
+
+def direct_cases(app_module, inputs: Inputs) -> Dict[str, tuple]:
+    """name -> (group, fn, items per call); calls the app's functions in-process"""
+    return {
+        **decode_cases(inputs),
+        "direct.text.short": ("text", lambda: app_module.detect_text_model(inputs.short_text), 1),
+        "direct.text.long": ("text", lambda: app_module.detect_text_model(inputs.long_text), 1),
+        "direct.text.batch64": ("text", lambda: app_module.predict_text_batch(inputs.text_batch), 64),
+        "direct.image": ("image", lambda: app_module.predict_image_model(inputs.image), 1),
+        "direct.video.extract_frames": ("video", lambda: app_module.extract_frames(inputs.video_path), 1),
+        "direct.video.analyze": ("video", lambda: app_module.analyze_video(inputs.video_path), 1),
+        "direct.document.pdf": (
+            "document", lambda: app_module.document_processor.process_document(inputs.pdf_bytes, "bench.pdf"), 1
+        ),
+        "direct.document.docx": (
+            "document", lambda: app_module.document_processor.process_document(inputs.docx_bytes, "bench.docx"), 1
+        ),
+    }
+
+
+def http_cases(app_module, inputs: Inputs) -> Dict[str, tuple]:
+    """
+    name -> (group, fn, items per call); goes through the Flask test client
+
+    Every request sends the cache bypass header, which also skips the pHash
+    and near-duplicate text indexes, so repeated inputs are scored by the
+    models rather than served from what warmup stored.
+    """
+    client = app_module.app.test_client()
+    headers = {app_module.CACHE_BYPASS_HEADER: "1"}
+
+    def post(path, **kwargs):
+        def call():
+            response = client.post(path, headers=headers, **kwargs)
+            # Drain streamed bodies so the whole request is timed
+            body = response.get_data()
+            if response.status_code != 200:
+                raise RuntimeError(f"{path} returned {response.status_code}: {body[:200]!r}")
+        return call
+
+    def upload(path, field, data, filename):
+        def call():
+            post(path, data={field: (io.BytesIO(data), filename)}, content_type="multipart/form-data")()
+        return call
+
+    return {
+        "http.text.short": ("text", post("/detect/text", json={"text": inputs.short_text}), 1),
+        "http.text.long": ("text", post("/detect/text", json={"text": inputs.long_text}), 1),
+        "http.text.batch64": ("text", post("/detect/text/batch", json=inputs.text_batch), 64),
+        "http.image": ("image", upload("/detect/image", "image", inputs.image_bytes, "bench.jpg"), 1),
+        "http.video": ("video", upload("/detect/video", "video", inputs.video_bytes, "bench.mp4"), 1),
+        "http.document.pdf": ("document", upload("/detect/document", "document", inputs.pdf_bytes, "bench.pdf"), 1),
+        "http.document.docx": (
+            "document", upload("/detect/document", "document", inputs.docx_bytes, "bench.docx"), 1
+        ),
+    }
+
+
+###############################
+# BASELINE COMPARISON
+###############################
+def compare(results: Dict, baseline: Dict, threshold: float) -> List[Dict]:
+    """
+    Cases that got slower than the baseline by more than threshold (0.15 = 15%)
+
+    p50 and p95 latency must not grow and items/s must not drop beyond the threshold.
+    """
+    regressions = []
+    for name, current in results["results"].items():
+        previous = baseline.get("results", {}).get(name)
+        if not previous or "error" in current or "error" in previous:
+            continue
+        for metric, higher_is_worse in (("p50_ms", True), ("p95_ms", True), ("items_per_s", False)):
+            old, new = previous.get(metric), current.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            if (change > threshold) if higher_is_worse else (change < -threshold):
+                regressions.append({
+                    "case": name, "metric": metric, "baseline": old, "current": new,
+                    "change": round(change, 4)
+                })
+    return regressions
+
+
+def environment() -> Dict:
+    info = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+    }
+    try:
+        info["git_commit"] = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)), check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        info["git_commit"] = None
+    return info
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the AI detection endpoints")
+    parser.add_argument("--only", help="Comma-separated groups: text,image,video,document")
+    parser.add_argument("--mode", default="direct,http", help="Comma-separated: direct,http")
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--video-seconds", type=int, default=10)
+    parser.add_argument("--video-size", default="320x240", help="WIDTHxHEIGHT, e.g. 1920x1080 for decode timing")
+    parser.add_argument("--pdf-pages", type=int, default=20)
+    parser.add_argument("--output", help="Write results JSON here (default: stdout)")
+    parser.add_argument("--baseline", help="Compare against a saved results JSON")
+    parser.add_argument("--threshold", type=float, default=0.15, help="Allowed slowdown vs baseline (fraction)")
+    parser.add_argument("--save-baseline", help="Also save these results as a baseline")
+    parser.add_argument("--keep-indexes", action="store_true", help="Leave the pHash/text dedup indexes enabled")
+    args = parser.parse_args()
+
+    groups = set(args.only.split(",")) if args.only else None
+    modes = set(args.mode.split(","))
+
+    # Near-duplicate indexes are off unless asked for: repeated inputs would
+    # otherwise be measured as index hits (and the pHash index saved to disk)
+    if not args.keep_indexes:
+        os.environ["PHASH_INDEX"] = "0"
+        os.environ["TEXT_DEDUP"] = "0"
+
+    # Importing the app loads both models
+    load_started = time.perf_counter()
+    import app as app_module
+    load_seconds = time.perf_counter() - load_started
+
+    results = {
+        "environment": {
+            **environment(),
+            "image_backend": app_module.image_backend.name,
+            "image_preprocess": app_module.IMAGE_PREPROCESS,
+            "text_fastpath": app_module.text_classifier is not app_module.text_model,
+            "app_import_seconds": round(load_seconds, 3),
+            "rss_after_import_mb": rss_mb(),
+            "peak_rss_after_import_mb": peak_rss_mb(),
+        },
+        "config": {
+            "iterations": args.iterations, "warmup": args.warmup, "concurrency": args.concurrency,
+            "seed": args.seed, "video_seconds": args.video_seconds, "video_size": args.video_size,
+            "pdf_pages": args.pdf_pages, "keep_indexes": args.keep_indexes,
+        },
+        "results": {},
+    }
+
+    with tempfile.TemporaryDirectory(prefix="ai_detector_bench_") as workdir:
+        video_size = tuple(int(v) for v in args.video_size.lower().split("x"))
+        inputs = Inputs(
+            workdir, seed=args.seed, video_seconds=args.video_seconds, pdf_pages=args.pdf_pages,
+            video_size=video_size
+        )
+
+        cases = {}
+        if "direct" in modes:
+            cases.update(direct_cases(app_module, inputs))
+        if "http" in modes:
+            cases.update(http_cases(app_module, inputs))
+
+        for name, (group, fn, items) in cases.items():
+            if groups and group not in groups:
+                continue
+            print(f"Running {name}...", file=sys.stderr)
+            try:
+                results["results"][name] = run_case(fn, items, args.iterations, args.warmup, args.concurrency)
+            except Exception as e:
+                results["results"][name] = {"error": str(e)}
+
+    exit_code = 0
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        results["regressions"] = regressions
+        for r in regressions:
+            print(
+                f"REGRESSION {r['case']} {r['metric']}: {r['baseline']} -> {r['current']} "
+                f"({r['change']:+.1%})",
+                file=sys.stderr
+            )
+        exit_code = 1 if regressions else 0
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            f.write(output)
+
+    sys.exit(exit_code)
+
+
+if __name__ == "__main__":
+    main()
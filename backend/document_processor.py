@@ -5,11 +5,16 @@ Extracts text from PDF, DOCX and other document formats
 
 import os
 import io
+import time
 import logging
+from concurrent.futures.process import BrokenProcessPool
 from typing import Dict, List, Optional, Tuple
 from pathlib import Path
 import base64
 
+import metrics
+from process_pool import WorkerPool
+
 # PDF processing
 try:
     import fitz  # PyMuPDF
@@ -29,6 +34,33 @@ except ImportError:
 logger = logging.getLogger(__name__)
 
 
+def _extract_pdf_pages(file_data: bytes, start: int, stop: int) -> List[Tuple[Dict, Optional[Dict], float]]:
+    """
+    Extract text, image counts and extraction seconds for pages [start, stop)
+    Runs in a worker process, which opens its own copy of the PDF
+    """
+    results = []
+    pdf_document = fitz.open(stream=file_data, filetype="pdf")
+    try:
+        for page_num in range(start, stop):
+            started = time.perf_counter()
+            page = pdf_document[page_num]
+            page_text = page.get_text()
+            image_list = page.get_images()
+            results.append((
+                {
+                    "page": page_num + 1,
+                    "text": page_text,
+                    "char_count": len(page_text)
+                },
+                {"page": page_num + 1, "count": len(image_list)} if image_list else None,
+                time.perf_counter() - started
+            ))
+    finally:
+        pdf_document.close()
+    return results
+
+
 class DocumentProcessor:
     """Extract text and metadata from various document formats"""
     
@@ -39,9 +71,15 @@ class DocumentProcessor:
     # Supported formats
     SUPPORTED_FORMATS = {'.pdf', '.docx', '.txt'}
     
+    # Parallel PDF extraction is opt-in: it forks processes from the web worker
+    # (smaller documents are not worth the process hop either way)
+    PDF_WORKERS = min(int(os.getenv("PDF_WORKERS", "0")), os.cpu_count() or 1)
+    PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "8"))
+    
     def __init__(self):
         """Initialize document processor"""
         self.supported_formats = self.SUPPORTED_FORMATS.copy()
+        self._pool = WorkerPool(self.PDF_WORKERS, "PDF extraction")
         
         if not PDF_AVAILABLE:
             self.supported_formats.discard('.pdf')
@@ -99,14 +137,15 @@ class DocumentProcessor:
         ext = Path(filename).suffix.lower()
         
         # Route to appropriate processor
-        if ext == '.pdf':
-            return self._process_pdf(file_data, filename)
-        elif ext == '.docx':
-            return self._process_docx(file_data, filename)
-        elif ext == '.txt':
-            return self._process_txt(file_data, filename)
-        else:
+        processors = {'.pdf': self._process_pdf, '.docx': self._process_docx, '.txt': self._process_txt}
+        if ext not in processors:
             raise ValueError(f"Unsupported format: {ext}")
+        
+        file_type = ext[1:]
+        with metrics.DOCUMENT_EXTRACT_SECONDS.time(file_type=file_type):
+            doc_info = processors[ext](file_data, filename)
+        metrics.DOCUMENT_PAGES.observe(doc_info.get('page_count', 1), file_type=file_type)
+        return doc_info
     
     def _process_pdf(self, file_data: bytes, filename: str) -> Dict:
         """Extract text and metadata from PDF"""
@@ -125,35 +164,20 @@ class DocumentProcessor:
                 logger.warning(f"PDF has {page_count} pages, limiting to {self.MAX_PAGES}")
                 page_count = self.MAX_PAGES
             
-            # Extract text from each page
+            pdf_document.close()
+            
+            # Extract text (and image counts, for future image detection) per page
             pages_text = []
-            total_text = []
             images = []
             
-            for page_num in range(page_count):
-                page = pdf_document[page_num]
-                
-                # Extract text
-                page_text = page.get_text()
-                pages_text.append({
-                    "page": page_num + 1,
-                    "text": page_text,
-                    "char_count": len(page_text)
-                })
-                total_text.append(page_text)
-                
-                # Extract images (optional - for future image detection)
-                image_list = page.get_images()
-                if image_list:
-                    images.append({
-                        "page": page_num + 1,
-                        "count": len(image_list)
-                    })
-            
-            pdf_document.close()
+            for page_data, page_images, seconds in self._extract_pages(file_data, page_count):
+                metrics.PDF_PAGE_SECONDS.observe(seconds)
+                pages_text.append(page_data)
+                if page_images:
+                    images.append(page_images)
             
             # Combine all text
-            full_text = "\n\n".join(total_text)
+            full_text = "\n\n".join(page["text"] for page in pages_text)
             
             return {
                 "filename": filename,
@@ -179,6 +203,28 @@ class DocumentProcessor:
             logger.error(f"PDF processing error: {e}")
             raise RuntimeError(f"Failed to process PDF: {str(e)}")
     
+    def _extract_pages(self, file_data: bytes, page_count: int) -> List[Tuple[Dict, Optional[Dict], float]]:
+        """Extract pages in order, splitting page ranges across worker processes"""
+        workers = min(self.PDF_WORKERS, page_count)
+        if workers <= 1 or page_count < self.PARALLEL_MIN_PAGES:
+            return _extract_pdf_pages(file_data, 0, page_count)
+        
+        # Contiguous ranges keep each worker's page access sequential
+        step = -(-page_count // workers)
+        ranges = [(start, min(start + step, page_count)) for start in range(0, page_count, step)]
+        
+        pool = self._pool.get()
+        try:
+            futures = [pool.submit(_extract_pdf_pages, file_data, start, stop) for start, stop in ranges]
+            results = []
+            for future in futures:
+                results.extend(future.result())
+            return results
+        except BrokenProcessPool:
+            # A dead worker breaks the pool for good; rebuild it next time
+            self._pool.discard(pool)
+            return _extract_pdf_pages(file_data, 0, page_count)
+    
     def _process_docx(self, file_data: bytes, filename: str) -> Dict:
         """Extract text and metadata from DOCX"""
         if not DOCX_AVAILABLE:
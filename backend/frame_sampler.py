@@ -0,0 +1,146 @@
+"""
+Adaptive frame sampling for video detection
+Picks frames on scene changes using cheap perceptual signatures, within a per-video budget,
+and tracks the running estimate so scoring can stop once it has converged
+"""
+
+import os
+import math
+import logging
+from typing import Iterable, Iterator, Optional, Tuple
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# (64 dHash bits, 16-bin luma histogram)
+Signature = Tuple[np.ndarray, np.ndarray]
+
+
+def frame_signature(frame: np.ndarray) -> Signature:
+    """Perceptual signature of a BGR frame, computed on a 32x32 thumbnail"""
+    thumb = cv2.resize(frame, (32, 32), interpolation=cv2.INTER_AREA)
+    gray = cv2.cvtColor(thumb, cv2.COLOR_BGR2GRAY)
+    small = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA)
+    bits = small[:, 1:] > small[:, :-1]
+    hist = np.bincount((gray >> 4).ravel(), minlength=16) / gray.size
+    return bits.ravel(), hist
+
+
+def signature_distance(a: Signature, b: Signature) -> float:
+    """0 for identical content, up to 1 for unrelated frames"""
+    hamming = np.count_nonzero(a[0] != b[0]) / a[0].size
+    histogram = 0.5 * float(np.abs(a[1] - b[1]).sum())
+    return max(hamming, histogram)
+
+
+class SceneChangeSampler:
+    """
+    Selects frames whose content differs from the last selected frame
+
+    Candidate frames are scanned at SCAN_FPS; a frame is selected when its
+    signature distance reaches THRESHOLD (at most once per MIN_GAP seconds),
+    or when MAX_GAP seconds have passed without a selection so static videos
+    are still covered end to end. Selection stops at BUDGET frames.
+    """
+
+    # Defaults (overridable via environment)
+    SCAN_FPS = float(os.getenv("VIDEO_SCAN_FPS", "4"))
+    THRESHOLD = float(os.getenv("VIDEO_SCENE_THRESHOLD", "0.25"))
+    MIN_GAP = float(os.getenv("VIDEO_MIN_GAP_SECONDS", "0.5"))
+    MAX_GAP = float(os.getenv("VIDEO_MAX_GAP_SECONDS", "10"))
+    BUDGET = int(os.getenv("VIDEO_FRAME_BUDGET", "32"))
+
+    def __init__(
+        self,
+        duration: Optional[float] = None,
+        threshold: Optional[float] = None,
+        min_gap: Optional[float] = None,
+        max_gap: Optional[float] = None,
+        budget: Optional[int] = None
+    ):
+        """
+        Args:
+            duration: Video length in seconds, if known; spreads the budget over it
+            threshold: Signature distance that counts as a scene change
+            min_gap: Minimum seconds between selected frames
+            max_gap: Maximum seconds between selected frames
+            budget: Maximum frames selected per video
+        """
+        self.threshold = threshold if threshold is not None else self.THRESHOLD
+        self.budget = max(1, budget or self.BUDGET)
+        self.min_gap = min_gap if min_gap is not None else self.MIN_GAP
+        self.max_gap = max_gap if max_gap is not None else self.MAX_GAP
+
+        if duration:
+            # Rapid cuts must not spend the whole budget at the start, and
+            # fallback samples must not either
+            self.min_gap = max(self.min_gap, duration / (2 * self.budget))
+            self.max_gap = max(self.max_gap, duration / self.budget)
+
+        self.scanned = 0
+        self.selected = 0
+
+    def select(self, timed_frames: Iterable[Tuple[float, np.ndarray]]) -> Iterator[np.ndarray]:
+        """Yield the selected frames from (timestamp seconds, BGR frame) pairs"""
+        last_signature = None
+        last_time = 0.0
+
+        for timestamp, frame in timed_frames:
+            if self.selected >= self.budget:
+                return
+            self.scanned += 1
+
+            elapsed = timestamp - last_time
+            if last_signature is not None and elapsed < self.min_gap:
+                continue
+
+            signature = frame_signature(frame)
+            if (
+                last_signature is None
+                or elapsed >= self.max_gap
+                or signature_distance(signature, last_signature) >= self.threshold
+            ):
+                last_signature, last_time = signature, timestamp
+                self.selected += 1
+                yield frame
+
+
+class RunningEstimate:
+    """
+    Running mean of per-frame AI probabilities with a normal confidence bound
+
+    Converged once at least MIN_FRAMES were seen and the half-width of the
+    confidence interval around the mean is within TOLERANCE.
+    """
+
+    MIN_FRAMES = int(os.getenv("VIDEO_MIN_FRAMES", "6"))
+    TOLERANCE = float(os.getenv("VIDEO_CONVERGENCE_TOLERANCE", "0.05"))
+    Z = 1.96  # 95% interval
+
+    def __init__(self, min_frames: Optional[int] = None, tolerance: Optional[float] = None):
+        self.min_frames = min_frames or self.MIN_FRAMES
+        self.tolerance = tolerance if tolerance is not None else self.TOLERANCE
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+
+    def update(self, values: Iterable[float]):
+        # Welford's algorithm
+        for value in values:
+            self.count += 1
+            delta = value - self.mean
+            self.mean += delta / self.count
+            self._m2 += delta * (value - self.mean)
+
+    @property
+    def half_width(self) -> float:
+        if self.count < 2:
+            return math.inf
+        variance = self._m2 / (self.count - 1)
+        return self.Z * math.sqrt(variance / self.count)
+
+    @property
+    def converged(self) -> bool:
+        return self.count >= self.min_frames and self.half_width <= self.tolerance
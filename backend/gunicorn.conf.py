@@ -0,0 +1,87 @@
+"""
+Gunicorn configuration for the detection API
+Loads the models once in the master and forks workers that share them copy-on-write
+"""
+
+import gc
+import os
+import logging
+
+logger = logging.getLogger("gunicorn.error")
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+threads = int(os.getenv("GUNICORN_THREADS", "4"))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+
+# Import app.py (and with it text_model, processor and the ViT weights) in the
+# master; forked workers then share those pages until they write to them
+preload_app = os.getenv("GUNICORN_PRELOAD", "1") != "0"
+
+# Intra-op threads per worker; default splits the cores between workers
+TORCH_THREADS = int(os.getenv("TORCH_THREADS_PER_WORKER", "0")) or max(1, (os.cpu_count() or 1) // max(workers, 1))
+
+
+def memory_usage(pid="self"):
+    """
+    Memory of a process in MB
+
+    Returns:
+        Dict with rss, pss (proportional share) and shared, where available
+    """
+    usage = {}
+    try:
+        # smaps_rollup gives PSS, which is what COW sharing actually saves
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                parts = line.split()
+                if parts[0] in ("Rss:", "Pss:", "Shared_Clean:", "Shared_Dirty:"):
+                    usage[parts[0][:-1].lower()] = int(parts[1]) / 1024
+        usage["shared"] = usage.pop("shared_clean", 0) + usage.pop("shared_dirty", 0)
+    except OSError:
+        import resource
+        # ru_maxrss is in KB on Linux
+        usage["rss"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return {key: round(value, 1) for key, value in usage.items()}
+
+
+def on_starting(server):
+    """Runs in the master before any worker exists"""
+    # Jobs run on threads of the worker that accepted them, so none from a
+    # previous run can still be alive
+    from job_queue import recover_orphans
+    recover_orphans()
+
+
+def child_exit(server, worker):
+    """Runs in the master after a worker exited (restart, crash or timeout kill)"""
+    from job_queue import recover_orphans
+    recover_orphans(owner=worker.pid)
+
+
+def when_ready(server):
+    """Runs in the master once the (preloaded) app is imported, before forking"""
+    if preload_app:
+        # Move everything allocated so far into the permanent generation so the
+        # collector never touches (and un-shares) those pages in the workers
+        gc.collect()
+        gc.freeze()
+    logger.info(f"Master ready (pid {os.getpid()}, preload={preload_app}): {memory_usage()}")
+
+
+def post_fork(server, worker):
+    """Per-worker setup after fork"""
+    try:
+        import torch
+        torch.set_num_threads(TORCH_THREADS)
+        torch.set_num_interop_threads(1)
+    except (ImportError, RuntimeError) as e:
+        # Inter-op threads cannot be changed once torch has used them
+        logger.warning(f"Worker {worker.pid}: could not configure torch threads: {e}")
+
+
+def post_worker_init(worker):
+    """Startup memory report for each worker"""
+    logger.info(
+        f"Worker {worker.pid} ready (torch threads={TORCH_THREADS}): {memory_usage()}"
+    )
@@ -0,0 +1,357 @@
+"""
+Inference backends for the image detector
+Eager PyTorch, dynamic int8 quantization, TorchScript and ONNX Runtime
+"""
+
+import os
+import re
+import time
+import hashlib
+import logging
+import tempfile
+import threading
+from typing import Dict, List, Tuple
+
+import numpy as np
+import torch
+
+# ONNX Runtime is optional - only needed for the onnx backends
+try:
+    import onnxruntime as ort
+    ONNX_AVAILABLE = True
+except ImportError:
+    ONNX_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ("eager", "quantized", "torchscript", "torchscript-int8", "onnx", "onnx-int8")
+
+EXPORT_DIR = os.getenv(
+    "IMAGE_BACKEND_EXPORT_DIR",
+    os.path.join(tempfile.gettempdir(), "ai_detector_backends")
+)
+
+
+def processor_image_size(processor) -> Tuple[int, int]:
+    """(height, width) the image processor produces"""
+    size = getattr(processor, "crop_size", None) if getattr(processor, "do_center_crop", False) else None
+    size = size or getattr(processor, "size", None) or {}
+    if isinstance(size, int):
+        return size, size
+    if "height" in size and "width" in size:
+        return size["height"], size["width"]
+    edge = size.get("shortest_edge", 224)
+    return edge, edge
+
+
+def model_fingerprint(model) -> str:
+    """
+    Short identifier of a model's weights, for naming exported files
+
+    The hub revision when the model was downloaded, else a digest of its
+    parameters, so changed weights under the same name are exported afresh.
+    """
+    revision = getattr(getattr(model, "config", None), "_commit_hash", None)
+    if revision:
+        return revision[:12]
+    digest = hashlib.sha256()
+    for key, tensor in sorted(model.state_dict().items()):
+        digest.update(key.encode("utf-8"))
+        digest.update(tensor.detach().cpu().contiguous().reshape(-1).view(torch.uint8).numpy().tobytes())
+    return digest.hexdigest()[:12]
+
+
+class _LogitsOnly(torch.nn.Module):
+    """Adapter exposing a HF classifier as pixel_values -> logits for export"""
+
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, pixel_values):
+        return self.model(pixel_values=pixel_values).logits
+
+
+class ImageBackend:
+    """Base class: maps a float32 NCHW pixel batch to a logits tensor"""
+
+    name = "base"
+
+    def __call__(self, pixel_values: torch.Tensor) -> torch.Tensor:
+        raise NotImplementedError
+
+
+class EagerBackend(ImageBackend):
+    """The HF model as loaded (fp32, eager mode)"""
+
+    name = "eager"
+
+    def __init__(self, model):
+        self.model = model
+
+    def __call__(self, pixel_values: torch.Tensor) -> torch.Tensor:
+        with torch.no_grad():
+            return self.model(pixel_values=pixel_values).logits
+
+
+class QuantizedBackend(EagerBackend):
+    """Eager model with Linear layers dynamically quantized to int8"""
+
+    name = "quantized"
+
+    def __init__(self, model):
+        super().__init__(quantize_model(model))
+
+
+class TorchScriptBackend(ImageBackend):
+    """Traced and frozen TorchScript module, saved to disk and loaded per process"""
+
+    name = "torchscript"
+
+    def __init__(self, model, image_size: Tuple[int, int], path: str, quantize: bool = False):
+        self.path = path
+        if quantize:
+            self.name = "torchscript-int8"
+        if not os.path.exists(path):
+            export_torchscript(quantize_model(model) if quantize else model, image_size, path)
+        self._module = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        with self._lock:
+            if self._module is None or self._pid != os.getpid():
+                module = torch.jit.load(self.path, map_location="cpu")
+                self._module = torch.jit.optimize_for_inference(module)
+                self._pid = os.getpid()
+        return self._module
+
+    def __call__(self, pixel_values: torch.Tensor) -> torch.Tensor:
+        module = self._module if self._pid == os.getpid() else self._load()
+        with torch.no_grad():
+            return module(pixel_values)
+
+
+class OnnxBackend(ImageBackend):
+    """ONNX Runtime session; the session is created lazily in each process"""
+
+    name = "onnx"
+
+    def __init__(self, model, image_size: Tuple[int, int], path: str, quantize: bool = False):
+        if not ONNX_AVAILABLE:
+            raise RuntimeError("onnxruntime not installed. Install with: pip install onnxruntime")
+
+        self.path = path
+        if quantize:
+            self.name = "onnx-int8"
+        if not os.path.exists(path):
+            if quantize:
+                fp32_path = path.replace("-int8.onnx", ".onnx")
+                if not os.path.exists(fp32_path):
+                    export_onnx(model, image_size, fp32_path)
+                from onnxruntime.quantization import QuantType, quantize_dynamic
+                quantize_dynamic(fp32_path, path, weight_type=QuantType.QInt8)
+            else:
+                export_onnx(model, image_size, path)
+
+        self._session = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        # ORT thread pools do not survive fork, so each worker builds its own
+        with self._lock:
+            if self._session is None or self._pid != os.getpid():
+                options = ort.SessionOptions()
+                options.intra_op_num_threads = torch.get_num_threads()
+                options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+                self._session = ort.InferenceSession(
+                    self.path, options, providers=["CPUExecutionProvider"]
+                )
+                self._pid = os.getpid()
+        return self._session
+
+    def __call__(self, pixel_values: torch.Tensor) -> torch.Tensor:
+        session = self._session if self._pid == os.getpid() else self._load()
+        logits = session.run(["logits"], {"pixel_values": pixel_values.numpy()})[0]
+        return torch.from_numpy(logits)
+
+
+def quantize_model(model):
+    """Dynamic int8 quantization of all Linear layers (weights int8, activations fp32)"""
+    return torch.ao.quantization.quantize_dynamic(
+        model, {torch.nn.Linear}, dtype=torch.qint8
+    )
+
+
+def export_torchscript(model, image_size: Tuple[int, int], path: str):
+    """Trace the model to a frozen TorchScript file"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    example = torch.rand(1, 3, *image_size)
+    with torch.no_grad():
+        traced = torch.jit.trace(_LogitsOnly(model).eval(), example, strict=False)
+        frozen = torch.jit.freeze(traced)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    torch.jit.save(frozen, tmp_path)
+    os.replace(tmp_path, path)
+    logger.info(f"Exported TorchScript model to {path}")
+
+
+def export_onnx(model, image_size: Tuple[int, int], path: str):
+    """Export the model to ONNX with a dynamic batch dimension"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    example = torch.rand(1, 3, *image_size)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with torch.no_grad():
+        torch.onnx.export(
+            _LogitsOnly(model).eval(),
+            (example,),
+            tmp_path,
+            input_names=["pixel_values"],
+            output_names=["logits"],
+            dynamic_axes={"pixel_values": {0: "batch"}, "logits": {0: "batch"}},
+            opset_version=17,
+        )
+    os.replace(tmp_path, path)
+    logger.info(f"Exported ONNX model to {path}")
+
+
+def create_backend(
+    name: str,
+    model,
+    image_size: Tuple[int, int],
+    model_name: str = "model",
+    export_dir: str = EXPORT_DIR
+) -> ImageBackend:
+    """
+    Build an inference backend
+
+    Args:
+        name: One of BACKENDS
+        model: Loaded eager HF model (kept unchanged)
+        image_size: (height, width) used for tracing/export
+        model_name: Used to name exported artifacts (with a weights fingerprint and the image size)
+        export_dir: Where exported TorchScript/ONNX files are kept
+
+    Returns:
+        Callable backend mapping pixel_values to logits
+    """
+    name = (name or "eager").lower()
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown image backend '{name}'. Choose from: {', '.join(BACKENDS)}")
+
+    quantize = name.endswith("-int8")
+
+    if name == "eager":
+        return EagerBackend(model)
+    if name == "quantized":
+        return QuantizedBackend(model)
+
+    # Exports are reused across restarts, so the name must change with the weights
+    stem = os.path.join(
+        export_dir,
+        f"{re.sub(r'[^A-Za-z0-9_.-]+', '_', model_name)}-{model_fingerprint(model)}-{image_size[0]}x{image_size[1]}"
+    )
+    if name.startswith("torchscript"):
+        suffix = "-int8.pt" if quantize else ".pt"
+        return TorchScriptBackend(model, image_size, stem + suffix, quantize=quantize)
+    suffix = "-int8.onnx" if quantize else ".onnx"
+    return OnnxBackend(model, image_size, stem + suffix, quantize=quantize)
+
+
+def parity_report(
+    eager: ImageBackend,
+    candidate: ImageBackend,
+    batches: List[torch.Tensor],
+    repeats: int = 3
+) -> Dict:
+    """
+    Compare a backend against the eager model on the same inputs
+
+    Returns:
+        Dict with max/mean probability drift, label agreement and latency
+    """
+    def timed(backend, pixel_values):
+        best = float("inf")
+        for _ in range(repeats):
+            start = time.perf_counter()
+            logits = backend(pixel_values)
+            best = min(best, time.perf_counter() - start)
+        return torch.softmax(logits.float(), dim=1).numpy(), best
+
+    diffs, agree, total = [], 0, 0
+    eager_time, candidate_time = 0.0, 0.0
+    for pixel_values in batches:
+        ref, ref_time = timed(eager, pixel_values)
+        out, out_time = timed(candidate, pixel_values)
+        diffs.append(np.abs(ref - out).max(axis=1))
+        agree += int((ref.argmax(axis=1) == out.argmax(axis=1)).sum())
+        total += len(ref)
+        eager_time += ref_time
+        candidate_time += out_time
+
+    diffs = np.concatenate(diffs) if diffs else np.zeros(0)
+    return {
+        "backend": candidate.name,
+        "images": total,
+        "max_prob_diff": float(diffs.max()) if total else 0.0,
+        "mean_prob_diff": float(diffs.mean()) if total else 0.0,
+        "label_agreement": agree / total if total else 1.0,
+        "eager_ms_per_image": round(eager_time / max(total, 1) * 1000, 3),
+        "backend_ms_per_image": round(candidate_time / max(total, 1) * 1000, 3),
+        "speedup": round(eager_time / candidate_time, 2) if candidate_time else None,
+    }
+
+
+# Accuracy-parity check against the eager model
+if __name__ == "__main__":
+    import argparse
+    import json
+    import sys
+    from pathlib import Path
+    from PIL import Image
+    from transformers import AutoModelForImageClassification, AutoImageProcessor
+
+    parser = argparse.ArgumentParser(description="Compare image backends against the eager model")
+    parser.add_argument("images", help="Directory of local images (jpg/png/webp)")
+    parser.add_argument("--model", default="Ateeqq/ai-vs-human-image-detector")
+    parser.add_argument("--backend", action="append", choices=BACKENDS[1:],
+                        help="Backend(s) to check (default: all available)")
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--tolerance", type=float, default=0.05,
+                        help="Maximum allowed probability drift")
+    parser.add_argument("--min-agreement", type=float, default=0.99,
+                        help="Minimum fraction of identical labels")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    paths = sorted(
+        p for p in Path(args.images).iterdir()
+        if p.suffix.lower() in (".jpg", ".jpeg", ".png", ".webp", ".bmp")
+    )
+    if not paths:
+        sys.exit(f"No images found in {args.images}")
+
+    processor = AutoImageProcessor.from_pretrained(args.model)
+    model = AutoModelForImageClassification.from_pretrained(args.model).eval()
+    image_size = processor_image_size(processor)
+
+    batches = []
+    for i in range(0, len(paths), args.batch_size):
+        images = [Image.open(p).convert("RGB") for p in paths[i:i + args.batch_size]]
+        batches.append(processor(images=images, return_tensors="pt")["pixel_values"])
+
+    names = args.backend or [b for b in BACKENDS[1:] if ONNX_AVAILABLE or not b.startswith("onnx")]
+    eager = EagerBackend(model)
+    failed = False
+    for name in names:
+        report = parity_report(eager, create_backend(name, model, image_size, args.model), batches)
+        report["passed"] = (
+            report["max_prob_diff"] <= args.tolerance
+            and report["label_agreement"] >= args.min_agreement
+        )
+        failed |= not report["passed"]
+        print(json.dumps(report))
+
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,123 @@
+"""
+Micro-batching scheduler for image model inference
+Coalesces concurrent single-image requests into one batched forward pass
+"""
+
+import os
+import time
+import queue
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+
+class ImageBatcher:
+    """Collect concurrent image requests and score them as one batch"""
+
+    # Defaults (overridable via environment)
+    MAX_BATCH_SIZE = int(os.getenv("IMAGE_BATCH_SIZE", "16"))
+    MAX_WAIT_MS = float(os.getenv("IMAGE_BATCH_WAIT_MS", "5"))
+
+    def __init__(
+        self,
+        predict_batch: Callable[[Sequence[Any]], Sequence[Any]],
+        max_batch_size: Optional[int] = None,
+        max_wait_ms: Optional[float] = None
+    ):
+        """
+        Initialize batcher
+
+        Args:
+            predict_batch: Callable scoring a list of images, returning one row per image
+            max_batch_size: Largest batch sent to the model
+            max_wait_ms: How long the first request may wait for company
+        """
+        self.predict_batch = predict_batch
+        self.max_batch_size = max(1, max_batch_size or self.MAX_BATCH_SIZE)
+        self.max_wait = max(0.0, (max_wait_ms if max_wait_ms is not None else self.MAX_WAIT_MS) / 1000.0)
+
+        self._queue: "queue.Queue" = queue.Queue()
+        self._lock = threading.Lock()
+        self._worker: Optional[threading.Thread] = None
+        self._worker_pid: Optional[int] = None
+
+        logger.info(
+            f"Image batcher initialized (max_batch_size={self.max_batch_size}, "
+            f"max_wait_ms={self.max_wait * 1000:.1f})"
+        )
+
+    def submit(self, image: Any) -> Any:
+        """
+        Score a single image, sharing a forward pass with concurrent callers
+
+        Args:
+            image: Image accepted by predict_batch
+
+        Returns:
+            The row of predict_batch output belonging to this image
+        """
+        self._ensure_worker()
+        future: Future = Future()
+        self._queue.put((image, future))
+        return future.result()
+
+    def _ensure_worker(self):
+        """Start the scheduler thread lazily (and again after a fork)"""
+        pid = os.getpid()
+        if self._worker is not None and self._worker_pid == pid and self._worker.is_alive():
+            return
+
+        with self._lock:
+            if self._worker is not None and self._worker_pid == pid and self._worker.is_alive():
+                return
+            if self._worker_pid != pid:
+                # Threads do not survive fork; drop anything inherited from the parent
+                self._queue = queue.Queue()
+            self._worker = threading.Thread(
+                target=self._run, name="image-batcher", daemon=True
+            )
+            self._worker_pid = pid
+            self._worker.start()
+
+    def _collect(self) -> List[tuple]:
+        """Block for the first request, then gather more until full or timed out"""
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                # Still take whatever is already queued without waiting
+                try:
+                    batch.append(self._queue.get_nowait())
+                    continue
+                except queue.Empty:
+                    break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+
+        return batch
+
+    def _run(self):
+        """Scheduler loop"""
+        while True:
+            batch = self._collect()
+            images = [item[0] for item in batch]
+            futures = [item[1] for item in batch]
+
+            try:
+                rows = self.predict_batch(images)
+            except Exception as e:
+                logger.error(f"Batched image inference failed ({len(images)} images): {e}")
+                for future in futures:
+                    future.set_exception(e)
+                continue
+
+            for future, row in zip(futures, rows):
+                future.set_result(row)
+
@@ -0,0 +1,158 @@
+"""
+Vectorized image preprocessing for the image detector
+Reproduces AutoImageProcessor's resize/crop/normalize on uint8 arrays with OpenCV and torch
+"""
+
+import os
+import logging
+from typing import Any, List, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+import torch
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+# PIL resample codes (as stored on HF processors) -> OpenCV interpolation
+RESAMPLE_TO_CV2 = {
+    0: cv2.INTER_NEAREST,
+    1: cv2.INTER_LANCZOS4,
+    2: cv2.INTER_LINEAR,
+    3: cv2.INTER_CUBIC,
+    4: cv2.INTER_LINEAR,   # BOX
+    5: cv2.INTER_LINEAR,   # HAMMING
+}
+
+
+def sample_images() -> List[Image.Image]:
+    """Smooth synthetic images in several sizes and aspect ratios, one smaller than usual crops"""
+    images = []
+    for width, height in ((640, 480), (480, 800), (1024, 256), (120, 90)):
+        y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+        pixels = np.stack([x / width, y / height, 0.5 + 0.5 * np.sin(x / 23) * np.cos(y / 31)], axis=-1)
+        images.append(Image.fromarray((pixels * 255).astype(np.uint8)))
+    return images
+
+
+class FastImagePreprocessor:
+    """Batch preprocessing driven by the parameters of a HF image processor"""
+
+    # Largest mean absolute difference from the HF processor's pixel_values
+    # (normalized units) at which the fast path is still trusted
+    MAX_DRIFT = float(os.getenv("IMAGE_PREPROCESS_MAX_DRIFT", "0.02"))
+
+    def __init__(self, processor):
+        """
+        Read resize, crop and normalize settings from the processor once
+
+        Args:
+            processor: Loaded AutoImageProcessor
+        """
+        size = getattr(processor, "size", None) or {}
+        if isinstance(size, int):
+            size = {"height": size, "width": size}
+
+        self.do_resize = getattr(processor, "do_resize", True)
+        self.target_size = (size["height"], size["width"]) if "height" in size else None
+        self.shortest_edge = size.get("shortest_edge")
+        self.interpolation = RESAMPLE_TO_CV2.get(int(getattr(processor, "resample", None) or 2), cv2.INTER_LINEAR)
+
+        crop = getattr(processor, "crop_size", None) if getattr(processor, "do_center_crop", False) else None
+        self.crop_size = (crop["height"], crop["width"]) if crop else None
+
+        rescale = getattr(processor, "rescale_factor", 1 / 255) if getattr(processor, "do_rescale", True) else 1.0
+        if getattr(processor, "do_normalize", True):
+            mean = np.asarray(processor.image_mean, dtype=np.float32)
+            std = np.asarray(processor.image_std, dtype=np.float32)
+        else:
+            mean = np.zeros(3, dtype=np.float32)
+            std = np.ones(3, dtype=np.float32)
+
+        # (x * rescale - mean) / std folded into one multiply-add per channel
+        self.scale = torch.from_numpy(rescale / std).view(1, 3, 1, 1)
+        self.offset = torch.from_numpy(-mean / std).view(1, 3, 1, 1)
+
+        logger.info(
+            f"Fast preprocessor: resize={self.target_size or self.shortest_edge}, "
+            f"crop={self.crop_size}, interpolation={self.interpolation}"
+        )
+
+    def __call__(self, images: Sequence[Any], bgr: bool = False) -> torch.Tensor:
+        """
+        Preprocess a batch
+
+        Args:
+            images: PIL images or HxWx3 uint8 arrays
+            bgr: Arrays are in OpenCV BGR order (e.g. straight from VideoCapture)
+
+        Returns:
+            float32 pixel_values tensor of shape (N, 3, H, W)
+        """
+        arrays = [self.resize(self._to_array(image, bgr)) for image in images]
+        batch = torch.from_numpy(np.stack(arrays))        # N, H, W, 3 uint8
+        batch = batch.permute(0, 3, 1, 2).float()          # N, 3, H, W
+        return batch.mul_(self.scale).add_(self.offset).contiguous()
+
+    def drift(self, processor, images: Optional[Sequence[Any]] = None) -> float:
+        """
+        How far this preprocessor's output is from the processor's
+
+        Args:
+            processor: The AutoImageProcessor this was built from
+            images: PIL images to compare on (default sample_images())
+
+        Returns:
+            Largest per-image mean absolute difference (inf if shapes differ)
+        """
+        worst = 0.0
+        for image in images if images is not None else sample_images():
+            fast = self([image])
+            reference = processor(images=[image], return_tensors="pt")["pixel_values"]
+            if fast.shape != reference.shape:
+                return float("inf")
+            worst = max(worst, float((fast - reference).abs().mean()))
+        return worst
+
+    @staticmethod
+    def _to_array(image: Any, bgr: bool) -> np.ndarray:
+        if isinstance(image, Image.Image):
+            return np.asarray(image.convert("RGB"))
+        if bgr:
+            return image[..., ::-1]
+        return image
+
+    def resize(self, array: np.ndarray) -> np.ndarray:
+        """Resize (and center-crop) one HxWx3 uint8 RGB array"""
+        if self.do_resize:
+            height, width = array.shape[:2]
+            out_h, out_w = self._output_size(height, width)
+            if (out_h, out_w) != (height, width):
+                # PIL antialiases when shrinking; INTER_AREA is the closest OpenCV match
+                shrinking = out_h < height and out_w < width
+                interpolation = cv2.INTER_AREA if shrinking else self.interpolation
+                array = cv2.resize(np.ascontiguousarray(array), (out_w, out_h), interpolation=interpolation)
+
+        if self.crop_size:
+            array = self._center_crop(array, *self.crop_size)
+        return np.ascontiguousarray(array)
+
+    def _output_size(self, height: int, width: int) -> Tuple[int, int]:
+        if self.target_size:
+            return self.target_size
+        short, long = (height, width) if height <= width else (width, height)
+        new_short = self.shortest_edge
+        new_long = int(new_short * long / short)
+        return (new_short, new_long) if height <= width else (new_long, new_short)
+
+    @staticmethod
+    def _center_crop(array: np.ndarray, crop_h: int, crop_w: int) -> np.ndarray:
+        height, width = array.shape[:2]
+        pad_h, pad_w = max(crop_h - height, 0), max(crop_w - width, 0)
+        if pad_h or pad_w:
+            # Like the HF processor: zero-pad images smaller than the crop, centered
+            array = np.pad(array, ((pad_h // 2, pad_h - pad_h // 2), (pad_w // 2, pad_w - pad_w // 2), (0, 0)))
+            height, width = array.shape[:2]
+        top = (height - crop_h) // 2
+        left = (width - crop_w) // 2
+        return array[top:top + crop_h, left:left + crop_w]
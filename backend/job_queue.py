@@ -0,0 +1,423 @@
+"""
+Background job queue for long-running analyses
+Bounded local worker pool with priorities, progress, cancellation and result retention
+"""
+
+import os
+import json
+import time
+import uuid
+import heapq
+import logging
+import tempfile
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Job states
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED_STATES = {SUCCEEDED, FAILED, CANCELLED}
+
+
+class JobCancelled(Exception):
+    """Raised inside a running job when cancellation was requested"""
+
+
+class QueueFull(Exception):
+    """Raised when the pending queue is at capacity"""
+
+
+class MemoryJobStore:
+    """Job records in a process-local dict"""
+
+    def __init__(self):
+        self._records: Dict[str, Dict] = {}
+        self._cancelled = set()
+        self._lock = threading.Lock()
+
+    def save(self, record: Dict):
+        with self._lock:
+            self._records[record["job_id"]] = dict(record)
+
+    def load(self, job_id: str) -> Optional[Dict]:
+        with self._lock:
+            record = self._records.get(job_id)
+            return dict(record) if record else None
+
+    def delete(self, job_id: str):
+        with self._lock:
+            self._records.pop(job_id, None)
+            self._cancelled.discard(job_id)
+
+    def list_ids(self) -> List[str]:
+        with self._lock:
+            return list(self._records)
+
+    def request_cancel(self, job_id: str):
+        with self._lock:
+            self._cancelled.add(job_id)
+
+    def cancel_requested(self, job_id: str) -> bool:
+        with self._lock:
+            return job_id in self._cancelled
+
+
+class FileJobStore:
+    """
+    Job records as JSON files, visible to every gunicorn worker on the host
+
+    Cancellation is a separate marker file: the record itself is rewritten by
+    the worker running the job, which would overwrite a flag set by another.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, job_id: str) -> str:
+        return os.path.join(self.directory, f"{job_id}.json")
+
+    def save(self, record: Dict):
+        # Write then rename so readers never see a partial record
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(record, f)
+        os.replace(tmp_path, self._path(record["job_id"]))
+
+    def load(self, job_id: str) -> Optional[Dict]:
+        try:
+            with open(self._path(job_id)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def delete(self, job_id: str):
+        for path in (self._path(job_id), self._cancel_path(job_id)):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def list_ids(self) -> List[str]:
+        return [name[:-5] for name in os.listdir(self.directory) if name.endswith(".json")]
+
+    def _cancel_path(self, job_id: str) -> str:
+        return os.path.join(self.directory, f"{job_id}.cancel")
+
+    def request_cancel(self, job_id: str):
+        open(self._cancel_path(job_id), "w").close()
+
+    def cancel_requested(self, job_id: str) -> bool:
+        return os.path.exists(self._cancel_path(job_id))
+
+
+class JobQueue:
+    """Priority queue of jobs executed by a bounded pool of worker threads"""
+
+    # Defaults (overridable via environment)
+    WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+    MAX_PENDING = int(os.getenv("JOB_MAX_PENDING", "64"))
+    RETENTION = float(os.getenv("JOB_RETENTION_SECONDS", "3600"))
+
+    def __init__(
+        self,
+        store=None,
+        workers: Optional[int] = None,
+        max_pending: Optional[int] = None,
+        retention: Optional[float] = None
+    ):
+        """
+        Initialize job queue
+
+        Args:
+            store: MemoryJobStore or FileJobStore (default from JOB_STORE env)
+            workers: Number of worker threads per process
+            max_pending: Maximum queued (not yet running) jobs
+            retention: Seconds finished jobs are kept
+        """
+        self.store = store or default_store()
+        self.workers = max(1, workers or self.WORKERS)
+        self.max_pending = max_pending or self.MAX_PENDING
+        self.retention = retention if retention is not None else self.RETENTION
+
+        self.handlers: Dict[str, Callable] = {}
+        self._heap: List[Tuple[int, int, str]] = []
+        self._payloads: Dict[str, Tuple[Any, Optional[Callable], List[str]]] = {}
+        self._cond = threading.Condition()
+        self._seq = 0
+        self._threads: List[threading.Thread] = []
+        self._pid: Optional[int] = None
+        self._last_purge = 0.0
+        self._cancel_flags = set()
+
+        logger.info(
+            f"Job queue initialized (workers={self.workers}, max_pending={self.max_pending}, "
+            f"retention={self.retention}s, store={type(self.store).__name__})"
+        )
+
+    def register(self, job_type: str, handler: Callable):
+        """
+        Register a job handler
+
+        Args:
+            job_type: Name used when submitting
+            handler: handler(payload, progress) -> (result, status); progress(fraction, message)
+        """
+        self.handlers[job_type] = handler
+
+    def submit(
+        self,
+        job_type: str,
+        payload: Any,
+        priority: int = 0,
+        cleanup: Optional[Callable[[], None]] = None,
+        files: Optional[List[str]] = None
+    ) -> Dict:
+        """
+        Queue a job
+
+        Args:
+            job_type: Registered handler name
+            payload: Passed to the handler as-is
+            priority: Higher runs first
+            cleanup: Called once the job finishes or is cancelled
+            files: Temp files owned by the job; removed when it finishes, is cancelled
+                or is recovered after its process died (see recover_orphans)
+
+        Returns:
+            The new job record
+        """
+        if job_type not in self.handlers:
+            raise ValueError(f"Unknown job type: {job_type}")
+
+        self._ensure_workers()
+        self.purge_expired()
+
+        record = {
+            "job_id": uuid.uuid4().hex,
+            "type": job_type,
+            "status": QUEUED,
+            "priority": priority,
+            "progress": 0.0,
+            "message": "Queued",
+            "result": None,
+            "status_code": None,
+            "error": None,
+            "cancel_requested": False,
+            "created_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+            "owner_pid": os.getpid(),
+            "files": list(files or []),
+        }
+
+        with self._cond:
+            if len(self._heap) >= self.max_pending:
+                raise QueueFull(f"Job queue is full ({self.max_pending} pending)")
+            self.store.save(record)
+            self._payloads[record["job_id"]] = (payload, cleanup, record["files"])
+            self._seq += 1
+            heapq.heappush(self._heap, (-priority, self._seq, record["job_id"]))
+            self._cond.notify()
+
+        logger.info(f"Job queued: {record['job_id']} ({job_type}, priority {priority})")
+        return record
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        """Current job record, or None if unknown or expired"""
+        record = self.store.load(job_id)
+        if record is not None and not record["cancel_requested"]:
+            record["cancel_requested"] = self.store.cancel_requested(job_id)
+        return record
+
+    def _cancel_requested(self, job_id: str) -> bool:
+        return job_id in self._cancel_flags or self.store.cancel_requested(job_id)
+
+    def cancel(self, job_id: str) -> Optional[Dict]:
+        """
+        Cancel a job
+
+        Queued jobs are cancelled immediately; running jobs stop at their next
+        progress report. Returns the updated record (cancel_requested is true
+        while a running job is stopping), or None if unknown.
+        """
+        record = self.store.load(job_id)
+        if record is None or record["status"] in FINISHED_STATES:
+            return record
+
+        if record["status"] == QUEUED:
+            with self._cond:
+                entry = self._payloads.pop(job_id, None)
+                if entry is not None:
+                    self._heap = [item for item in self._heap if item[2] != job_id]
+                    heapq.heapify(self._heap)
+            if entry is not None:
+                self._finish(record, CANCELLED, message="Cancelled before start")
+                _run_cleanup(entry[1], entry[2])
+                return record
+
+        # Running here or in another worker process: flag it and let it stop itself
+        self._cancel_flags.add(job_id)
+        self.store.request_cancel(job_id)
+        record["cancel_requested"] = True
+        return record
+
+    def purge_expired(self):
+        """Drop finished jobs older than the retention window"""
+        now = time.time()
+        if now - self._last_purge < 60:
+            return
+        self._last_purge = now
+
+        for job_id in self.store.list_ids():
+            record = self.store.load(job_id)
+            if record and record["status"] in FINISHED_STATES and record["finished_at"] + self.retention < now:
+                self.store.delete(job_id)
+
+    def pending_count(self) -> int:
+        with self._cond:
+            return len(self._heap)
+
+    def _ensure_workers(self):
+        """Start worker threads lazily (and again after a fork)"""
+        pid = os.getpid()
+        with self._cond:
+            if self._pid == pid and all(t.is_alive() for t in self._threads):
+                return
+            if self._pid != pid:
+                # Jobs queued in the parent belong to the parent
+                self._heap = []
+                self._payloads = {}
+            self._threads = [t for t in self._threads if self._pid == pid and t.is_alive()]
+            for i in range(len(self._threads), self.workers):
+                thread = threading.Thread(target=self._run, name=f"job-worker-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+            self._pid = pid
+
+    def _run(self):
+        """Worker loop"""
+        while True:
+            with self._cond:
+                while not self._heap:
+                    self._cond.wait()
+                _, _, job_id = heapq.heappop(self._heap)
+                payload, cleanup, files = self._payloads.pop(job_id, (None, None, []))
+
+            try:
+                self._execute(job_id, payload)
+            finally:
+                _run_cleanup(cleanup, files)
+
+    def _execute(self, job_id: str, payload: Any):
+        record = self.store.load(job_id)
+        if record is None or record["status"] != QUEUED:
+            return
+        if self._cancel_requested(job_id):
+            self._finish(record, CANCELLED, message="Cancelled before start")
+            return
+
+        record.update(status=RUNNING, started_at=time.time(), message="Running")
+        self.store.save(record)
+
+        def progress(fraction: float, message: str = ""):
+            if self._cancel_requested(job_id):
+                raise JobCancelled()
+            record["progress"] = round(min(max(fraction, 0.0), 1.0), 4)
+            if message:
+                record["message"] = message
+            self.store.save(record)
+
+        try:
+            result, status = self.handlers[record["type"]](payload, progress)
+        except JobCancelled:
+            self._finish(record, CANCELLED, message="Cancelled")
+            logger.info(f"Job cancelled: {job_id}")
+        except Exception as e:
+            logger.error(f"Job failed: {job_id}: {e}")
+            self._finish(record, FAILED, error=str(e), status_code=500)
+        else:
+            state = SUCCEEDED if status == 200 else FAILED
+            error = result.get("error") if state == FAILED and isinstance(result, dict) else None
+            self._finish(record, state, result=result, status_code=status, error=error)
+            logger.info(f"Job {state}: {job_id}")
+        finally:
+            self._cancel_flags.discard(job_id)
+
+    def _finish(self, record: Dict, state: str, **fields):
+        record.update(fields)
+        record["status"] = state
+        record["finished_at"] = time.time()
+        if state == SUCCEEDED:
+            record["progress"] = 1.0
+            record["message"] = "Done"
+        self.store.save(record)
+
+
+def default_store():
+    """Store selected by JOB_STORE ('file' or 'memory')"""
+    if os.getenv("JOB_STORE", "file") == "memory":
+        return MemoryJobStore()
+    directory = os.getenv("JOB_STORE_DIR", os.path.join(tempfile.gettempdir(), "ai_detector_jobs"))
+    return FileJobStore(directory)
+
+
+def recover_orphans(store=None, owner: Optional[int] = None) -> int:
+    """
+    Fail queued and running jobs whose process is gone, removing their files
+
+    Job threads live in the web worker that accepted the job, so a restarted
+    or crashed worker leaves its records unfinished forever. Call this before
+    any worker starts (owner=None: every unfinished job is an orphan), or
+    when a worker exits with its pid.
+
+    Args:
+        store: Job store (default from JOB_STORE env)
+        owner: Only recover jobs accepted by this process id
+
+    Returns:
+        Number of jobs recovered
+    """
+    store = store or default_store()
+    recovered = 0
+    for job_id in store.list_ids():
+        record = store.load(job_id)
+        if record is None or record["status"] in FINISHED_STATES:
+            continue
+        if owner is not None and record.get("owner_pid") != owner:
+            continue
+        record.update(
+            status=FAILED, finished_at=time.time(), status_code=500,
+            error="Job was lost when its server process stopped; please resubmit"
+        )
+        store.save(record)
+        _remove_files(record.get("files", []))
+        recovered += 1
+    if recovered:
+        logger.warning(f"Marked {recovered} orphaned jobs as failed")
+    return recovered
+
+
+def _remove_files(paths: List[str]):
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"Could not remove job file {path}: {e}")
+
+
+def _run_cleanup(cleanup: Optional[Callable[[], None]], files: List[str]):
+    _remove_files(files)
+    if cleanup is None:
+        return
+    try:
+        cleanup()
+    except Exception as e:
+        logger.warning(f"Job cleanup failed: {e}")
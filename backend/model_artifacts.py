@@ -0,0 +1,332 @@
+"""
+Memory-mappable artifact format for the text model
+Stores the fitted sklearn pipeline as joblib + NumPy arrays with a JSON manifest
+"""
+
+import os
+import json
+import time
+import zlib
+import pickle
+import hashlib
+import logging
+from collections.abc import Mapping
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import joblib
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+MANIFEST = "manifest.json"
+ESTIMATOR_FILE = "estimator.joblib"
+VOCAB_FILES = ("vocab_hashes.npy", "vocab_index.npy", "vocab_offsets.npy", "vocab_blob.npy")
+
+
+def term_hash(term: str) -> int:
+    """Stable 64-bit hash of a vocabulary term (Python's hash() is salted per process)"""
+    data = term.encode("utf-8")
+    return (zlib.crc32(data) << 32) | zlib.adler32(data)
+
+
+class MmapVocabulary(Mapping):
+    """
+    Read-only term -> feature index mapping backed by memory-mapped arrays
+
+    Drop-in replacement for a fitted vectorizer's vocabulary_ dict: nothing is
+    materialized at load time, so startup cost and per-worker memory do not
+    grow with vocabulary size. Terms are found by binary search over sorted
+    64-bit hashes and confirmed against the stored UTF-8 bytes, so lookups are
+    exact even if two terms share a hash.
+    """
+
+    def __init__(self, hashes: np.ndarray, index: np.ndarray, offsets: np.ndarray, blob: np.ndarray):
+        self.hashes = hashes      # uint64, sorted
+        self.index = index        # feature index per sorted entry
+        self.offsets = offsets    # int64, len(hashes) + 1, into blob
+        self.blob = blob          # uint8 UTF-8 bytes of all terms
+
+    @classmethod
+    def build(cls, vocabulary: Dict[str, int]) -> "MmapVocabulary":
+        """Build the arrays from a vocabulary dict"""
+        items = sorted(((term_hash(term), term, idx) for term, idx in vocabulary.items()))
+        encoded = [term.encode("utf-8") for _, term, _ in items]
+        offsets = np.zeros(len(items) + 1, dtype=np.int64)
+        np.cumsum([len(b) for b in encoded], out=offsets[1:])
+        return cls(
+            hashes=np.fromiter((h for h, _, _ in items), dtype=np.uint64, count=len(items)),
+            index=np.fromiter((idx for _, _, idx in items), dtype=np.int64, count=len(items)),
+            offsets=offsets,
+            blob=np.frombuffer(b"".join(encoded), dtype=np.uint8),
+        )
+
+    @classmethod
+    def load(cls, directory: str, mmap_mode: Optional[str] = "r") -> "MmapVocabulary":
+        arrays = [np.load(os.path.join(directory, name), mmap_mode=mmap_mode) for name in VOCAB_FILES]
+        return cls(*arrays)
+
+    def save(self, directory: str):
+        for name, array in zip(VOCAB_FILES, (self.hashes, self.index, self.offsets, self.blob)):
+            np.save(os.path.join(directory, name), array)
+
+    def _term_at(self, position: int) -> bytes:
+        return self.blob[self.offsets[position]:self.offsets[position + 1]].tobytes()
+
+    def _find(self, term: str, h: int, position: int) -> int:
+        """Feature index of term given its hash and searchsorted position, or -1"""
+        data = term.encode("utf-8")
+        n = len(self.hashes)
+        while position < n and self.hashes[position] == h:
+            if self._term_at(position) == data:
+                return int(self.index[position])
+            position += 1
+        return -1
+
+    def lookup_many(self, terms: Sequence[str]) -> np.ndarray:
+        """Vectorized lookup; returns feature indices with -1 for unknown terms"""
+        if not terms:
+            return np.zeros(0, dtype=np.int64)
+        hashes = np.fromiter((term_hash(t) for t in terms), dtype=np.uint64, count=len(terms))
+        positions = np.searchsorted(self.hashes, hashes)
+        clipped = np.minimum(positions, len(self.hashes) - 1)
+        candidates = self.hashes[clipped] == hashes
+
+        out = np.full(len(terms), -1, dtype=np.int64)
+        for i in np.flatnonzero(candidates):
+            out[i] = self._find(terms[i], int(hashes[i]), int(positions[i]))
+        return out
+
+    def __getitem__(self, term: str) -> int:
+        h = term_hash(term)
+        position = int(np.searchsorted(self.hashes, np.uint64(h)))
+        idx = self._find(term, h, position)
+        if idx < 0:
+            raise KeyError(term)
+        return idx
+
+    def __contains__(self, term) -> bool:
+        return isinstance(term, str) and self.get(term) is not None
+
+    def __len__(self) -> int:
+        return len(self.hashes)
+
+    def __iter__(self) -> Iterator[str]:
+        for position in range(len(self.hashes)):
+            yield self._term_at(position).decode("utf-8")
+
+    def items(self):
+        for position in range(len(self.hashes)):
+            yield self._term_at(position).decode("utf-8"), int(self.index[position])
+
+
+def find_vocabulary_steps(model) -> List[Tuple[str, object]]:
+    """(path, estimator) for every fitted step carrying a vocabulary_ dict"""
+    found = []
+
+    def visit(path, est):
+        if isinstance(getattr(est, "vocabulary_", None), dict):
+            found.append((path, est))
+        for name, step in getattr(est, "steps", None) or []:
+            visit(f"{path}.{name}" if path else name, step)
+        for name, step, *_ in getattr(est, "transformer_list", None) or []:
+            visit(f"{path}.{name}" if path else name, step)
+
+    visit("", model)
+    return found
+
+
+def _sha256_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def export_artifacts(pickle_path: str, directory: str, version: Optional[str] = None) -> Dict:
+    """
+    Convert a pickled text model into the artifact directory
+
+    Args:
+        pickle_path: Path to text_model.pkl
+        directory: Output directory
+        version: Optional model version label (defaults to a checksum prefix)
+
+    Returns:
+        The written manifest
+    """
+    with open(pickle_path, "rb") as f:
+        raw = f.read()
+    source_checksum = hashlib.sha256(raw).hexdigest()
+    model = pickle.loads(raw)
+    del raw
+
+    os.makedirs(directory, exist_ok=True)
+
+    steps = find_vocabulary_steps(model)
+    if len(steps) > 1:
+        raise ValueError("Only one vocabulary-based vectorizer per model is supported")
+
+    vocab_step = None
+    if steps:
+        vocab_step, vectorizer = steps[0]
+        vocabulary = vectorizer.vocabulary_
+        MmapVocabulary.build(vocabulary).save(directory)
+        # Stored separately; the joblib file keeps only the small fitted state.
+        # stop_words_ (terms pruned by min_df/max_df) is introspection-only.
+        stop_words = vectorizer.__dict__.pop("stop_words_", None)
+        vectorizer.vocabulary_ = {}
+        try:
+            joblib.dump(model, os.path.join(directory, ESTIMATOR_FILE))
+        finally:
+            vectorizer.vocabulary_ = vocabulary
+            if stop_words is not None:
+                vectorizer.stop_words_ = stop_words
+    else:
+        joblib.dump(model, os.path.join(directory, ESTIMATOR_FILE))
+
+    try:
+        import sklearn
+        sklearn_version = sklearn.__version__
+    except ImportError:
+        sklearn_version = None
+
+    files = {}
+    for name in (ESTIMATOR_FILE,) + (VOCAB_FILES if vocab_step is not None else ()):
+        path = os.path.join(directory, name)
+        files[name] = {"sha256": _sha256_file(path), "bytes": os.path.getsize(path)}
+
+    checksum = hashlib.sha256(
+        json.dumps(files, sort_keys=True).encode("utf-8")
+    ).hexdigest()
+
+    manifest = {
+        "format_version": FORMAT_VERSION,
+        "model_version": version or source_checksum[:12],
+        "source_checksum": source_checksum,
+        "checksum": checksum,
+        "sklearn_version": sklearn_version,
+        "vocabulary_step": vocab_step,
+        "files": files,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+    }
+    with open(os.path.join(directory, MANIFEST), "w") as f:
+        json.dump(manifest, f, indent=2)
+
+    logger.info(f"Exported text model artifacts to {directory} (version {manifest['model_version']})")
+    return manifest
+
+
+def read_manifest(directory: str) -> Optional[Dict]:
+    try:
+        with open(os.path.join(directory, MANIFEST)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def load_artifacts(directory: str, mmap_mode: Optional[str] = "r") -> Tuple[object, Dict]:
+    """
+    Load the text model from an artifact directory
+
+    NumPy arrays are memory-mapped read-only, so loading is near-instant and
+    every worker shares the same page-cache pages.
+
+    Returns:
+        (model, manifest)
+    """
+    manifest = read_manifest(directory)
+    if manifest is None:
+        raise FileNotFoundError(f"No {MANIFEST} in {directory}")
+    if manifest.get("format_version") != FORMAT_VERSION:
+        raise ValueError(f"Unsupported artifact format version: {manifest.get('format_version')}")
+
+    model = joblib.load(os.path.join(directory, ESTIMATOR_FILE), mmap_mode=mmap_mode)
+
+    if manifest.get("vocabulary_step") is not None:
+        steps = find_vocabulary_steps(model)
+        if len(steps) != 1:
+            raise ValueError("Artifact vocabulary step not found in estimator")
+        steps[0][1].vocabulary_ = MmapVocabulary.load(directory, mmap_mode=mmap_mode)
+
+    return model, manifest
+
+
+def verify_artifacts(directory: str) -> List[str]:
+    """Re-hash every artifact file; returns a list of problems (empty if intact)"""
+    manifest = read_manifest(directory)
+    if manifest is None:
+        return [f"Missing {MANIFEST}"]
+    problems = []
+    for name, info in manifest["files"].items():
+        path = os.path.join(directory, name)
+        if not os.path.exists(path):
+            problems.append(f"{name}: missing")
+        elif _sha256_file(path) != info["sha256"]:
+            problems.append(f"{name}: checksum mismatch")
+    return problems
+
+
+def load_text_model(artifact_dir: str, pickle_path: str) -> Tuple[object, str, Optional[str]]:
+    """
+    Load the text model, preferring the artifact directory over the pickle
+
+    Returns:
+        (model, model checksum for cache keys, model version)
+    """
+    manifest = read_manifest(artifact_dir)
+    if manifest is not None and os.path.exists(pickle_path):
+        # A retrained pickle that was never re-exported must not be shadowed by old artifacts
+        if _sha256_file(pickle_path) != manifest.get("source_checksum"):
+            logger.warning(
+                f"Text model artifacts in {artifact_dir} were exported from a different {pickle_path}; "
+                f"loading the pickle. Re-export with 'python model_artifacts.py export {pickle_path} {artifact_dir}'"
+            )
+            manifest = None
+    if manifest is not None:
+        try:
+            model, manifest = load_artifacts(artifact_dir)
+            logger.info(f"Loaded text model artifacts v{manifest['model_version']} from {artifact_dir}")
+            # The source checksum keeps cache keys stable across re-exports
+            return model, manifest["source_checksum"], manifest["model_version"]
+        except Exception as e:
+            logger.warning(f"Could not load text model artifacts ({e}); falling back to pickle")
+
+    with open(pickle_path, "rb") as f:
+        raw = f.read()
+    model = pickle.loads(raw)
+    logger.info(
+        f"Loaded pickled text model; run 'python model_artifacts.py export {pickle_path} {artifact_dir}' "
+        "for faster, shared startup"
+    )
+    return model, hashlib.sha256(raw).hexdigest(), None
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(description="Manage text model artifacts")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    export_cmd = sub.add_parser("export", help="Convert text_model.pkl to the artifact format")
+    export_cmd.add_argument("pickle_path")
+    export_cmd.add_argument("directory")
+    export_cmd.add_argument("--version", help="Model version label")
+
+    verify_cmd = sub.add_parser("verify", help="Check artifact checksums")
+    verify_cmd.add_argument("directory")
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    if args.command == "export":
+        manifest = export_artifacts(args.pickle_path, args.directory, args.version)
+        print(json.dumps(manifest, indent=2))
+    else:
+        problems = verify_artifacts(args.directory)
+        for problem in problems:
+            print(problem)
+        print("OK" if not problems else f"{len(problems)} problem(s)")
+        sys.exit(1 if problems else 0)
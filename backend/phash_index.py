@@ -0,0 +1,294 @@
+"""
+Perceptual-hash index of image detection results
+Finds re-encoded, resized or re-compressed copies of already scored images by Hamming distance
+"""
+
+import os
+import json
+import atexit
+import logging
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+HASH_BITS = 64
+
+
+def _dct_matrix(n: int) -> np.ndarray:
+    """Orthonormal DCT-II basis"""
+    k = np.arange(n)[:, None]
+    i = np.arange(n)[None, :]
+    m = np.cos(np.pi * (2 * i + 1) * k / (2 * n)) * np.sqrt(2.0 / n)
+    m[0] /= np.sqrt(2.0)
+    return m
+
+
+_DCT32 = _dct_matrix(32)
+
+
+def _bits_to_int(bits: np.ndarray) -> int:
+    return int.from_bytes(np.packbits(bits.ravel()).tobytes(), "big")
+
+
+def _gray(image) -> np.ndarray:
+    """PIL image or RGB uint8 array -> 2D float32 luma"""
+    pixels = np.asarray(image)
+    if pixels.ndim == 3:
+        pixels = cv2.cvtColor(pixels[..., :3], cv2.COLOR_RGB2GRAY)
+    return pixels.astype(np.float32)
+
+
+def phash(image) -> int:
+    """64-bit DCT hash: low frequencies of a 32x32 thumbnail against their median"""
+    thumb = cv2.resize(_gray(image), (32, 32), interpolation=cv2.INTER_AREA)
+    low = (_DCT32 @ thumb @ _DCT32.T)[:8, :8].ravel()
+    # The DC term only tracks overall brightness
+    return _bits_to_int(low > np.median(low[1:]))
+
+
+def dhash(image) -> int:
+    """64-bit gradient hash: horizontal brightness steps on a 9x8 thumbnail"""
+    thumb = cv2.resize(_gray(image), (9, 8), interpolation=cv2.INTER_AREA)
+    return _bits_to_int(thumb[:, 1:] > thumb[:, :-1])
+
+
+def detail(image) -> float:
+    """Luma standard deviation of a 32x32 thumbnail; near 0 for flat images, whose hashes are all zero"""
+    return float(cv2.resize(_gray(image), (32, 32), interpolation=cv2.INTER_AREA).std())
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+class PerceptualHashIndex:
+    """
+    Bounded LRU index of pHash -> detection result with multi-index Hamming search
+
+    The 64-bit pHash is split into max_distance + 1 chunks, each with its own
+    exact-match table. Two hashes within max_distance bits must agree exactly
+    on at least one chunk (pigeonhole), so candidates come from a few dict
+    lookups instead of a scan. Candidates are confirmed by the full pHash
+    distance and by the dHash distance, which guards against unrelated images
+    sharing a coarse DCT structure.
+    """
+
+    # Defaults (overridable via environment)
+    MAX_DISTANCE = int(os.getenv("PHASH_MAX_DISTANCE", "4"))
+    DHASH_MAX_DISTANCE = int(os.getenv("PHASH_DHASH_MAX_DISTANCE", "8"))
+    MAX_ENTRIES = int(os.getenv("PHASH_MAX_ENTRIES", "50000"))
+    SAVE_EVERY = int(os.getenv("PHASH_SAVE_EVERY", "100"))
+    MIN_DETAIL = float(os.getenv("PHASH_MIN_DETAIL", "2.0"))                # grey levels; flatter images are not indexed
+
+    def __init__(
+        self,
+        model_id: str,
+        path: Optional[str] = None,
+        max_distance: Optional[int] = None,
+        dhash_max_distance: Optional[int] = None,
+        max_entries: Optional[int] = None
+    ):
+        """
+        Initialize index
+
+        Args:
+            model_id: Model the stored results came from; a file saved for another model is ignored
+            path: JSON file to load from and save to (None keeps the index in memory only)
+            max_distance: Maximum pHash Hamming distance for a match
+            dhash_max_distance: Maximum dHash Hamming distance for a match
+            max_entries: LRU capacity
+        """
+        self.model_id = model_id
+        self.path = path
+        self.max_distance = self.MAX_DISTANCE if max_distance is None else max_distance
+        self.dhash_max_distance = self.DHASH_MAX_DISTANCE if dhash_max_distance is None else dhash_max_distance
+        self.max_entries = max_entries or self.MAX_ENTRIES
+
+        # Chunk bit ranges covering all 64 bits
+        n_chunks = min(self.max_distance + 1, HASH_BITS)
+        edges = np.linspace(0, HASH_BITS, n_chunks + 1).astype(int)
+        self._chunks: List[Tuple[int, int]] = [
+            (HASH_BITS - int(hi), (1 << int(hi - lo)) - 1) for lo, hi in zip(edges[:-1], edges[1:])
+        ]
+        self._tables: List[Dict[int, set]] = [{} for _ in self._chunks]
+        # phash -> (dhash, result); order is recency
+        self._entries: "OrderedDict[int, Tuple[int, Dict]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._dirty = 0
+        self.counters = {"hits": 0, "misses": 0, "skipped": 0, "inserts": 0, "evictions": 0}
+
+        if path:
+            self.load()
+            atexit.register(self._save_on_exit)
+
+    def _chunk_keys(self, value: int):
+        return [(value >> shift) & mask for shift, mask in self._chunks]
+
+    def lookup(self, image, refresh: bool = False) -> Tuple[Optional[Dict], Optional[int], Optional[int]]:
+        """
+        Find the stored result for a near-duplicate image
+
+        Flat images (solid colours, blank frames) all hash to the same
+        values, so they are neither looked up nor stored.
+
+        Args:
+            refresh: Only hash the image, so add() replaces what a near-duplicate stored
+
+        Returns:
+            (result or None, pHash, dHash) - the hashes can be passed to add();
+            both are None for flat images
+        """
+        gray = _gray(image)
+        if detail(gray) < self.MIN_DETAIL:
+            with self._lock:
+                self.counters["skipped"] += 1
+            metrics.PHASH_LOOKUPS.inc(result="skipped")
+            return None, None, None
+        p, d = phash(gray), dhash(gray)
+        if refresh:
+            return None, p, d
+        with self._lock:
+            best = None
+            candidates = set()
+            for table, key in zip(self._tables, self._chunk_keys(p)):
+                candidates |= table.get(key, set())
+            for candidate in candidates:
+                distance = hamming(p, candidate)
+                if distance > self.max_distance:
+                    continue
+                if hamming(d, self._entries[candidate][0]) > self.dhash_max_distance:
+                    continue
+                if best is None or distance < best[0]:
+                    best = (distance, candidate)
+
+            if best is None:
+                self.counters["misses"] += 1
+                metrics.PHASH_LOOKUPS.inc(result="miss")
+                return None, p, d
+
+            self._entries.move_to_end(best[1])
+            self.counters["hits"] += 1
+            metrics.PHASH_LOOKUPS.inc(result="hit")
+            return dict(self._entries[best[1]][1], near_duplicate_distance=best[0]), p, d
+
+    def add(self, p: Optional[int], d: Optional[int], result: Dict):
+        """Store a detection result under an image's hashes (no-op for a flat image's None)"""
+        if p is None:
+            return
+        with self._lock:
+            self._insert(p, d, result)
+            self.counters["inserts"] += 1
+            self._dirty += 1
+            should_save = self.path and self._dirty >= self.SAVE_EVERY
+        if should_save:
+            self.save()
+
+    def _insert(self, p: int, d: int, result: Dict):
+        # Caller holds the lock
+        if p in self._entries:
+            self._entries.move_to_end(p)
+        else:
+            for table, key in zip(self._tables, self._chunk_keys(p)):
+                table.setdefault(key, set()).add(p)
+        self._entries[p] = (d, result)
+
+        while len(self._entries) > self.max_entries:
+            oldest, _ = self._entries.popitem(last=False)
+            for table, key in zip(self._tables, self._chunk_keys(oldest)):
+                bucket = table.get(key)
+                if bucket is not None:
+                    bucket.discard(oldest)
+                    if not bucket:
+                        del table[key]
+            self.counters["evictions"] += 1
+
+    def _save_on_exit(self):
+        # Forked workers inherit this hook; only processes that added entries
+        # save (not the preloading gunicorn master, which never does)
+        if self._dirty:
+            self.save()
+
+    def save(self):
+        """
+        Merge the index into its file atomically (oldest entries first)
+
+        Every worker keeps its own index over the same file, so entries the
+        others saved are merged in (as the least recent) before writing
+        rather than overwritten.
+        """
+        if not self.path:
+            return
+        directory = os.path.dirname(os.path.abspath(self.path))
+        try:
+            os.makedirs(directory, exist_ok=True)
+            with open(self.path + ".lock", "w") as lock:
+                if fcntl is not None:
+                    fcntl.flock(lock, fcntl.LOCK_EX)
+                stored = self._read_file()
+                with self._lock:
+                    if stored:
+                        self._merge(stored)
+                    entries = [[f"{p:016x}", f"{d:016x}", result] for p, (d, result) in self._entries.items()]
+                    self._dirty = 0
+                fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+                with os.fdopen(fd, "w") as f:
+                    json.dump({"model_id": self.model_id, "entries": entries}, f)
+                os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning(f"Could not save perceptual hash index: {e}")
+
+    def _read_file(self) -> Optional[List]:
+        """Entries in the index file, or None if missing, unreadable or for another model"""
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if data.get("model_id") != self.model_id:
+            return None
+        return data.get("entries", [])
+
+    def _merge(self, entries: List):
+        """Add stored entries missing here as the least recently used ones (caller holds the lock)"""
+        # Newest first, so those are the ones kept when capacity runs out
+        for p, d, result in reversed(entries):
+            if len(self._entries) >= self.max_entries:
+                break
+            p = int(p, 16)
+            if p in self._entries:
+                continue
+            self._insert(p, int(d, 16), result)
+            self._entries.move_to_end(p, last=False)
+
+    def load(self):
+        """Merge entries from the index file, if it belongs to this model"""
+        entries = self._read_file()
+        if entries is None:
+            if os.path.exists(self.path):
+                logger.info("Perceptual hash index file is unreadable or belongs to another model; starting empty")
+            return
+        with self._lock:
+            self._merge(entries)
+        logger.info(f"Loaded {len(self._entries)} perceptual hashes from {self.path}")
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.counters["hits"] + self.counters["misses"]
+            return {
+                **self.counters,
+                "entries": len(self._entries),
+                "hit_rate": round(self.counters["hits"] / lookups, 4) if lookups else 0.0,
+            }
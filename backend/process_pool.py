@@ -0,0 +1,53 @@
+"""
+Worker process pools for CPU-heavy extraction
+Lazily created per process, guarded by a lock, and rebuilt after a worker dies
+"""
+
+import os
+import logging
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+class WorkerPool:
+    """
+    ProcessPoolExecutor created on first use in the process that uses it
+
+    Workers are forked from the web worker, which avoids spawn re-importing
+    app.py (and its models) in every child; tasks must only touch their own
+    libraries. A pool whose worker died is broken for good, so callers catch
+    BrokenProcessPool, discard() it and fall back to in-process work; the
+    next get() starts a fresh pool.
+    """
+
+    def __init__(self, workers: int, name: str):
+        """
+        Initialize pool
+
+        Args:
+            workers: Worker processes
+            name: Label for log messages
+        """
+        self.workers = workers
+        self.name = name
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def get(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None or self._pid != os.getpid():
+                self._pool = ProcessPoolExecutor(max_workers=self.workers)
+                self._pid = os.getpid()
+            return self._pool
+
+    def discard(self, pool: ProcessPoolExecutor):
+        """Drop a broken pool so the next get() starts a fresh one"""
+        with self._lock:
+            if self._pool is pool:
+                self._pool = None
+        logger.warning(f"{self.name} worker process died; pool will be recreated")
+        pool.shutdown(wait=False, cancel_futures=True)
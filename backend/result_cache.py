@@ -0,0 +1,244 @@
+"""
+Content-addressed result cache for detection endpoints
+In-process LRU with an optional on-disk tier shared by all gunicorn workers
+"""
+
+import os
+import json
+import time
+import hashlib
+import logging
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+
+class ResultCache:
+    """Bounded LRU cache of JSON-serializable detection results"""
+
+    # Defaults (overridable via environment)
+    MAX_ENTRIES = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "4096"))
+    MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+    TTL = float(os.getenv("RESULT_CACHE_TTL", "86400"))  # 24 hours
+    DISK_DIR = os.getenv("RESULT_CACHE_DIR", "")
+    DISK_MAX_BYTES = int(os.getenv("RESULT_CACHE_DISK_MAX_BYTES", str(256 * 1024 * 1024)))
+
+    # Disk usage is re-checked after this many writes
+    DISK_PRUNE_INTERVAL = 256
+
+    def __init__(
+        self,
+        max_entries: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        ttl: Optional[float] = None,
+        disk_dir: Optional[str] = None,
+        disk_max_bytes: Optional[int] = None
+    ):
+        """
+        Initialize result cache
+
+        Args:
+            max_entries: Maximum entries held in memory
+            max_bytes: Maximum serialized bytes held in memory
+            ttl: Seconds an entry stays valid (0 disables expiry)
+            disk_dir: Directory for the shared tier (empty disables it)
+            disk_max_bytes: Size budget for the shared tier
+        """
+        self.max_entries = max_entries if max_entries is not None else self.MAX_ENTRIES
+        self.max_bytes = max_bytes if max_bytes is not None else self.MAX_BYTES
+        self.ttl = ttl if ttl is not None else self.TTL
+        self.disk_dir = disk_dir if disk_dir is not None else self.DISK_DIR
+        self.disk_max_bytes = disk_max_bytes if disk_max_bytes is not None else self.DISK_MAX_BYTES
+
+        # key -> (expires_at, payload bytes)
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._disk_writes = 0
+
+        self.counters = {
+            "hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "sets": 0,
+            "evictions": 0,
+            "expired": 0,
+        }
+
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+
+        logger.info(
+            f"Result cache initialized (entries={self.max_entries}, bytes={self.max_bytes}, "
+            f"ttl={self.ttl}s, disk={self.disk_dir or 'disabled'})"
+        )
+
+    @staticmethod
+    def make_key(namespace: str, model_id: str, *parts: Union[bytes, str]) -> str:
+        """
+        Build a cache key from the endpoint, the model identity and the payload
+
+        Args:
+            namespace: Endpoint or result kind (e.g. 'text', 'image')
+            model_id: Identity of the model that produced the result
+            parts: Normalized payload pieces (bytes or text)
+        """
+        digest = hashlib.sha256()
+        for part in (namespace, model_id) + parts:
+            data = part.encode("utf-8") if isinstance(part, str) else part
+            # Length-prefix each part so boundaries cannot collide
+            digest.update(len(data).to_bytes(8, "big"))
+            digest.update(data)
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[Any]:
+        """Return a cached result or None"""
+        now = time.time()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, payload = entry
+                if self.ttl and expires_at < now:
+                    self._remove(key)
+                    self.counters["expired"] += 1
+                else:
+                    self._entries.move_to_end(key)
+                    self.counters["hits"] += 1
+                    return json.loads(payload)
+
+        payload = self._disk_get(key, now)
+        if payload is None:
+            with self._lock:
+                self.counters["misses"] += 1
+            return None
+
+        with self._lock:
+            self.counters["disk_hits"] += 1
+            self._store(key, payload, now)
+        return json.loads(payload)
+
+    def set(self, key: str, value: Any):
+        """Store a result in memory and, if enabled, on disk"""
+        payload = json.dumps(value, separators=(",", ":")).encode("utf-8")
+        now = time.time()
+
+        with self._lock:
+            self.counters["sets"] += 1
+            self._store(key, payload, now)
+
+        self._disk_set(key, payload)
+
+    def clear(self):
+        """Drop all in-memory entries"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters and current usage"""
+        with self._lock:
+            lookups = self.counters["hits"] + self.counters["disk_hits"] + self.counters["misses"]
+            hits = self.counters["hits"] + self.counters["disk_hits"]
+            return {
+                **self.counters,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            }
+
+    # In-memory tier (caller holds the lock)
+
+    def _store(self, key: str, payload: bytes, now: float):
+        if len(payload) > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (now + self.ttl, payload)
+        self._bytes += len(payload)
+
+        while self._entries and (
+            len(self._entries) > self.max_entries or self._bytes > self.max_bytes
+        ):
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.counters["evictions"] += 1
+
+    def _remove(self, key: str):
+        _, payload = self._entries.pop(key)
+        self._bytes -= len(payload)
+
+    # On-disk tier
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, key[:2], f"{key}.json")
+
+    def _disk_get(self, key: str, now: float) -> Optional[bytes]:
+        if not self.disk_dir:
+            return None
+        path = self._disk_path(key)
+        try:
+            if self.ttl and os.path.getmtime(path) + self.ttl < now:
+                os.remove(path)
+                return None
+            with open(path, "rb") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def _disk_set(self, key: str, payload: bytes):
+        if not self.disk_dir:
+            return
+        path = self._disk_path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write then rename so other workers never read a partial file
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(payload)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Result cache disk write failed: {e}")
+            return
+
+        self._disk_writes += 1
+        if self._disk_writes % self.DISK_PRUNE_INTERVAL == 0:
+            self._disk_prune()
+
+    def _disk_prune(self):
+        """Remove expired files, then the oldest ones until under budget"""
+        now = time.time()
+        files = []
+        total = 0
+        for root, _, names in os.walk(self.disk_dir):
+            for name in names:
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                if self.ttl and st.st_mtime + self.ttl < now:
+                    _silent_remove(path)
+                    continue
+                files.append((st.st_mtime, st.st_size, path))
+                total += st.st_size
+
+        if total <= self.disk_max_bytes:
+            return
+
+        files.sort()
+        for _, size, path in files:
+            _silent_remove(path)
+            total -= size
+            if total <= self.disk_max_bytes:
+                break
+
+
+def _silent_remove(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
@@ -70,8 +70,20 @@ async def test_session_manager():
     context = await manager.get_context(session['session_id'])
     print(f"✓ Context retrieved: {context}")
     
-    # Test 7: Delete session
-    print("\n7. Deleting session...")
+    # Test 7: Replace history with entries of another shape
+    print("\n7. Replacing history with free-form entries...")
+    updated = await manager.update_session(
+        session['session_id'],
+        {"conversation_history": [{"user": "Is this AI?", "assistant": "Probably."}]}
+    )
+    assert updated is True
+    record = manager.sessions[session['session_id']]
+    assert record.history == [{"user": "Is this AI?", "assistant": "Probably."}]
+    assert manager.total_bytes == record.size == record.size_with(record.history, record.context, record.extra)
+    print(f"✓ History replaced, {manager.total_bytes} bytes accounted")
+    
+    # Test 8: Delete session
+    print("\n8. Deleting session...")
     deleted = await manager.delete_session(session['session_id'])
     assert deleted is True
     print("✓ Session deleted")
@@ -0,0 +1,167 @@
+"""
+Sliding-window scoring for long texts
+Splits text into overlapping windows, scores them in batches and reduces the window scores
+"""
+
+import os
+import re
+import logging
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Defaults (overridable via environment)
+WINDOW_UNIT = os.getenv("TEXT_WINDOW_UNIT", "chars")          # 'chars' or 'tokens'
+WINDOW_SIZE = int(os.getenv("TEXT_WINDOW_SIZE", "2000"))       # chars or tokens per window
+WINDOW_OVERLAP = int(os.getenv("TEXT_WINDOW_OVERLAP", "200"))
+WINDOW_BATCH = int(os.getenv("TEXT_WINDOW_BATCH", "32"))
+DEFAULT_REDUCER = os.getenv("TEXT_WINDOW_REDUCER", "mean")
+
+TOKEN_RE = re.compile(r"\S+")
+SPACE_RE = re.compile(r"\s+")
+
+Span = Tuple[int, int]
+
+
+def iter_char_windows(text: str, size: int = WINDOW_SIZE, overlap: int = WINDOW_OVERLAP) -> Iterator[Span]:
+    """
+    Yield (start, end) character spans of at most `size` chars
+
+    Window edges are moved to whitespace where possible so words are not cut.
+    """
+    n = len(text)
+    size = max(size, 1)
+    overlap = min(max(overlap, 0), size // 2)
+    start = 0
+
+    while start < n:
+        end = min(start + size, n)
+        if end < n:
+            # Prefer to break at whitespace in the second half of the window
+            half = start + size // 2
+            cut = max(text.rfind(" ", half, end), text.rfind("\n", half, end))
+            if cut > start:
+                end = cut
+        yield start, end
+        if end >= n:
+            return
+
+        next_start = max(end - overlap, start + 1)
+        if overlap:
+            # Start the next window on a word boundary
+            space = SPACE_RE.search(text, next_start, end)
+            if space:
+                next_start = space.end()
+        start = next_start
+
+
+def iter_token_windows(text: str, size: int = WINDOW_SIZE, overlap: int = WINDOW_OVERLAP) -> Iterator[Span]:
+    """Yield (start, end) character spans covering `size` whitespace tokens each"""
+    size = max(size, 1)
+    step = max(size - min(max(overlap, 0), size - 1), 1)
+
+    # Only the token offsets of the current window (plus lookahead) are kept
+    offsets: List[Span] = []
+    tokens = TOKEN_RE.finditer(text)
+    exhausted = False
+
+    while True:
+        while not exhausted and len(offsets) < size:
+            match = next(tokens, None)
+            if match is None:
+                exhausted = True
+            else:
+                offsets.append(match.span())
+        if not offsets:
+            return
+        yield offsets[0][0], offsets[-1][1]
+        if exhausted:
+            return
+        offsets = offsets[step:]
+
+
+def iter_windows(text: str, unit: str = WINDOW_UNIT, size: int = WINDOW_SIZE, overlap: int = WINDOW_OVERLAP) -> Iterator[Span]:
+    if unit == "tokens":
+        return iter_token_windows(text, size, overlap)
+    return iter_char_windows(text, size, overlap)
+
+
+def needs_chunking(text: str, unit: str = WINDOW_UNIT, size: int = WINDOW_SIZE) -> bool:
+    """True if the text does not fit in a single window"""
+    if unit == "tokens":
+        # A text of at most `size` chars cannot hold more than `size` tokens
+        return len(text) > size and sum(1 for _ in TOKEN_RE.finditer(text)) > size
+    return len(text) > size
+
+
+# Reducers combine per-window AI probabilities into one score
+def _mean(scores: Sequence[float], lengths: Sequence[int]) -> float:
+    return sum(scores) / len(scores)
+
+
+def _max(scores: Sequence[float], lengths: Sequence[int]) -> float:
+    return max(scores)
+
+
+def _length_weighted(scores: Sequence[float], lengths: Sequence[int]) -> float:
+    total = sum(lengths)
+    return sum(s * l for s, l in zip(scores, lengths)) / total if total else _mean(scores, lengths)
+
+
+REDUCERS: Dict[str, Callable[[Sequence[float], Sequence[int]], float]] = {
+    "mean": _mean,
+    "max": _max,
+    "length_weighted": _length_weighted,
+}
+
+
+def score_windows(
+    text: str,
+    predict_batch: Callable[[List[str]], List[Dict[str, float]]],
+    reducer: Optional[str] = None,
+    unit: str = WINDOW_UNIT,
+    size: int = WINDOW_SIZE,
+    overlap: int = WINDOW_OVERLAP,
+    batch_size: int = WINDOW_BATCH
+) -> Dict:
+    """
+    Score a long text window by window
+
+    Args:
+        text: Text to score
+        predict_batch: Scores a list of strings -> [{"ai", "human"}, ...]
+        reducer: 'mean', 'max' or 'length_weighted'
+        unit: 'chars' or 'tokens'
+        size: Window size in units
+        overlap: Overlap between consecutive windows in units
+        batch_size: Windows per predict_batch call
+
+    Returns:
+        {"ai", "human", "reducer", "spans": [{"start", "end", "ai", "human"}, ...]}
+    """
+    reducer = reducer or DEFAULT_REDUCER
+    if reducer not in REDUCERS:
+        raise ValueError(f"Unknown reducer '{reducer}'. Choose from: {', '.join(REDUCERS)}")
+
+    spans = []
+    batch: List[Span] = []
+
+    def flush():
+        results = predict_batch([text[start:end] for start, end in batch])
+        for (start, end), result in zip(batch, results):
+            spans.append({"start": start, "end": end, "ai": result["ai"], "human": result["human"]})
+        batch.clear()
+
+    # Only one batch of window strings exists at a time
+    for span in iter_windows(text, unit, size, overlap):
+        batch.append(span)
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+
+    if not spans:
+        raise ValueError("Text is empty")
+
+    ai = REDUCERS[reducer]([s["ai"] for s in spans], [s["end"] - s["start"] for s in spans])
+    return {"ai": ai, "human": 1.0 - ai, "reducer": reducer, "spans": spans}
@@ -0,0 +1,214 @@
+"""
+Near-duplicate detection for text requests
+Normalizes text and indexes MinHash signatures of word shingles with LSH, so scores of
+near-identical texts (and overlapping windows of long texts) can be reused
+"""
+
+import os
+import re
+import zlib
+import hashlib
+import logging
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+PUNCT_RE = re.compile(r"[^\w\s]")
+
+# Mersenne prime 2^61 - 1; a < 2^31 and 32-bit shingle hashes keep a*x + b in uint64
+_PRIME = np.uint64((1 << 61) - 1)
+
+
+def normalize(text: str) -> str:
+    """Case-, punctuation- and whitespace-insensitive form of a text"""
+    text = unicodedata.normalize("NFKC", text).casefold()
+    return " ".join(PUNCT_RE.sub(" ", text).split())
+
+
+# (exact key, MinHash signature or None for texts too short to shingle)
+Fingerprint = Tuple[str, Optional[np.ndarray]]
+
+
+class TextDedupIndex:
+    """
+    Bounded LRU index of text fingerprints -> detection results
+
+    A text matches an entry when their normalized forms are identical, or when
+    the estimated Jaccard similarity of their word-shingle sets reaches
+    THRESHOLD. Candidates come from LSH buckets (BANDS bands of the MinHash
+    signature), so lookups never scan the index. Entries live in namespaces,
+    so results computed differently (e.g. with another reducer) never mix.
+    """
+
+    # Defaults (overridable via environment)
+    NUM_PERM = 64
+    BANDS = 8
+    THRESHOLD = float(os.getenv("TEXT_DEDUP_THRESHOLD", "0.9"))
+    SHINGLE_WORDS = int(os.getenv("TEXT_DEDUP_SHINGLE_WORDS", "5"))
+    MIN_WORDS = int(os.getenv("TEXT_DEDUP_MIN_WORDS", "20"))
+    MAX_ENTRIES = int(os.getenv("TEXT_DEDUP_MAX_ENTRIES", "20000"))
+
+    def __init__(
+        self,
+        threshold: Optional[float] = None,
+        max_entries: Optional[int] = None,
+        shingle_words: Optional[int] = None,
+        min_words: Optional[int] = None
+    ):
+        """
+        Initialize index
+
+        Args:
+            threshold: Minimum estimated Jaccard similarity for a near-duplicate
+            max_entries: LRU capacity
+            shingle_words: Words per shingle
+            min_words: Shorter texts only match exactly (after normalization)
+        """
+        self.threshold = self.THRESHOLD if threshold is None else threshold
+        self.max_entries = max_entries or self.MAX_ENTRIES
+        self.shingle_words = shingle_words or self.SHINGLE_WORDS
+        self.min_words = self.MIN_WORDS if min_words is None else min_words
+
+        # Fixed seed: signatures must be comparable across restarts and workers
+        rng = np.random.default_rng(0x5EED)
+        self._a = rng.integers(1, 1 << 31, size=self.NUM_PERM, dtype=np.uint64)[:, None]
+        self._b = rng.integers(0, 1 << 31, size=self.NUM_PERM, dtype=np.uint64)[:, None]
+        self._rows = self.NUM_PERM // self.BANDS
+
+        # key -> (namespace, signature, result); order is recency
+        self._entries: "OrderedDict[str, Tuple[str, Optional[np.ndarray], Dict]]" = OrderedDict()
+        self._buckets: Dict[Tuple[str, int, bytes], set] = {}
+        self._lock = threading.Lock()
+        self.counters = {"exact_hits": 0, "near_hits": 0, "misses": 0, "evictions": 0}
+
+    def fingerprint(self, text: str, namespace: str) -> Fingerprint:
+        normalized = normalize(text)
+        key = hashlib.sha1(f"{namespace}\0{normalized}".encode("utf-8")).hexdigest()
+
+        words = normalized.split()
+        if len(words) < max(self.min_words, self.shingle_words):
+            return key, None
+        k = self.shingle_words
+        shingles = {" ".join(words[i:i + k]) for i in range(len(words) - k + 1)}
+        hashes = np.fromiter(
+            (zlib.crc32(s.encode("utf-8")) for s in shingles), dtype=np.uint64, count=len(shingles)
+        )
+        signature = ((self._a * hashes[None, :] + self._b) % _PRIME).min(axis=1)
+        return key, signature
+
+    def _bands(self, namespace: str, signature: np.ndarray):
+        rows = self._rows
+        return [(namespace, i, signature[i * rows:(i + 1) * rows].tobytes()) for i in range(self.BANDS)]
+
+    def lookup(self, text: str, namespace: str = "score") -> Tuple[Optional[Dict], Fingerprint]:
+        """
+        Find the stored result for a near-identical text
+
+        Returns:
+            (result or None, fingerprint) - the fingerprint can be passed to add()
+        """
+        fp = self.fingerprint(text, namespace)
+        key, signature = fp
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.counters["exact_hits"] += 1
+                metrics.TEXT_DEDUP_LOOKUPS.inc(result="exact")
+                return dict(entry[2]), fp
+
+            best = None
+            if signature is not None:
+                candidates = set()
+                for band in self._bands(namespace, signature):
+                    candidates |= self._buckets.get(band, set())
+                for candidate in candidates:
+                    similarity = float(np.mean(self._entries[candidate][1] == signature))
+                    if similarity >= self.threshold and (best is None or similarity > best[0]):
+                        best = (similarity, candidate)
+
+            if best is None:
+                self.counters["misses"] += 1
+                metrics.TEXT_DEDUP_LOOKUPS.inc(result="miss")
+                return None, fp
+
+            self._entries.move_to_end(best[1])
+            self.counters["near_hits"] += 1
+            metrics.TEXT_DEDUP_LOOKUPS.inc(result="near")
+            return dict(self._entries[best[1]][2]), fp
+
+    def add(self, fp: Fingerprint, result: Dict, namespace: str = "score"):
+        """Store a result under a fingerprint from lookup()"""
+        key, signature = fp
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self._entries[key] = (namespace, signature, result)
+                return
+            self._entries[key] = (namespace, signature, result)
+            if signature is not None:
+                for band in self._bands(namespace, signature):
+                    self._buckets.setdefault(band, set()).add(key)
+
+            while len(self._entries) > self.max_entries:
+                oldest, (old_namespace, old_signature, _) = self._entries.popitem(last=False)
+                if old_signature is not None:
+                    for band in self._bands(old_namespace, old_signature):
+                        bucket = self._buckets.get(band)
+                        if bucket is not None:
+                            bucket.discard(oldest)
+                            if not bucket:
+                                del self._buckets[band]
+                self.counters["evictions"] += 1
+
+    def predict_batch(
+        self,
+        predict,
+        texts: List[str],
+        namespace: str = "score",
+        refresh: bool = False
+    ) -> Tuple[List[Dict], int]:
+        """
+        Score texts through the index, calling predict() only for the misses
+
+        Args:
+            refresh: Skip lookups and rescore every text, replacing stored results
+
+        Returns:
+            (results in input order, number of reused results)
+        """
+        results: List[Optional[Dict]] = [None] * len(texts)
+        misses = []
+        for i, text in enumerate(texts):
+            if refresh:
+                misses.append((i, self.fingerprint(text, namespace)))
+                continue
+            hit, fp = self.lookup(text, namespace)
+            if hit is not None:
+                results[i] = hit
+            else:
+                misses.append((i, fp))
+
+        if misses:
+            scored = predict([texts[i] for i, _ in misses])
+            for (i, fp), result in zip(misses, scored):
+                results[i] = result
+                self.add(fp, result, namespace)
+        return results, len(texts) - len(misses)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            hits = self.counters["exact_hits"] + self.counters["near_hits"]
+            lookups = hits + self.counters["misses"]
+            return {
+                **self.counters,
+                "entries": len(self._entries),
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            }
@@ -0,0 +1,261 @@
+"""
+Compiled inference path for the text classifier
+Runs the fitted vectorizer + linear model with plain NumPy arrays instead of sklearn's generic machinery
+"""
+
+import os
+import logging
+from typing import Callable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Probabilities must match predict_proba to within this tolerance
+PARITY_TOLERANCE = 1e-9
+
+PROBE_TEXTS = [
+    "The quick brown fox jumps over the lazy dog.",
+    "In conclusion, it is important to note that artificial intelligence has many applications.",
+    "lol ok see u tmrw!!",
+    "",
+]
+
+
+class CompiledTextClassifier:
+    """
+    predict_proba for vectorizer -> [tf-idf] -> linear model pipelines
+
+    Tokenization still uses the vectorizer's own analyzer, so features are
+    identical; everything after that is a gather, a few vector ops and one
+    small dot product over the features present in the text.
+    """
+
+    def __init__(
+        self,
+        analyzer: Callable[[str], List[str]],
+        lookup: Callable[[List[str]], Tuple[np.ndarray, Optional[np.ndarray]]],
+        binary: bool,
+        sublinear_tf: bool,
+        idf: Optional[np.ndarray],
+        norm: Optional[str],
+        weights: np.ndarray,
+        bias: np.ndarray,
+        link: str
+    ):
+        self.analyzer = analyzer
+        self.lookup = lookup
+        self.binary = binary
+        self.sublinear_tf = sublinear_tf
+        self.idf = idf
+        self.norm = norm
+        self.weights = weights    # (n_features, n_outputs), feature-major for row gathers
+        self.bias = bias          # (n_outputs,)
+        self.link = link          # 'binary', 'softmax', 'ovr' or 'nb'
+
+    @classmethod
+    def from_estimator(cls, model, probe_texts: Sequence[str] = PROBE_TEXTS) -> Optional["CompiledTextClassifier"]:
+        """
+        Compile a fitted estimator, or return None if it is not supported
+
+        The result is checked against model.predict_proba on probe texts and
+        rejected if any probability differs by more than PARITY_TOLERANCE.
+        """
+        try:
+            compiled = cls._compile(model)
+        except Exception as e:
+            logger.info(f"Text fast path unavailable: {e}")
+            return None
+
+        try:
+            expected = model.predict_proba(list(probe_texts))
+            actual = compiled.predict_proba(probe_texts)
+            drift = float(np.abs(expected - actual).max())
+        except Exception as e:
+            logger.warning(f"Text fast path parity check failed: {e}")
+            return None
+        if drift > PARITY_TOLERANCE:
+            logger.warning(f"Text fast path disabled: probabilities drift by {drift:.3g}")
+            return None
+
+        logger.info(f"Text fast path enabled ({compiled.link}, {compiled.weights.shape[0]} features)")
+        return compiled
+
+    @classmethod
+    def _compile(cls, model) -> "CompiledTextClassifier":
+        from sklearn.feature_extraction.text import (
+            CountVectorizer, HashingVectorizer, TfidfTransformer, TfidfVectorizer
+        )
+        from sklearn.linear_model import LogisticRegression, SGDClassifier
+        from sklearn.naive_bayes import MultinomialNB
+        from sklearn.pipeline import Pipeline
+
+        if not isinstance(model, Pipeline):
+            raise ValueError("text model is not a Pipeline")
+        steps = [step for _, step in model.steps if step not in (None, "passthrough")]
+        if len(steps) not in (2, 3):
+            raise ValueError("expected vectorizer, optional tf-idf transformer and classifier")
+        vectorizer, clf = steps[0], steps[-1]
+        tfidf = steps[1] if len(steps) == 3 else None
+
+        # Feature extraction
+        if isinstance(vectorizer, TfidfVectorizer):
+            if tfidf is not None:
+                raise ValueError("unexpected transformer after TfidfVectorizer")
+            tfidf = vectorizer._tfidf
+        if isinstance(vectorizer, (CountVectorizer, TfidfVectorizer)):
+            lookup = _vocabulary_lookup(vectorizer.vocabulary_)
+            n_features = len(vectorizer.vocabulary_)
+            binary = vectorizer.binary
+        elif isinstance(vectorizer, HashingVectorizer):
+            if tfidf is None and vectorizer.norm is not None:
+                # Normalization happens inside the vectorizer here
+                tfidf = _NormOnly(vectorizer.norm)
+            lookup = _hashing_lookup(vectorizer)
+            n_features = vectorizer.n_features
+            binary = vectorizer.binary
+        else:
+            raise ValueError(f"unsupported vectorizer {type(vectorizer).__name__}")
+
+        if tfidf is not None and not isinstance(tfidf, (TfidfTransformer, _NormOnly)):
+            raise ValueError(f"unsupported transformer {type(tfidf).__name__}")
+        sublinear_tf = bool(getattr(tfidf, "sublinear_tf", False))
+        idf = np.asarray(tfidf.idf_, dtype=np.float64) if getattr(tfidf, "use_idf", False) else None
+        norm = getattr(tfidf, "norm", None) if tfidf is not None else None
+
+        # Classifier
+        if isinstance(clf, MultinomialNB):
+            weights = np.asarray(clf.feature_log_prob_, dtype=np.float64).T
+            bias = np.asarray(clf.class_log_prior_, dtype=np.float64)
+            link = "nb"
+        elif isinstance(clf, (LogisticRegression, SGDClassifier)):
+            if isinstance(clf, SGDClassifier) and clf.loss != "log_loss":
+                raise ValueError(f"SGDClassifier loss '{clf.loss}' has no logistic predict_proba")
+            coef = clf.coef_
+            coef = coef.toarray() if hasattr(coef, "toarray") else coef
+            weights = np.asarray(coef, dtype=np.float64).T
+            bias = np.asarray(clf.intercept_, dtype=np.float64).ravel()
+            if len(clf.classes_) == 2:
+                link = "binary"
+            elif isinstance(clf, SGDClassifier) or getattr(clf, "multi_class", "auto") == "ovr":
+                link = "ovr"
+            else:
+                link = "softmax"
+        else:
+            raise ValueError(f"unsupported classifier {type(clf).__name__}")
+
+        if weights.shape[0] != n_features:
+            raise ValueError("classifier and vectorizer disagree on feature count")
+
+        return cls(
+            analyzer=vectorizer.build_analyzer(),
+            lookup=lookup,
+            binary=binary,
+            sublinear_tf=sublinear_tf,
+            idf=idf,
+            norm=norm,
+            weights=np.ascontiguousarray(weights),
+            bias=bias,
+            link=link,
+        )
+
+    def features(self, text: str):
+        """(column indices, values) of the text's feature vector"""
+        indices, signs = self.lookup(self.analyzer(text))
+        keep = indices >= 0
+        indices = indices[keep]
+
+        if signs is None:
+            cols, values = np.unique(indices, return_counts=True)
+            values = values.astype(np.float64)
+        else:
+            # Hashing with alternate_sign: signed counts, zeros dropped like sklearn
+            cols, inverse = np.unique(indices, return_inverse=True)
+            values = np.bincount(inverse, weights=signs[keep], minlength=len(cols))
+            nonzero = values != 0
+            cols, values = cols[nonzero], values[nonzero]
+
+        if self.binary:
+            values = np.sign(values)
+        if self.sublinear_tf:
+            values = np.log(values) + 1.0
+        if self.idf is not None:
+            values = values * self.idf[cols]
+        if self.norm == "l2":
+            length = np.sqrt(np.dot(values, values))
+            if length > 0:
+                values = values / length
+        elif self.norm == "l1":
+            length = np.abs(values).sum()
+            if length > 0:
+                values = values / length
+        return cols, values
+
+    def decision(self, text: str) -> np.ndarray:
+        cols, values = self.features(text)
+        return values @ self.weights[cols] + self.bias
+
+    def predict_proba(self, texts: Sequence[str]) -> np.ndarray:
+        """Same contract as sklearn's predict_proba for a list of strings"""
+        scores = np.vstack([self.decision(text) for text in texts]) if len(texts) else \
+            np.zeros((0, len(self.bias)))
+        return _link(scores, self.link)
+
+
+class _NormOnly:
+    """Stands in for a TfidfTransformer when only normalization applies"""
+
+    def __init__(self, norm: str):
+        self.norm = norm
+        self.use_idf = False
+        self.sublinear_tf = False
+
+
+def _vocabulary_lookup(vocabulary):
+    """Feature lookup for a vocabulary dict or a memory-mapped vocabulary"""
+    if hasattr(vocabulary, "lookup_many"):
+        return lambda terms: (vocabulary.lookup_many(terms), None)
+
+    get = vocabulary.get
+    return lambda terms: (
+        np.fromiter((get(term, -1) for term in terms), dtype=np.int64, count=len(terms)),
+        None
+    )
+
+
+def _hashing_lookup(vectorizer):
+    from sklearn.utils import murmurhash3_32
+
+    n_features = vectorizer.n_features
+    alternate_sign = vectorizer.alternate_sign
+
+    def lookup(terms):
+        hashes = np.fromiter(
+            (murmurhash3_32(term, seed=0) for term in terms), dtype=np.int64, count=len(terms)
+        )
+        indices = np.abs(hashes) % n_features
+        signs = np.where(hashes >= 0, 1.0, -1.0) if alternate_sign else np.ones(len(terms))
+        return indices, signs
+
+    return lookup
+
+
+def _link(scores: np.ndarray, link: str) -> np.ndarray:
+    """Turn decision scores into probabilities the way sklearn does"""
+    if link == "binary":
+        p = 1.0 / (1.0 + np.exp(-scores[:, 0]))
+        return np.column_stack([1.0 - p, p])
+    if link == "ovr":
+        p = 1.0 / (1.0 + np.exp(-scores))
+        return p / p.sum(axis=1, keepdims=True)
+    # softmax / naive Bayes joint log-likelihood
+    shifted = scores - scores.max(axis=1, keepdims=True)
+    exp = np.exp(shifted)
+    return exp / exp.sum(axis=1, keepdims=True)
+
+
+def compile_text_model(model):
+    """Compiled classifier when supported and enabled (TEXT_FASTPATH=0 disables), else None"""
+    if os.getenv("TEXT_FASTPATH", "1") == "0":
+        return None
+    return CompiledTextClassifier.from_estimator(model)
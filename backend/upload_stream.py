@@ -0,0 +1,138 @@
+"""
+Streaming upload handling
+Spools large uploads straight from the request body to unique temp files, hashing as they arrive
+"""
+
+import os
+import shutil
+import hashlib
+import logging
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, Optional
+
+from flask import Request
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", os.path.join(tempfile.gettempdir(), "ai_detector_uploads"))
+
+# Uploads with these types/extensions go to disk regardless of size, so the
+# decoder can open them by path without another copy
+VIDEO_SUFFIXES = {".mp4", ".mov", ".m4v", ".mkv", ".webm", ".avi", ".mpeg", ".mpg", ".3gp"}
+
+
+class HashingFile:
+    """File wrapper computing sha256 of everything written to it"""
+
+    def __init__(self, file):
+        self._file = file
+        self._digest = hashlib.sha256()
+
+    def write(self, data) -> int:
+        self._digest.update(data)
+        return self._file.write(data)
+
+    def sha256(self) -> str:
+        return self._digest.hexdigest()
+
+    def __iter__(self):
+        return iter(self._file)
+
+    def __getattr__(self, name):
+        return getattr(self._file, name)
+
+
+class UploadRequest(Request):
+    """
+    Flask request that writes video parts to a unique named temp file while parsing
+
+    The multipart parser streams the body into the file chunk by chunk, so the
+    upload is never held in memory, concurrent requests never share a path, and
+    MAX_CONTENT_LENGTH is enforced before the whole body has been read. The file
+    is deleted when Flask closes the request.
+    """
+
+    def _get_file_stream(
+        self,
+        total_content_length: Optional[int],
+        content_type: Optional[str],
+        filename: Optional[str] = None,
+        content_length: Optional[int] = None
+    ):
+        suffix = Path(filename or "").suffix.lower()
+        if (content_type or "").startswith("video/") or suffix in VIDEO_SUFFIXES:
+            os.makedirs(UPLOAD_DIR, exist_ok=True)
+            return HashingFile(tempfile.NamedTemporaryFile(
+                prefix="upload_", suffix=suffix or ".bin", dir=UPLOAD_DIR
+            ))
+        return super()._get_file_stream(total_content_length, content_type, filename, content_length)
+
+
+def spooled_path(file_storage) -> Optional[str]:
+    """Path of an upload that was already spooled to disk, else None"""
+    stream = file_storage.stream
+    name = getattr(stream, "name", None)
+    if isinstance(name, str) and os.path.isfile(name):
+        stream.flush()
+        return name
+    return None
+
+
+def upload_sha256(file_storage) -> Optional[str]:
+    """Digest computed while the upload streamed in, if available"""
+    stream = file_storage.stream
+    return stream.sha256() if isinstance(stream, HashingFile) else None
+
+
+@contextmanager
+def upload_path(file_storage, default_suffix: str = ".mp4") -> Iterator[str]:
+    """
+    On-disk path for an uploaded file, valid for the duration of the block
+
+    Uses the spooled file directly when there is one; otherwise copies the
+    upload to a unique temp file and removes it afterwards.
+    """
+    path = spooled_path(file_storage)
+    if path:
+        yield path
+        return
+
+    path = _unique_path(file_storage.filename, default_suffix)
+    try:
+        file_storage.save(path)
+        yield path
+    finally:
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def detach_upload(file_storage, default_suffix: str = ".mp4") -> str:
+    """
+    Keep an upload beyond the request (e.g. for a background job)
+
+    Hard-links the spooled file when possible, so no bytes are copied. The
+    caller owns the returned path and must remove it.
+    """
+    path = _unique_path(file_storage.filename, default_suffix)
+    source = spooled_path(file_storage)
+    if source:
+        try:
+            os.remove(path)
+            os.link(source, path)
+            return path
+        except OSError:
+            shutil.copyfile(source, path)
+            return path
+
+    file_storage.save(path)
+    return path
+
+
+def _unique_path(filename: Optional[str], default_suffix: str) -> str:
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    suffix = Path(filename or "").suffix.lower() or default_suffix
+    fd, path = tempfile.mkstemp(prefix="upload_", suffix=suffix, dir=UPLOAD_DIR)
+    os.close(fd)
+    return path
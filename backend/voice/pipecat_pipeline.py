@@ -9,6 +9,9 @@ from dataclasses import dataclass
 
 logger = logging.getLogger(__name__)
 
+# Spoken when a turn fails; fixed so its audio can be served from the TTS cache
+ERROR_MESSAGE = "I'm sorry, I encountered an error processing your request."
+
 
 @dataclass
 class PipelineConfig:
@@ -119,9 +122,8 @@ class VoicePipeline:
         except Exception as e:
             logger.error(f"Pipeline error: {e}")
             # Generate error message audio
-            error_message = "I'm sorry, I encountered an error processing your request."
             error_audio = await self.sarvam.synthesize_speech(
-                error_message,
+                ERROR_MESSAGE,
                 language=self.config.language,
                 voice=self.config.voice
             )
@@ -1,32 +1,297 @@
 """
 Sarvam AI Client for Speech-to-Text and Text-to-Speech
 Supports 10+ Indian languages
-Uses Pipecat integration for Sarvam AI services
+Uses a pooled keep-alive HTTP session for the REST API and Pipecat for streaming
 """
 
 import os
+import random
+import asyncio
 import logging
-from typing import AsyncIterator, Optional, Union
+from typing import AsyncIterator, Callable, Dict, Iterable, Optional
 import base64
 
+import aiohttp
+
+from .tts_cache import TTSCache
+
 logger = logging.getLogger(__name__)
 
 
+class SarvamAPIError(Exception):
+    """Sarvam AI request failed (status is the upstream or gateway HTTP status)"""
+
+    def __init__(self, status: int, detail: str):
+        super().__init__(f"Sarvam API error {status}: {detail}")
+        self.status = status
+        self.detail = detail
+
+
 class SarvamAIClient:
-    """Wrapper for Sarvam AI STT and TTS services via Pipecat"""
-    
-    def __init__(self, api_key: Optional[str] = None):
+    """
+    Wrapper for Sarvam AI STT and TTS services
+
+    REST calls share one aiohttp session per process, so connections (TCP +
+    TLS) and DNS lookups are reused across requests and across client
+    instances. Open it with start() and close it with close() from the app
+    lifespan; it is also created lazily on first use. Failed calls are
+    retried on connection errors, timeouts, 429 and 5xx with exponential
+    backoff and full jitter. Synthesized audio goes through a shared
+    TTSCache (opened by start() unless TTS_CACHE=0), so repeated utterances
+    cost no API calls.
+    """
+
+    # Defaults (overridable via environment)
+    BASE_URL = os.getenv("SARVAM_BASE_URL", "https://api.sarvam.ai")
+    POOL_SIZE = int(os.getenv("SARVAM_POOL_SIZE", "32"))             # max open connections
+    DNS_TTL = int(os.getenv("SARVAM_DNS_TTL", "300"))                 # seconds
+    KEEPALIVE = float(os.getenv("SARVAM_KEEPALIVE", "30"))            # idle connection lifetime
+    CONNECT_TIMEOUT = float(os.getenv("SARVAM_CONNECT_TIMEOUT", "5"))
+    TIMEOUT = float(os.getenv("SARVAM_TIMEOUT", "30"))               # whole call, per attempt
+    RETRIES = int(os.getenv("SARVAM_RETRIES", "2"))
+    RETRY_BACKOFF = float(os.getenv("SARVAM_RETRY_BACKOFF", "0.25"))  # seconds, doubled per attempt
+    RETRY_STATUSES = {429, 500, 502, 503, 504}
+    TTS_CACHE = os.getenv("TTS_CACHE", "1") != "0"
+    SPEAKER = os.getenv("SARVAM_SPEAKER", "anushka")                  # default TTS voice (and the one prewarmed)
+
+    _http: Optional[aiohttp.ClientSession] = None
+    tts_cache: Optional[TTSCache] = None
+
+    def __init__(self, api_key: Optional[str] = None, base_url: Optional[str] = None):
         """
         Initialize Sarvam AI client
-        
+
         Args:
             api_key: Sarvam AI API key (defaults to env variable)
+            base_url: API root (defaults to SARVAM_BASE_URL), e.g. a local stub server
         """
         self.api_key = api_key or os.getenv("SARVAM_API_KEY")
+        self.base_url = (base_url or self.BASE_URL).rstrip("/")
         if not self.api_key:
             logger.warning("SARVAM_API_KEY not found - Sarvam features will be disabled")
         else:
             logger.info("Sarvam AI client initialized successfully")
+
+    @classmethod
+    def _session(cls) -> aiohttp.ClientSession:
+        if cls._http is None or cls._http.closed:
+            connector = aiohttp.TCPConnector(
+                limit=cls.POOL_SIZE,
+                ttl_dns_cache=cls.DNS_TTL,
+                keepalive_timeout=cls.KEEPALIVE
+            )
+            cls._http = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=cls.TIMEOUT, sock_connect=cls.CONNECT_TIMEOUT)
+            )
+        return cls._http
+
+    async def start(self):
+        """Open the shared HTTP session and TTS cache"""
+        self._session()
+        if self.TTS_CACHE and SarvamAIClient.tts_cache is None:
+            SarvamAIClient.tts_cache = TTSCache()
+        logger.info(f"Sarvam HTTP pool ready ({self.base_url}, {self.POOL_SIZE} connections)")
+
+    async def close(self):
+        """Close the shared HTTP session (call once at shutdown)"""
+        http = SarvamAIClient._http
+        SarvamAIClient._http = None
+        if http is not None and not http.closed:
+            await http.close()
+            logger.info("Sarvam HTTP pool closed")
+
+    def _backoff(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        delay = random.uniform(0, self.RETRY_BACKOFF * (2 ** attempt))
+        if retry_after and retry_after.isdigit():
+            delay = max(delay, min(float(retry_after), self.TIMEOUT))
+        return delay
+
+    async def _post(
+        self,
+        path: str,
+        json: Optional[Dict] = None,
+        form: Optional[Callable[[], aiohttp.FormData]] = None,
+        timeout: Optional[float] = None
+    ) -> Dict:
+        """
+        POST to the API with retries
+
+        Args:
+            path: Endpoint path, e.g. "/text-to-speech"
+            json: JSON body
+            form: Builds a multipart body (a FormData can only be sent once)
+            timeout: Per-attempt timeout override in seconds
+
+        Returns:
+            Decoded JSON response
+
+        Raises:
+            SarvamAPIError: Non-retryable error status, or retries exhausted
+        """
+        if not self.api_key:
+            raise SarvamAPIError(503, "SARVAM_API_KEY not configured")
+
+        url = f"{self.base_url}{path}"
+        headers = {"api-subscription-key": self.api_key}
+        # Passing timeout=None would lift the session's limits, so only override when asked
+        extra = {}
+        if timeout:
+            extra["timeout"] = aiohttp.ClientTimeout(total=timeout, sock_connect=self.CONNECT_TIMEOUT)
+        for attempt in range(self.RETRIES + 1):
+            last_attempt = attempt == self.RETRIES
+            try:
+                async with self._session().post(
+                    url,
+                    json=json,
+                    data=form() if form else None,
+                    headers=headers,
+                    **extra
+                ) as response:
+                    if response.status == 200:
+                        return await response.json(content_type=None)
+                    detail = await response.text()
+                    if response.status not in self.RETRY_STATUSES or last_attempt:
+                        raise SarvamAPIError(response.status, detail)
+                    delay = self._backoff(attempt, response.headers.get("Retry-After"))
+                    logger.warning(f"Sarvam {path} returned {response.status}; retrying in {delay:.2f}s")
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                if last_attempt:
+                    status = 504 if isinstance(e, asyncio.TimeoutError) else 502
+                    raise SarvamAPIError(status, str(e) or type(e).__name__) from e
+                delay = self._backoff(attempt)
+                logger.warning(f"Sarvam {path} failed ({type(e).__name__}); retrying in {delay:.2f}s")
+            await asyncio.sleep(delay)
+
+    async def speech_to_text(
+        self,
+        audio_data: bytes,
+        language: str = "hi-IN",
+        model: str = "saarika:v2",
+        filename: str = "audio.wav",
+        content_type: str = "audio/wav",
+        timeout: Optional[float] = None
+    ) -> Dict:
+        """
+        Transcribe audio with the Sarvam REST API
+
+        Args:
+            timeout: Per-attempt timeout in seconds (default: the client's TIMEOUT)
+
+        Returns:
+            API response (transcript in "transcript")
+        """
+        def form() -> aiohttp.FormData:
+            data = aiohttp.FormData()
+            data.add_field("file", audio_data, filename=filename, content_type=content_type)
+            data.add_field("language_code", language)
+            data.add_field("model", model)
+            return data
+
+        return await self._post("/speech-to-text", form=form, timeout=timeout)
+
+    async def _synthesize(
+        self,
+        text: str,
+        language: str,
+        speaker: str,
+        pace: float,
+        sample_rate: int,
+        model: str,
+        timeout: Optional[float] = None
+    ) -> bytes:
+        """Uncached TTS call; WAV bytes (empty if the API returned none)"""
+        payload = {
+            "inputs": [text],
+            "target_language_code": language,
+            "speaker": speaker,
+            "pitch": 0,
+            "pace": pace,
+            "loudness": 1.5,
+            "speech_sample_rate": sample_rate,
+            "enable_preprocessing": True,
+            "model": model
+        }
+        data = await self._post("/text-to-speech", json=payload, timeout=timeout)
+        audios = data.get("audios") or [""]
+        return base64.b64decode(audios[0])
+
+    async def synthesize(
+        self,
+        text: str,
+        language: str = "hi-IN",
+        speaker: Optional[str] = None,
+        pace: float = 1.0,
+        sample_rate: int = 8000,
+        model: str = "bulbul:v2",
+        timeout: Optional[float] = None
+    ) -> bytes:
+        """
+        Synthesize speech with the Sarvam REST API, through the TTS cache
+
+        Args:
+            speaker: Voice (default SPEAKER)
+            timeout: Per-attempt timeout in seconds (default: the client's TIMEOUT)
+
+        Returns:
+            WAV audio bytes
+        """
+        args = (text, language, speaker or self.SPEAKER, pace, sample_rate, model)
+        if self.tts_cache is None:
+            return await self._synthesize(*args, timeout=timeout)
+        return await self.tts_cache.get_or_synthesize(
+            TTSCache.key(*args), lambda: self._synthesize(*args, timeout=timeout)
+        )
+
+    async def text_to_speech(
+        self,
+        text: str,
+        language: str = "hi-IN",
+        speaker: Optional[str] = None,
+        pace: float = 1.0,
+        sample_rate: int = 8000,
+        model: str = "bulbul:v2",
+        timeout: Optional[float] = None
+    ) -> str:
+        """
+        Synthesize speech with the Sarvam REST API, through the TTS cache
+
+        Args:
+            speaker: Voice (default SPEAKER)
+            timeout: Per-attempt timeout in seconds (default: the client's TIMEOUT)
+
+        Returns:
+            Base64-encoded WAV audio ("" if the API returned none)
+        """
+        audio = await self.synthesize(text, language, speaker, pace, sample_rate, model, timeout=timeout)
+        return base64.b64encode(audio).decode("ascii")
+
+    async def prewarm(
+        self,
+        phrases: Iterable[str],
+        languages: Iterable[str] = ("hi-IN",),
+        speakers: Optional[Iterable[str]] = None
+    ) -> int:
+        """
+        Fill the TTS cache with fixed phrases (one call at a time; cached ones are free)
+
+        Returns:
+            Number of phrase/language/speaker combinations now cached
+        """
+        if not self.api_key or self.tts_cache is None:
+            return 0
+        phrases, languages, speakers = list(phrases), list(languages), list(speakers or [self.SPEAKER])
+        warmed = 0
+        for language in languages:
+            for speaker in speakers:
+                for phrase in phrases:
+                    try:
+                        if await self.synthesize(phrase, language=language, speaker=speaker):
+                            warmed += 1
+                    except SarvamAPIError as e:
+                        logger.warning(f"TTS prewarm failed for '{phrase[:30]}' ({language}, {speaker}): {e}")
+        logger.info(f"TTS cache prewarmed: {warmed}/{len(phrases) * len(languages) * len(speakers)} utterances")
+        return warmed
     
     async def transcribe_stream(
         self,
@@ -96,9 +361,8 @@ class SarvamAIClient:
         try:
             logger.info(f"Transcribing audio ({len(audio_data)} bytes)")
             
-            # Mock transcription for now
-            # For production, use Pipecat's SarvamSTTService
-            result = f"[Transcription of {len(audio_data)} bytes audio in {language}]"
+            data = await self.speech_to_text(audio_data, language=language)
+            result = data.get("transcript", "")
             
             logger.info(f"Transcription complete")
             return result
@@ -133,10 +397,12 @@ class SarvamAIClient:
         try:
             logger.info(f"Synthesizing speech: {text[:50]}... (voice: {voice})")
             
-            # Mock TTS for now - returns empty audio
-            # For production, use Pipecat's SarvamTTSService
-            logger.warning("TTS returning empty audio - Pipecat Sarvam integration pending")
-            return b""
+            return await self.synthesize(
+                text,
+                language=language,
+                speaker=voice,
+                pace=speed
+            )
             
         except Exception as e:
             logger.error(f"TTS error: {e}")
@@ -178,8 +444,6 @@ class SarvamAIClient:
 
 # Example usage
 if __name__ == "__main__":
-    import asyncio
-    
     async def test_sarvam():
         client = SarvamAIClient()
         
@@ -201,7 +465,7 @@ if __name__ == "__main__":
             print("Audio saved to test_output.wav")
         else:
             print("No audio generated (API key required)")
-    
-    asyncio.run(test_sarvam())
+        
+        await client.close()
     
     asyncio.run(test_sarvam())
@@ -3,51 +3,198 @@ Session Manager using Redis
 Manages voice conversation sessions and state
 """
 
+import os
+import time
 import logging
 import json
 import uuid
-from typing import Optional, Dict, Any
-from datetime import datetime, timedelta
+from typing import Optional, Dict, Any, List
+from datetime import datetime
 import redis.asyncio as aioredis
 
 logger = logging.getLogger(__name__)
 
 
+# Key layout:
+#   session:{<id>}          hash  scalar fields; "context" holds a JSON string
+#   session:{<id>}:history  list  JSON exchanges, capped at max_history
+#   sessions:active         zset  session IDs scored by last activity (unix seconds)
+ACTIVE_KEY = "sessions:active"
+
+# Hash fields stored as plain strings; all other fields hold JSON
+STRING_FIELDS = {"session_id", "user_id", "language", "voice", "created_at", "last_activity"}
+
+# KEYS[1] = session hash, KEYS[2] = history list, KEYS[3] = active index
+# ARGV    = ttl, max_history, now, field count N, replace history (0/1),
+#           N field/value pairs, then history entries to append
+# Returns 0 if the session does not exist (nothing is written), else 1
+UPDATE_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return 0
+end
+local ttl = tonumber(ARGV[1])
+local max_history = tonumber(ARGV[2])
+local n_fields = tonumber(ARGV[4])
+local i = 6
+if n_fields > 0 then
+    redis.call('HSET', KEYS[1], unpack(ARGV, i, i + 2 * n_fields - 1))
+end
+i = i + 2 * n_fields
+if ARGV[5] == '1' then
+    redis.call('DEL', KEYS[2])
+end
+if #ARGV >= i then
+    redis.call('RPUSH', KEYS[2], unpack(ARGV, i, #ARGV))
+    redis.call('LTRIM', KEYS[2], -max_history, -1)
+end
+redis.call('EXPIRE', KEYS[1], ttl)
+redis.call('EXPIRE', KEYS[2], ttl)
+redis.call('ZADD', KEYS[3], ARGV[3], string.match(KEYS[1], '{(.*)}'))
+return 1
+"""
+
+# KEYS[1] = session hash, KEYS[2] = history list, KEYS[3] = active index
+# ARGV    = ttl, now
+# Returns {flat hash fields, history entries} and refreshes the TTL and index
+# score; an expired session returns empty lists and leaves the index
+TOUCH_SCRIPT = """
+local session_id = string.match(KEYS[1], '{(.*)}')
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    redis.call('ZREM', KEYS[3], session_id)
+    return {{}, {}}
+end
+local fields = redis.call('HGETALL', KEYS[1])
+local history = redis.call('LRANGE', KEYS[2], 0, -1)
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+redis.call('EXPIRE', KEYS[2], ARGV[1])
+redis.call('ZADD', KEYS[3], ARGV[2], session_id)
+return {fields, history}
+"""
+
+# Drop at most ARGV[2] index members whose activity is older than ARGV[1]
+# (their keys have expired), so pruning cost per call stays bounded
+PRUNE_SCRIPT = """
+local stale = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', '(' .. ARGV[1], 'LIMIT', 0, tonumber(ARGV[2]))
+if #stale > 0 then
+    redis.call('ZREM', KEYS[1], unpack(stale))
+end
+return #stale
+"""
+
+
 class SessionManager:
-    """Manages voice conversation sessions with Redis"""
-    
-    def __init__(self, redis_url: str = "redis://localhost:6379"):
+    """
+    Manages voice conversation sessions with Redis
+
+    Scalar fields live in a hash and the conversation history in a capped list,
+    so a turn only sends what changed. Every operation is a single round trip:
+    reads are one pipeline or script, writes one Lua script that checks the
+    session exists, applies the changes and refreshes the TTL atomically.
+
+    Live sessions are indexed in a sorted set scored by last activity, kept
+    current on create, touch and delete. Members whose keys have expired are
+    pruned a batch at a time, so counting and listing never scan the keyspace.
+    """
+
+    # Defaults (overridable via environment)
+    SESSION_TTL = int(os.getenv("SESSION_TTL_SECONDS", "600"))  # 10 minutes
+    MAX_HISTORY = int(os.getenv("SESSION_MAX_HISTORY", "20"))   # exchanges kept per session
+    PRUNE_BATCH = int(os.getenv("SESSION_PRUNE_BATCH", "1000"))  # stale index members dropped per call
+
+    def __init__(
+        self,
+        redis_url: str = "redis://localhost:6379",
+        client: Optional[aioredis.Redis] = None
+    ):
         """
         Initialize session manager
-        
+
         Args:
             redis_url: Redis connection URL
+            client: Existing client to use instead of connecting to redis_url
+                    (e.g. fakeredis.aioredis.FakeRedis); must use decode_responses=True
         """
         self.redis_url = redis_url
-        self.redis: Optional[aioredis.Redis] = None
-        self.session_ttl = 600  # 10 minutes
+        self.redis: Optional[aioredis.Redis] = client
+        self.session_ttl = self.SESSION_TTL
+        self.max_history = self.MAX_HISTORY
+        self._update_script = None
+        self._touch_script = None
+        self._prune_script = None
         logger.info(f"Session manager initialized (TTL: {self.session_ttl}s)")
-    
+
     async def connect(self):
         """Connect to Redis"""
         try:
-            self.redis = await aioredis.from_url(
-                self.redis_url,
-                encoding="utf-8",
-                decode_responses=True
-            )
+            if self.redis is None:
+                self.redis = await aioredis.from_url(
+                    self.redis_url,
+                    encoding="utf-8",
+                    decode_responses=True
+                )
             await self.redis.ping()
+            self._update_script = self.redis.register_script(UPDATE_SCRIPT)
+            self._touch_script = self.redis.register_script(TOUCH_SCRIPT)
+            self._prune_script = self.redis.register_script(PRUNE_SCRIPT)
             logger.info("Connected to Redis successfully")
         except Exception as e:
             logger.error(f"Failed to connect to Redis: {e}")
             raise
-    
+
     async def disconnect(self):
         """Disconnect from Redis"""
         if self.redis:
-            await self.redis.close()
+            await self.redis.aclose()
             logger.info("Disconnected from Redis")
-    
+
+    @staticmethod
+    def _key(session_id: str) -> str:
+        return f"session:{{{session_id}}}"
+
+    @staticmethod
+    def _history_key(session_id: str) -> str:
+        return f"session:{{{session_id}}}:history"
+
+    @staticmethod
+    def _encode_field(key: str, value: Any) -> str:
+        # Hash values are strings: the fixed string fields are stored as-is,
+        # every other field as JSON so its type survives the round trip
+        if key in STRING_FIELDS:
+            return str(value)
+        return json.dumps(value)
+
+    @staticmethod
+    def _decode_fields(fields: Dict[str, str]) -> Dict[str, Any]:
+        return {
+            key: value if key in STRING_FIELDS else json.loads(value)
+            for key, value in fields.items()
+        }
+
+    async def _update(
+        self,
+        session_id: str,
+        fields: Dict[str, Any],
+        history: Optional[List[Dict]] = None,
+        replace_history: bool = False
+    ) -> bool:
+        """
+        Apply field updates and history appends in one atomic round trip
+
+        Returns:
+            False if the session does not exist
+        """
+        fields = dict(fields, last_activity=datetime.utcnow().isoformat())
+        args: List[Any] = [self.session_ttl, self.max_history, time.time(), len(fields), int(replace_history)]
+        for key, value in fields.items():
+            args += [key, self._encode_field(key, value)]
+        args += [json.dumps(entry) for entry in history or []]
+
+        updated = await self._update_script(
+            keys=[self._key(session_id), self._history_key(session_id), ACTIVE_KEY],
+            args=args
+        )
+        return bool(updated)
+
     async def create_session(
         self,
         user_id: Optional[str] = None,
@@ -56,65 +203,74 @@ class SessionManager:
     ) -> str:
         """
         Create new voice session
-        
+
         Args:
             user_id: Optional user identifier
             language: Session language
             voice: TTS voice
-            
+
         Returns:
             Session ID
         """
         try:
             session_id = str(uuid.uuid4())
-            
+            now = datetime.utcnow().isoformat()
+
             session_data = {
                 "session_id": session_id,
                 "user_id": user_id or "anonymous",
                 "language": language,
                 "voice": voice,
-                "created_at": datetime.utcnow().isoformat(),
-                "last_activity": datetime.utcnow().isoformat(),
-                "conversation_history": [],
-                "context": {}
+                "created_at": now,
+                "last_activity": now,
+                "context": json.dumps({})
             }
-            
-            # Store in Redis
-            await self.redis.setex(
-                f"session:{session_id}",
-                self.session_ttl,
-                json.dumps(session_data)
-            )
-            
+
+            # Store in Redis (history list is created on the first exchange)
+            key = self._key(session_id)
+            async with self.redis.pipeline(transaction=True) as pipe:
+                pipe.hset(key, mapping=session_data)
+                pipe.expire(key, self.session_ttl)
+                pipe.zadd(ACTIVE_KEY, {session_id: time.time()})
+                # Amortized cleanup: each new session retires a few expired ones
+                await self._prune_script(keys=[ACTIVE_KEY], args=[self._cutoff(), 10], client=pipe)
+                await pipe.execute()
+
             logger.info(f"Session created: {session_id}")
             return session_id
-            
+
         except Exception as e:
             logger.error(f"Error creating session: {e}")
             raise
-    
+
     async def get_session(self, session_id: str) -> Optional[Dict]:
         """
         Get session data
-        
+
         Args:
             session_id: Session ID
-            
+
         Returns:
             Session data dict or None
         """
         try:
-            data = await self.redis.get(f"session:{session_id}")
-            if data:
-                # Refresh TTL on access
-                await self.redis.expire(f"session:{session_id}", self.session_ttl)
-                return json.loads(data)
-            return None
-            
+            # Read both keys and refresh their TTL and index score in one
+            # round trip; only a live session is touched
+            flat, history = await self._touch_script(
+                keys=[self._key(session_id), self._history_key(session_id), ACTIVE_KEY],
+                args=[self.session_ttl, time.time()]
+            )
+
+            if not flat:
+                return None
+            session = self._decode_fields(dict(zip(flat[::2], flat[1::2])))
+            session["conversation_history"] = [json.loads(entry) for entry in history]
+            return session
+
         except Exception as e:
             logger.error(f"Error getting session: {e}")
             return None
-    
+
     async def update_session(
         self,
         session_id: str,
@@ -122,33 +278,29 @@ class SessionManager:
     ):
         """
         Update session data
-        
+
         Args:
             session_id: Session ID
-            updates: Dict of fields to update
+            updates: Dict of fields to update ("conversation_history" replaces the history)
         """
         try:
-            session = await self.get_session(session_id)
-            if not session:
+            updates = dict(updates)
+            history = updates.pop("conversation_history", None)
+            updated = await self._update(
+                session_id,
+                updates,
+                history=history[-self.max_history:] if history else None,
+                replace_history=history is not None
+            )
+            if not updated:
                 logger.warning(f"Session not found: {session_id}")
                 return
-            
-            # Update fields
-            session.update(updates)
-            session["last_activity"] = datetime.utcnow().isoformat()
-            
-            # Save back to Redis
-            await self.redis.setex(
-                f"session:{session_id}",
-                self.session_ttl,
-                json.dumps(session)
-            )
-            
+
             logger.debug(f"Session updated: {session_id}")
-            
+
         except Exception as e:
             logger.error(f"Error updating session: {e}")
-    
+
     async def add_to_history(
         self,
         session_id: str,
@@ -157,35 +309,33 @@ class SessionManager:
     ):
         """
         Add exchange to conversation history
-        
+
         Args:
             session_id: Session ID
             user_message: User's message
             assistant_response: Assistant's response
         """
         try:
-            session = await self.get_session(session_id)
-            if not session:
-                return
-            
-            # Add to history
-            session["conversation_history"].append({
+            # Append, keep only the last max_history exchanges and touch the session atomically
+            await self._update(session_id, {}, history=[{
                 "timestamp": datetime.utcnow().isoformat(),
                 "user": user_message,
                 "assistant": assistant_response
-            })
-            
-            # Keep only last 20 exchanges
-            if len(session["conversation_history"]) > 20:
-                session["conversation_history"] = session["conversation_history"][-20:]
-            
-            await self.update_session(session_id, {
-                "conversation_history": session["conversation_history"]
-            })
-            
+            }])
+
         except Exception as e:
             logger.error(f"Error adding to history: {e}")
-    
+
+    async def get_history(self, session_id: str, limit: int = 10) -> List[Dict]:
+        """Get the most recent exchanges (oldest first)"""
+        try:
+            history = await self.redis.lrange(self._history_key(session_id), -limit, -1)
+            return [json.loads(entry) for entry in history]
+
+        except Exception as e:
+            logger.error(f"Error getting history: {e}")
+            return []
+
     async def set_context(
         self,
         session_id: str,
@@ -193,7 +343,7 @@ class SessionManager:
     ):
         """
         Set session context (detection results, documents, etc.)
-        
+
         Args:
             session_id: Session ID
             context: Context data
@@ -201,70 +351,128 @@ class SessionManager:
         try:
             await self.update_session(session_id, {"context": context})
             logger.debug(f"Context set for session: {session_id}")
-            
+
         except Exception as e:
             logger.error(f"Error setting context: {e}")
-    
+
     async def get_context(self, session_id: str) -> Optional[Dict]:
         """Get session context"""
-        session = await self.get_session(session_id)
-        return session.get("context") if session else None
-    
+        try:
+            context = await self.redis.hget(self._key(session_id), "context")
+            return json.loads(context) if context is not None else None
+
+        except Exception as e:
+            logger.error(f"Error getting context: {e}")
+            return None
+
     async def delete_session(self, session_id: str):
         """
         Delete session
-        
+
         Args:
             session_id: Session ID to delete
         """
         try:
-            await self.redis.delete(f"session:{session_id}")
+            async with self.redis.pipeline(transaction=True) as pipe:
+                pipe.delete(self._key(session_id), self._history_key(session_id))
+                pipe.zrem(ACTIVE_KEY, session_id)
+                await pipe.execute()
             logger.info(f"Session deleted: {session_id}")
-            
+
         except Exception as e:
             logger.error(f"Error deleting session: {e}")
-    
+
+    def _cutoff(self) -> float:
+        """Activity score below which a session's keys have expired"""
+        return time.time() - self.session_ttl
+
+    async def count_active_sessions(self) -> int:
+        """Number of live sessions (prunes a batch of stale index members, then ZCARD)"""
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                await self._prune_script(keys=[ACTIVE_KEY], args=[self._cutoff(), self.PRUNE_BATCH], client=pipe)
+                pipe.zcard(ACTIVE_KEY)
+                _, count = await pipe.execute()
+            return count
+
+        except Exception as e:
+            logger.error(f"Error counting active sessions: {e}")
+            return 0
+
+    async def list_active_sessions(self, offset: int = 0, limit: int = 100) -> List[Dict[str, Any]]:
+        """
+        Page through live sessions, most recently active first
+
+        Args:
+            offset: Sessions to skip
+            limit: Page size
+
+        Returns:
+            List of {"session_id", "last_activity"} dicts
+        """
+        try:
+            cutoff = self._cutoff()
+            async with self.redis.pipeline(transaction=False) as pipe:
+                await self._prune_script(keys=[ACTIVE_KEY], args=[cutoff, self.PRUNE_BATCH], client=pipe)
+                pipe.zrevrangebyscore(ACTIVE_KEY, "+inf", cutoff, start=offset, num=limit, withscores=True)
+                _, members = await pipe.execute()
+            return [
+                {"session_id": session_id, "last_activity": datetime.utcfromtimestamp(score).isoformat()}
+                for session_id, score in members
+            ]
+
+        except Exception as e:
+            logger.error(f"Error listing active sessions: {e}")
+            return []
+
     async def get_active_sessions(self) -> list:
-        """Get list of active session IDs"""
+        """Get list of active session IDs (prefer list_active_sessions for large deployments)"""
         try:
-            keys = await self.redis.keys("session:*")
-            return [key.replace("session:", "") for key in keys]
-            
+            return await self.redis.zrangebyscore(ACTIVE_KEY, self._cutoff(), "+inf")
+
         except Exception as e:
             logger.error(f"Error getting active sessions: {e}")
             return []
-    
+
     async def cleanup_expired(self):
-        """Clean up expired sessions (Redis TTL handles this automatically)"""
-        logger.info("Redis TTL auto-cleanup - no manual cleanup needed")
+        """Drop index entries of sessions whose keys Redis has expired"""
+        removed = await self._prune_script(keys=[ACTIVE_KEY], args=[self._cutoff(), self.PRUNE_BATCH])
+        logger.info(f"Pruned {removed} expired sessions from the active index")
 
 
 # Example usage
 if __name__ == "__main__":
     import asyncio
-    
+    import sys
+
     async def test_session_manager():
-        manager = SessionManager()
+        # python session_manager.py --fake  runs against fakeredis instead of a local server
+        client = None
+        if "--fake" in sys.argv:
+            from fakeredis import aioredis as fake_aioredis
+            client = fake_aioredis.FakeRedis(decode_responses=True)
+
+        manager = SessionManager(client=client)
         await manager.connect()
-        
+
         # Create session
         session_id = await manager.create_session(
             user_id="test_user",
             language="hi-IN"
         )
         print(f"Created session: {session_id}")
-        
+
         # Get session
         session = await manager.get_session(session_id)
         print(f"Session data: {session}")
-        
+
         # Add conversation
         await manager.add_to_history(
             session_id,
             "Hello!",
             "Hi! How can I help you?"
         )
-        
+
         # Set context
         await manager.set_context(session_id, {
             "detection_results": {
@@ -272,13 +480,13 @@ if __name__ == "__main__":
                 "human_score": 25
             }
         })
-        
+
         # Get updated session
         session = await manager.get_session(session_id)
         print(f"Updated session: {json.dumps(session, indent=2)}")
-        
+
         # Cleanup
         await manager.delete_session(session_id)
         await manager.disconnect()
-    
+
     asyncio.run(test_session_manager())
@@ -1,40 +1,208 @@
 """
 In-Memory Session Manager (for testing without Redis)
-Manages voice conversation sessions in memory
+Manages voice conversation sessions in memory with TTL expiry and size bounds
 """
 
+import os
+import time
+import asyncio
 import logging
 import json
 import uuid
-from typing import Optional, Dict, Any
-from datetime import datetime, timedelta
+from collections import OrderedDict
+from typing import Optional, Dict, Any, List
+from datetime import datetime
 
 logger = logging.getLogger(__name__)
 
 
+def _timestamp(wall: float) -> str:
+    return datetime.fromtimestamp(wall).isoformat()
+
+
+def _text_size(value: Any) -> int:
+    """Approximate memory footprint of a stored value"""
+    if isinstance(value, str):
+        return len(value.encode("utf-8"))
+    return len(json.dumps(value, default=str))
+
+
+class _Session:
+    """Compact session record; timestamps are kept as floats and formatted on read"""
+
+    __slots__ = (
+        "session_id", "user_id", "language", "voice",
+        "created_at", "last_activity", "expires_at",
+        "history", "context", "extra", "size"
+    )
+
+    # Rough per-record and per-message overhead on top of the stored text
+    RECORD_BYTES = 512
+    MESSAGE_BYTES = 160
+
+    def __init__(self, session_id: str, user_id: Optional[str], language: str, voice: str):
+        self.session_id = session_id
+        self.user_id = user_id
+        self.language = language
+        self.voice = voice
+        self.created_at = self.last_activity = time.time()
+        self.expires_at = 0.0
+        self.history: List[Dict[str, Any]] = []
+        self.context: Dict[str, Any] = {}
+        self.extra: Dict[str, Any] = {}
+        self.size = self.RECORD_BYTES
+
+    def message_size(self, message: Any) -> int:
+        # Entries are usually role/content dicts, but any JSON-able value is accepted
+        return self.MESSAGE_BYTES + _text_size(message)
+
+    def size_with(self, history: List[Any], context: Dict[str, Any], extra: Dict[str, Any]) -> int:
+        """Size the record would have with these contents"""
+        return (
+            self.RECORD_BYTES
+            + sum(self.message_size(message) for message in history)
+            + _text_size(context)
+            + (_text_size(extra) if extra else 0)
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "session_id": self.session_id,
+            "user_id": self.user_id,
+            "language": self.language,
+            "voice": self.voice,
+            "created_at": _timestamp(self.created_at),
+            "last_activity": _timestamp(self.last_activity),
+            "conversation_history": list(self.history),
+            "context": self.context,
+            **self.extra
+        }
+
+
 class SessionManager:
-    """Manages voice conversation sessions in memory (for testing)"""
-    
-    def __init__(self, redis_url: str = "redis://localhost:6379"):
+    """
+    Manages voice conversation sessions in memory (for testing)
+
+    Sessions expire session_ttl seconds after their last access (monotonic
+    clock). Every access moves a session to the end of an ordered dict, and
+    with a single TTL that recency order is also the expiry order, so the
+    front of the dict is both the next session to expire and the least
+    recently used one. A background task sweeps expired sessions from the
+    front, and inserts evict from the front while the store is over
+    max_sessions or max_bytes.
+    """
+
+    # Defaults (overridable via environment)
+    SESSION_TTL = int(os.getenv("SESSION_TTL_SECONDS", "600"))                   # 10 minutes
+    MAX_SESSIONS = int(os.getenv("SESSION_MAX_SESSIONS", "10000"))
+    MAX_BYTES = int(os.getenv("SESSION_MAX_BYTES", str(64 * 1024 * 1024)))     # approximate
+    SWEEP_INTERVAL = float(os.getenv("SESSION_SWEEP_INTERVAL", "30"))
+    MAX_HISTORY = 10                                                             # messages kept per session
+
+    def __init__(
+        self,
+        redis_url: str = "redis://localhost:6379",
+        session_ttl: Optional[int] = None,
+        max_sessions: Optional[int] = None,
+        max_bytes: Optional[int] = None
+    ):
         """
         Initialize session manager
-        
+
         Args:
             redis_url: Ignored for in-memory version
+            session_ttl: Seconds of inactivity before a session expires
+            max_sessions: Maximum sessions kept (least recently used are evicted)
+            max_bytes: Approximate memory budget for all sessions
         """
-        self.sessions: Dict[str, Dict[str, Any]] = {}
-        self.session_ttl = 600  # 10 minutes
+        self.session_ttl = session_ttl or self.SESSION_TTL
+        self.max_sessions = max_sessions or self.MAX_SESSIONS
+        self.max_bytes = max_bytes or self.MAX_BYTES
+        # session_id -> record; order is recency, which is also expiry order
+        self.sessions: "OrderedDict[str, _Session]" = OrderedDict()
+        self.total_bytes = 0
+        self.counters = {"expired": 0, "evicted": 0}
+        self._sweeper: Optional[asyncio.Task] = None
         logger.info(f"In-memory session manager initialized (TTL: {self.session_ttl}s)")
-    
+
     async def connect(self):
-        """Connect (no-op for in-memory)"""
+        """Start the background expiry sweeper"""
+        if self._sweeper is None or self._sweeper.done():
+            self._sweeper = asyncio.create_task(self._sweep_loop())
         logger.info("Using in-memory session storage (no Redis required)")
-    
+
     async def disconnect(self):
-        """Disconnect (no-op for in-memory)"""
+        """Stop the sweeper and clear all sessions"""
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            try:
+                await self._sweeper
+            except asyncio.CancelledError:
+                pass
+            self._sweeper = None
         logger.info("In-memory session storage cleared")
         self.sessions.clear()
-    
+        self.total_bytes = 0
+
+    async def _sweep_loop(self):
+        interval = min(self.SWEEP_INTERVAL, max(self.session_ttl / 4, 0.05))
+        while True:
+            await asyncio.sleep(interval)
+            expired = self.expire()
+            if expired:
+                logger.debug(f"Expired {expired} idle sessions")
+
+    def expire(self) -> int:
+        """
+        Drop sessions idle for longer than session_ttl
+
+        Returns:
+            Number of sessions removed
+        """
+        now = time.monotonic()
+        removed = 0
+        while self.sessions:
+            session_id, session = next(iter(self.sessions.items()))
+            if session.expires_at > now:
+                break
+            self._remove(session_id)
+            removed += 1
+        self.counters["expired"] += removed
+        return removed
+
+    def _remove(self, session_id: str) -> Optional[_Session]:
+        session = self.sessions.pop(session_id, None)
+        if session is not None:
+            self.total_bytes -= session.size
+        return session
+
+    def _resize(self, session: _Session, delta: int):
+        session.size += delta
+        self.total_bytes += delta
+
+    def _evict(self):
+        """Evict least recently used sessions while over a bound (never the newest)"""
+        while len(self.sessions) > 1 and (
+            len(self.sessions) > self.max_sessions or self.total_bytes > self.max_bytes
+        ):
+            self._remove(next(iter(self.sessions)))
+            self.counters["evicted"] += 1
+
+    def _touch(self, session_id: str) -> Optional[_Session]:
+        """Live record for a session, refreshing its recency and expiry"""
+        session = self.sessions.get(session_id)
+        if session is None:
+            return None
+        now = time.monotonic()
+        if session.expires_at <= now:
+            self._remove(session_id)
+            self.counters["expired"] += 1
+            return None
+        session.last_activity = time.time()
+        session.expires_at = now + self.session_ttl
+        self.sessions.move_to_end(session_id)
+        return session
+
     async def create_session(
         self,
         user_id: Optional[str] = None,
@@ -43,47 +211,38 @@ class SessionManager:
     ) -> Dict[str, Any]:
         """
         Create a new session
-        
+
         Args:
             user_id: Optional user identifier
             language: Language code
             voice: Voice name
-            
+
         Returns:
             Session data
         """
-        session_id = str(uuid.uuid4())
-        session_data = {
-            "session_id": session_id,
-            "user_id": user_id,
-            "language": language,
-            "voice": voice,
-            "created_at": datetime.now().isoformat(),
-            "last_activity": datetime.now().isoformat(),
-            "conversation_history": [],
-            "context": {}
-        }
-        
-        self.sessions[session_id] = session_data
-        logger.info(f"Created session {session_id}")
-        return session_data
-    
+        self.expire()
+        session = _Session(str(uuid.uuid4()), user_id, language, voice)
+        session.expires_at = time.monotonic() + self.session_ttl
+
+        self.sessions[session.session_id] = session
+        self.total_bytes += session.size
+        self._evict()
+        logger.info(f"Created session {session.session_id}")
+        return session.to_dict()
+
     async def get_session(self, session_id: str) -> Optional[Dict[str, Any]]:
         """
         Get session data
-        
+
         Args:
             session_id: Session identifier
-            
+
         Returns:
             Session data or None if not found
         """
-        session = self.sessions.get(session_id)
-        if session:
-            # Update last activity
-            session["last_activity"] = datetime.now().isoformat()
-        return session
-    
+        session = self._touch(session_id)
+        return session.to_dict() if session else None
+
     async def update_session(
         self,
         session_id: str,
@@ -91,38 +250,54 @@ class SessionManager:
     ) -> bool:
         """
         Update session data
-        
+
         Args:
             session_id: Session identifier
             updates: Fields to update
-            
+
         Returns:
             True if successful
         """
-        session = self.sessions.get(session_id)
+        session = self._touch(session_id)
         if not session:
             return False
-        
-        session.update(updates)
-        session["last_activity"] = datetime.now().isoformat()
+
+        history = session.history
+        fields: Dict[str, Any] = {}
+        extra = dict(session.extra)
+        for key, value in updates.items():
+            if key == "conversation_history":
+                history = list(value)[-self.MAX_HISTORY:]
+            elif key in ("user_id", "language", "voice", "context"):
+                fields[key] = value
+            elif key not in ("session_id", "created_at", "last_activity"):
+                extra[key] = value
+
+        # Size first: if that fails the record and the byte count are untouched
+        size = session.size_with(history, fields.get("context", session.context), extra)
+        session.history = history
+        session.extra = extra
+        for key, value in fields.items():
+            setattr(session, key, value)
+        self._resize(session, size - session.size)
+        self._evict()
         return True
-    
+
     async def delete_session(self, session_id: str) -> bool:
         """
         Delete a session
-        
+
         Args:
             session_id: Session identifier
-            
+
         Returns:
             True if deleted
         """
-        if session_id in self.sessions:
-            del self.sessions[session_id]
+        if self._remove(session_id) is not None:
             logger.info(f"Deleted session {session_id}")
             return True
         return False
-    
+
     async def add_to_history(
         self,
         session_id: str,
@@ -131,33 +306,36 @@ class SessionManager:
     ) -> bool:
         """
         Add message to conversation history
-        
+
         Args:
             session_id: Session identifier
             role: Message role (user/assistant)
             content: Message content
-            
+
         Returns:
             True if successful
         """
-        session = await self.get_session(session_id)
+        session = self._touch(session_id)
         if not session:
             return False
-        
+
         message = {
             "role": role,
             "content": content,
             "timestamp": datetime.now().isoformat()
         }
-        
-        session["conversation_history"].append(message)
-        
+
+        session.history.append(message)
+        delta = session.message_size(message)
+
         # Keep only last 10 messages
-        if len(session["conversation_history"]) > 10:
-            session["conversation_history"] = session["conversation_history"][-10:]
-        
+        while len(session.history) > self.MAX_HISTORY:
+            delta -= session.message_size(session.history.pop(0))
+
+        self._resize(session, delta)
+        self._evict()
         return True
-    
+
     async def get_history(
         self,
         session_id: str,
@@ -165,21 +343,21 @@ class SessionManager:
     ) -> list:
         """
         Get conversation history
-        
+
         Args:
             session_id: Session identifier
             limit: Maximum number of messages
-            
+
         Returns:
             List of messages
         """
-        session = await self.get_session(session_id)
+        session = self._touch(session_id)
         if not session:
             return []
-        
-        history = session.get("conversation_history", [])
-        return history[-limit:] if limit else history
-    
+
+        history = session.history
+        return history[-limit:] if limit else list(history)
+
     async def set_context(
         self,
         session_id: str,
@@ -188,26 +366,26 @@ class SessionManager:
     ) -> bool:
         """
         Set context data for the session
-        
+
         Args:
             session_id: Session identifier
             context_key: Context key
             context_value: Context value
-            
+
         Returns:
             True if successful
         """
-        session = await self.get_session(session_id)
+        session = self._touch(session_id)
         if not session:
             return False
-        
-        if "context" not in session:
-            session["context"] = {}
-        
-        session["context"][context_key] = context_value
+
+        old = _text_size(session.context)
+        session.context[context_key] = context_value
+        self._resize(session, _text_size(session.context) - old)
+        self._evict()
         logger.info(f"Set context {context_key} for session {session_id}")
         return True
-    
+
     async def get_context(
         self,
         session_id: str,
@@ -215,20 +393,62 @@ class SessionManager:
     ) -> Optional[Any]:
         """
         Get context data from the session
-        
+
         Args:
             session_id: Session identifier
             context_key: Optional context key (returns all context if None)
-            
+
         Returns:
             Context value or None
         """
-        session = await self.get_session(session_id)
+        session = self._touch(session_id)
         if not session:
             return None
-        
-        context = session.get("context", {})
-        
+
         if context_key:
-            return context.get(context_key)
-        return context
+            return session.context.get(context_key)
+        return session.context
+
+    async def count_active_sessions(self) -> int:
+        """Number of live sessions"""
+        self.expire()
+        return len(self.sessions)
+
+    async def list_active_sessions(
+        self,
+        offset: int = 0,
+        limit: int = 100
+    ) -> list:
+        """
+        Page through live sessions, most recently active first
+
+        Args:
+            offset: Sessions to skip
+            limit: Page size
+
+        Returns:
+            List of {"session_id", "last_activity"} dicts
+        """
+        self.expire()
+        page = []
+        for index, session in enumerate(reversed(self.sessions.values())):
+            if index >= offset + limit:
+                break
+            if index >= offset:
+                page.append({"session_id": session.session_id, "last_activity": _timestamp(session.last_activity)})
+        return page
+
+    async def get_active_sessions(self) -> list:
+        """Get list of active session IDs"""
+        self.expire()
+        return list(self.sessions)
+
+    def stats(self) -> Dict[str, Any]:
+        """Session counts and approximate memory use"""
+        return {
+            "sessions": len(self.sessions),
+            "bytes": self.total_bytes,
+            "max_sessions": self.max_sessions,
+            "max_bytes": self.max_bytes,
+            **self.counters
+        }
@@ -0,0 +1,260 @@
+"""
+Synthesized speech cache
+In-memory LRU and on-disk tiers of TTS audio keyed by normalized text and voice settings
+"""
+
+import os
+import json
+import asyncio
+import hashlib
+import logging
+import tempfile
+import unicodedata
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Fixed utterances worth synthesizing before the first request
+DEFAULT_PHRASES = [
+    "Hello! I am the AI Detector voice assistant. How can I help you today?",
+    "Could you please repeat that?",
+    "Sorry, I didn't catch that.",
+    "Please wait while I analyze the content.",
+    "Goodbye! Have a great day.",
+]
+
+
+def normalize_text(text: str) -> str:
+    """Unicode- and whitespace-normalized text (case is kept; it can change pronunciation)"""
+    return " ".join(unicodedata.normalize("NFKC", text).split())
+
+
+def load_phrases(path: Optional[str] = None) -> List[str]:
+    """Prewarm phrases from a file (one per line, TTS_PREWARM_FILE) or the defaults"""
+    path = path or os.getenv("TTS_PREWARM_FILE")
+    if not path:
+        return list(DEFAULT_PHRASES)
+    try:
+        with open(path, encoding="utf-8") as f:
+            return [line.strip() for line in f if line.strip() and not line.startswith("#")]
+    except OSError as e:
+        logger.warning(f"Could not read TTS prewarm phrases from {path}: {e}")
+        return list(DEFAULT_PHRASES)
+
+
+class TTSCache:
+    """
+    Two-tier cache of synthesized audio
+
+    Entries are addressed by a SHA-256 of the normalized text and every
+    setting that changes the audio (language, speaker, pace, sample rate,
+    model). Hits are served from a byte-bounded in-memory LRU, then from
+    files named by that hash on disk, which survive restarts and are shared
+    by all processes using the same directory. Concurrent requests for the
+    same audio wait for a single synthesis.
+    """
+
+    # Defaults (overridable via environment)
+    MEMORY_BYTES = int(os.getenv("TTS_CACHE_MEMORY_BYTES", str(32 * 1024 * 1024)))
+    DISK_BYTES = int(os.getenv("TTS_CACHE_DISK_BYTES", str(512 * 1024 * 1024)))
+    DIRECTORY = os.getenv("TTS_CACHE_DIR", os.path.join(tempfile.gettempdir(), "ai_detector_tts"))
+
+    def __init__(
+        self,
+        directory: Optional[str] = None,
+        memory_bytes: Optional[int] = None,
+        disk_bytes: Optional[int] = None
+    ):
+        """
+        Initialize cache
+
+        Args:
+            directory: Disk tier location ("" disables the disk tier)
+            memory_bytes: Memory tier budget
+            disk_bytes: Disk tier budget
+        """
+        self.directory = self.DIRECTORY if directory is None else directory
+        self.memory_bytes = self.MEMORY_BYTES if memory_bytes is None else memory_bytes
+        self.disk_bytes = self.DISK_BYTES if disk_bytes is None else disk_bytes
+
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self._memory_used = 0
+        # key -> file size; order is recency
+        self._disk: "OrderedDict[str, int]" = OrderedDict()
+        self._disk_used = 0
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "shared": 0}
+
+        if self.directory:
+            self._scan_disk()
+
+    @staticmethod
+    def key(
+        text: str,
+        language: str,
+        speaker: str,
+        pace: float,
+        sample_rate: int,
+        model: str
+    ) -> str:
+        parts = [normalize_text(text), language, speaker, float(pace), int(sample_rate), model]
+        return hashlib.sha256(json.dumps(parts, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.wav")
+
+    def _scan_disk(self):
+        """Index existing files, oldest access first"""
+        entries = []
+        try:
+            for shard in os.scandir(self.directory):
+                if not shard.is_dir():
+                    continue
+                for entry in os.scandir(shard.path):
+                    if entry.name.endswith(".wav"):
+                        stat = entry.stat()
+                        entries.append((stat.st_mtime, entry.name[:-4], stat.st_size))
+        except FileNotFoundError:
+            return
+        for _, key, size in sorted(entries):
+            self._disk[key] = size
+            self._disk_used += size
+        self._remove_files(self._trim_disk())
+        if entries:
+            logger.info(f"TTS cache: {len(self._disk)} entries on disk ({self._disk_used} bytes)")
+
+    def _remember(self, key: str, audio: bytes):
+        if len(audio) > self.memory_bytes:
+            return
+        if key in self._memory:
+            self._memory_used -= len(self._memory.pop(key))
+        self._memory[key] = audio
+        self._memory_used += len(audio)
+        while self._memory_used > self.memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_used -= len(evicted)
+
+    def _read_disk(self, key: str) -> Optional[bytes]:
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                audio = f.read()
+            # mtime doubles as last access, so recency survives restarts
+            os.utime(path)
+            return audio
+        except OSError:
+            return None
+
+    def _write_disk(self, key: str, audio: bytes):
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(audio)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Could not write TTS cache entry: {e}")
+
+    def _trim_disk(self) -> List[str]:
+        """Drop least recently used disk entries over budget; returns their files"""
+        paths = []
+        while self._disk_used > self.disk_bytes and self._disk:
+            key, size = self._disk.popitem(last=False)
+            self._disk_used -= size
+            paths.append(self._path(key))
+        return paths
+
+    @staticmethod
+    def _remove_files(paths: List[str]):
+        for path in paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    async def get(self, key: str) -> Optional[bytes]:
+        """Cached audio for a key, or None"""
+        audio = self._memory.get(key)
+        if audio is not None:
+            self._memory.move_to_end(key)
+            self.counters["memory_hits"] += 1
+            return audio
+
+        if not self.directory:
+            return None
+        # Also checked when not indexed: another process may have written it
+        audio = await asyncio.to_thread(self._read_disk, key)
+        if audio is None:
+            self._disk_used -= self._disk.pop(key, 0)
+            return None
+        if key in self._disk:
+            self._disk.move_to_end(key)
+        else:
+            self._disk[key] = len(audio)
+            self._disk_used += len(audio)
+        self._remember(key, audio)
+        self.counters["disk_hits"] += 1
+        return audio
+
+    async def put(self, key: str, audio: bytes):
+        """Store audio in both tiers"""
+        self._remember(key, audio)
+        if not self.directory or len(audio) > self.disk_bytes:
+            return
+        await asyncio.to_thread(self._write_disk, key, audio)
+        if key in self._disk:
+            self._disk_used -= self._disk.pop(key)
+        self._disk[key] = len(audio)
+        self._disk_used += len(audio)
+        evicted = self._trim_disk()
+        if evicted:
+            await asyncio.to_thread(self._remove_files, evicted)
+
+    async def get_or_synthesize(self, key: str, synthesize: Callable[[], Awaitable[bytes]]) -> bytes:
+        """
+        Cached audio, or the result of synthesize() (stored unless empty)
+
+        Concurrent calls for the same key share one synthesize() call.
+        """
+        audio = await self.get(key)
+        if audio is not None:
+            return audio
+
+        pending = self._inflight.get(key)
+        if pending is not None:
+            self.counters["shared"] += 1
+            return await asyncio.shield(pending)
+
+        self.counters["misses"] += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            audio = await synthesize()
+            if audio:
+                await self.put(key, audio)
+            future.set_result(audio)
+            return audio
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Retrieve it so a failure nobody waited for is not logged as unretrieved
+            future.exception()
+            raise
+        finally:
+            del self._inflight[key]
+
+    def stats(self) -> Dict:
+        hits = self.counters["memory_hits"] + self.counters["disk_hits"]
+        lookups = hits + self.counters["misses"]
+        return {
+            **self.counters,
+            "memory_entries": len(self._memory),
+            "memory_bytes": self._memory_used,
+            "disk_entries": len(self._disk),
+            "disk_bytes": self._disk_used,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+        }
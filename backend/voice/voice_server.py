@@ -4,6 +4,7 @@ Main server handling voice requests and WebRTC signaling
 """
 
 import os
+import asyncio
 import logging
 from contextlib import asynccontextmanager
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException, Depends
@@ -14,7 +15,8 @@ import json
 
 from .sarvam_client import SarvamAIClient
 from .gemini_client import GeminiClient, SYSTEM_PROMPTS
-from .pipecat_pipeline import VoicePipeline, PipelineConfig
+from .pipecat_pipeline import VoicePipeline, PipelineConfig, ERROR_MESSAGE
+from .tts_cache import load_phrases
 from .webrtc_handler import WebRTCHandler
 # Use in-memory session manager for testing (no Redis required)
 from .session_manager_memory import SessionManager
@@ -29,12 +31,13 @@ logger = logging.getLogger(__name__)
 # Global instances
 session_manager: Optional[SessionManager] = None
 webrtc_handler: Optional[WebRTCHandler] = None
+sarvam_client: Optional[SarvamAIClient] = None
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Startup and shutdown events"""
-    global session_manager, webrtc_handler
+    global session_manager, webrtc_handler, sarvam_client
     
     # Startup
     logger.info("Starting Voice Server...")
@@ -45,6 +48,17 @@ async def lifespan(app: FastAPI):
     )
     await session_manager.connect()
     
+    # Open the pooled Sarvam HTTP client (shared by every pipeline's SarvamAIClient)
+    sarvam_client = SarvamAIClient()
+    await sarvam_client.start()
+    
+    # Synthesize fixed phrases (incl. the pipeline's error message) in the background
+    prewarm = asyncio.create_task(sarvam_client.prewarm(
+        load_phrases() + [ERROR_MESSAGE],
+        languages=os.getenv("TTS_PREWARM_LANGUAGES", "hi-IN").split(","),
+        speakers=os.getenv("TTS_PREWARM_SPEAKERS", sarvam_client.SPEAKER).split(",")
+    ))
+    
     # Initialize WebRTC handler
     webrtc_handler = WebRTCHandler()
     
@@ -56,6 +70,8 @@ async def lifespan(app: FastAPI):
     logger.info("Shutting down Voice Server...")
     await session_manager.disconnect()
     await webrtc_handler.close_all()
+    prewarm.cancel()
+    await sarvam_client.close()
     logger.info("Voice Server stopped")
 
 
@@ -81,7 +97,7 @@ app.add_middleware(
 class SessionCreateRequest(BaseModel):
     user_id: Optional[str] = None
     language: str = "hi-IN"
-    voice: str = "meera"
+    voice: str = SarvamAIClient.SPEAKER
 
 
 class SessionResponse(BaseModel):
@@ -138,7 +154,19 @@ async def health_check():
     return {
         "status": "healthy",
         "redis": "connected" if session_manager else "disconnected",
-        "active_sessions": len(await session_manager.get_active_sessions()) if session_manager else 0
+        "active_sessions": await session_manager.count_active_sessions() if session_manager else 0
+    }
+
+
+@app.get("/api/voice/sessions")
+async def list_sessions(offset: int = 0, limit: int = 100):
+    """List active sessions, most recently active first"""
+    limit = max(1, min(limit, 1000))
+    return {
+        "total": await session_manager.count_active_sessions(),
+        "offset": offset,
+        "limit": limit,
+        "sessions": await session_manager.list_active_sessions(offset=max(offset, 0), limit=limit)
     }
 
 
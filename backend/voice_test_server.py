@@ -4,6 +4,7 @@ Works without Sarvam AI or Gemini API keys
 """
 
 import os
+import asyncio
 import logging
 import base64
 from pathlib import Path
@@ -29,10 +30,13 @@ except ImportError:
 
 # Try to import Sarvam AI client
 try:
-    import aiohttp
+    from voice.sarvam_client import SarvamAIClient, SarvamAPIError
+    from voice.pipecat_pipeline import ERROR_MESSAGE
+    from voice.tts_cache import load_phrases
     SARVAM_API_KEY = os.getenv("SARVAM_API_KEY")
     SARVAM_AVAILABLE = bool(SARVAM_API_KEY)
 except ImportError:
+    SarvamAIClient = None
     SARVAM_AVAILABLE = False
     SARVAM_API_KEY = None
 
@@ -46,13 +50,13 @@ logger = logging.getLogger(__name__)
 # Global instances
 session_manager: Optional[SessionManager] = None
 gemini_client: Optional[Any] = None
-sarvam_base_url = "https://api.sarvam.ai"
+sarvam_client: Optional[Any] = None
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Startup and shutdown events"""
-    global session_manager, gemini_client
+    global session_manager, gemini_client, sarvam_client
     
     # Startup
     logger.info("Starting Minimal Voice Server (Test Mode)...")
@@ -72,6 +76,18 @@ async def lifespan(app: FastAPI):
     else:
         logger.info("Gemini API key not found - using mock responses")
     
+    # Open the pooled Sarvam HTTP client (reused by every STT/TTS call)
+    prewarm = None
+    if SarvamAIClient is not None:
+        sarvam_client = SarvamAIClient(api_key=SARVAM_API_KEY)
+        await sarvam_client.start()
+        # Synthesize fixed phrases in the background so they play instantly later
+        prewarm = asyncio.create_task(sarvam_client.prewarm(
+            load_phrases() + [ERROR_MESSAGE],
+            languages=os.getenv("TTS_PREWARM_LANGUAGES", "hi-IN").split(","),
+            speakers=os.getenv("TTS_PREWARM_SPEAKERS", sarvam_client.SPEAKER).split(",")
+        ))
+    
     # Log Sarvam AI status
     if SARVAM_AVAILABLE:
         logger.info("Sarvam AI enabled - multilingual voice support active!")
@@ -86,6 +102,10 @@ async def lifespan(app: FastAPI):
     logger.info("Shutting down test server...")
     if session_manager:
         await session_manager.disconnect()
+    if prewarm:
+        prewarm.cancel()
+    if sarvam_client:
+        await sarvam_client.close()
 
 
 # Create FastAPI app
@@ -161,6 +181,8 @@ async def health():
     return {
         "status": "healthy",
         "session_manager": "connected" if session_manager else "disconnected",
+        "sessions": session_manager.stats() if session_manager else None,
+        "tts_cache": sarvam_client.tts_cache.stats() if sarvam_client and sarvam_client.tts_cache else None,
         "gemini": GEMINI_AVAILABLE,
         "sarvam": SARVAM_AVAILABLE
     }
@@ -222,6 +244,8 @@ async def configure_api_keys(request: SetAPIKeysRequest):
             if len(request.sarvam_api_key) > 10:
                 SARVAM_API_KEY = request.sarvam_api_key
                 SARVAM_AVAILABLE = True
+                if sarvam_client:
+                    sarvam_client.api_key = request.sarvam_api_key
                 os.environ["SARVAM_API_KEY"] = request.sarvam_api_key
                 results["updated"].append("sarvam")
                 logger.info("Sarvam API key configured successfully")
@@ -405,49 +429,20 @@ async def speech_to_text(request: AudioInputRequest):
         raise HTTPException(status_code=404, detail="Session not found")
     
     try:
-        # Call Sarvam AI STT API
-        async with aiohttp.ClientSession() as http_session:
-            headers = {
-                "api-subscription-key": SARVAM_API_KEY,
-                "Content-Type": "application/json"
-            }
-            
-            payload = {
-                "language_code": request.language,
-                "model": "saarika:v2"
-            }
-            
-            # For STT, we need to send audio as file, not JSON
-            # Convert base64 to bytes
-            import base64
-            audio_bytes = base64.b64decode(request.audio)
-            
-            # Create multipart form data
-            data = aiohttp.FormData()
-            data.add_field('file', audio_bytes, filename='audio.wav', content_type='audio/wav')
-            data.add_field('language_code', request.language)
-            data.add_field('model', 'saarika:v2')
-            
-            async with http_session.post(
-                f"{sarvam_base_url}/speech-to-text",
-                data=data,
-                headers={"api-subscription-key": SARVAM_API_KEY}
-            ) as response:
-                if response.status != 200:
-                    error_text = await response.text()
-                    logger.error(f"Sarvam STT error: {error_text}")
-                    raise HTTPException(status_code=response.status, detail=error_text)
-                
-                data = await response.json()
-                transcribed_text = data.get("transcript", "")
-                
-                logger.info(f"STT ({request.language}): {transcribed_text}")
-                
-                return {
-                    "text": transcribed_text,
-                    "language": request.language
-                }
+        audio_bytes = base64.b64decode(request.audio)
+        data = await sarvam_client.speech_to_text(audio_bytes, language=request.language)
+        transcribed_text = data.get("transcript", "")
+        
+        logger.info(f"STT ({request.language}): {transcribed_text}")
+        
+        return {
+            "text": transcribed_text,
+            "language": request.language
+        }
     
+    except SarvamAPIError as e:
+        logger.error(f"Sarvam STT error: {e.detail}")
+        raise HTTPException(status_code=e.status, detail=e.detail)
     except Exception as e:
         logger.error(f"STT error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -471,55 +466,27 @@ async def text_to_speech(request: TTSRequest):
             "meera": "anushka",  # Female voice
             "arvind": "rahul",   # Male voice
         }
-        speaker = speaker_map.get(request.voice, "anushka")  # Default to anushka
+        speaker = speaker_map.get(request.voice, sarvam_client.SPEAKER)  # Default to the client's speaker
         
         logger.info(f"TTS request: text='{truncated_text[:50]}...', lang={request.language}, speaker={speaker}")
         
-        # Call Sarvam AI TTS API
-        async with aiohttp.ClientSession() as http_session:
-            headers = {
-                "API-Subscription-Key": SARVAM_API_KEY
-            }
-            
-            payload = {
-                "inputs": [truncated_text],
-                "target_language_code": request.language,
-                "speaker": speaker,
-                "pitch": 0,
-                "pace": 1.0,
-                "loudness": 1.5,
-                "speech_sample_rate": 8000,
-                "enable_preprocessing": True,
-                "model": "bulbul:v2"
-            }
-            
-            logger.info(f"Calling Sarvam TTS: {sarvam_base_url}/text-to-speech")
-            
-            async with http_session.post(
-                f"{sarvam_base_url}/text-to-speech",
-                json=payload,
-                headers=headers
-            ) as response:
-                response_text = await response.text()
-                logger.info(f"Sarvam TTS response status: {response.status}")
-                logger.info(f"Sarvam TTS response: {response_text[:200]}")
-                
-                if response.status != 200:
-                    logger.error(f"Sarvam TTS error: {response_text}")
-                    raise HTTPException(status_code=response.status, detail=response_text)
-                
-                data = await response.json() if response_text else {}
-                # Sarvam returns array of audio responses
-                audio_base64 = data.get("audios", [""])[0] if "audios" in data else ""
-                
-                logger.info(f"TTS success ({request.language}, {request.voice}): audio_length={len(audio_base64)}")
-                
-                return {
-                    "audio": audio_base64,
-                    "language": request.language,
-                    "voice": request.voice
-                }
+        audio_base64 = await sarvam_client.text_to_speech(
+            truncated_text,
+            language=request.language,
+            speaker=speaker
+        )
+        
+        logger.info(f"TTS success ({request.language}, {request.voice}): audio_length={len(audio_base64)}")
+        
+        return {
+            "audio": audio_base64,
+            "language": request.language,
+            "voice": request.voice
+        }
     
+    except SarvamAPIError as e:
+        logger.error(f"Sarvam TTS error: {e.detail}")
+        raise HTTPException(status_code=e.status, detail=e.detail)
     except HTTPException:
         raise
     except Exception as e: